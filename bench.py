@@ -0,0 +1,489 @@
+# bench.py
+# -*- coding: utf-8 -*-
+"""
+Benchmarks offline del recolector (sin red).
+
+PAGINAS es un directorio con páginas de artículo guardadas (*.html) o un
+corpus grabado con NOTICIERO_RECORD=corpus.sqlite python marca_harvester.py
+
+  python bench.py extract PAGINAS [--repeat N]
+      CPU por etapa de la extracción de artículos: pipeline actual (un solo
+      parseo lxml) frente al anterior (extruct + BeautifulSoup + trafilatura,
+      cada uno parseando el HTML). Tras una pasada de calentamiento de los
+      dos (imports perezosos); el simhash, que el anterior no calculaba, se
+      mide aparte y no entra en la aceleración.
+
+  python bench.py parse-pool PAGINAS [--workers 1,2,4] [--repeat N]
+      Throughput (docs/s) de parse_article() llamado desde los hilos de
+      descarga (workers de config.yaml), como extract_article, con
+      parse_workers = 0 (en línea) y con cada nº de procesos, tras una
+      pasada de calentamiento.
+
+  python bench.py listing CORPUS
+      Throughput y latencias (p50/p90/p99) del parseo de listings y feeds.
+
+  python bench.py e2e CORPUS [--latency S] [--errors 429:0.02,503:0.01]
+      Ejecución completa de marca_harvester.py contra el corpus (sin red ni
+      correo): tiempo total, respuestas/s y pico de memoria (RSS).
+
+  python bench.py startup [--repeat N] [--top K]
+      Arranque en un intérprete nuevo: import del módulo, import + init()
+      con y sin la config compilada, módulos pesados ya cargados y los K
+      imports más caros (python -X importtime).
+
+  python bench.py fixture CORPUS
+      Genera un corpus sintético pequeño (tres medios de config.yaml, con
+      portada, sitemap de noticias, RSS y artículos) para CI: bench/fixture.sqlite.
+
+Con --baseline bench/baseline.json (antes del subcomando) las medidas se
+comparan con los límites guardados y el proceso sale con código 1 si alguna
+los supera.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import re
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from urllib.parse import urlsplit
+
+import requests
+import yaml
+
+import marca_harvester as mh
+
+
+# ========= UTILIDADES =========
+def load_pages(source):
+    """[(url, html)] desde un directorio de *.html o desde un corpus grabado."""
+    pages = []
+    if os.path.isfile(source):
+        corpus = mh.HttpCorpus(source)
+        for url in corpus.urls("article"):
+            pages.append((url, corpus.get(url)[2].decode("utf-8", errors="replace")))
+        corpus.close()
+        return pages
+    for path in sorted(glob.glob(os.path.join(source, "**", "*.htm*"), recursive=True)):
+        with open(path, "rb") as f:
+            raw = f.read()
+        pages.append(("https://example.invalid/" + os.path.basename(path), raw.decode("utf-8", errors="replace")))
+    return pages
+
+def percentiles(values, ps=(50, 90, 99)):
+    vals = sorted(values)
+    if not vals:
+        return {p: 0.0 for p in ps}
+    return {p: vals[min(len(vals) - 1, int(round(p / 100 * (len(vals) - 1))))] for p in ps}
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    return resource.getrusage(who).ru_maxrss / 1024  # Linux: KiB
+
+def use_replay(corpus_path, latency=0.0, errors=""):
+    """Sirve http_get desde el corpus, sin caché HTTP ni pausas de cortesía."""
+    # config y sesión como init(), pero sin abrir los almacenes de .noticiero
+    mh.configure(*mh.load_compiled_config())
+    mh.SESSION = mh.open_session()
+    adapter = mh.ReplayAdapter(mh.HttpCorpus(corpus_path), latency, mh._parse_replay_errors(errors))
+    mh.SESSION.mount("https://", adapter)
+    mh.SESSION.mount("http://", adapter)
+    mh.HTTP_CACHE = None
+    mh.POLITENESS.interval = 0.0
+    mh.POLITENESS.jitter = 0.0
+    mh.POLITENESS.intervals.clear()
+    return adapter
+
+def print_stages(title, timings, n_docs):
+    total = sum(timings.values())
+    print(f"\n{title}: {total:.3f} s CPU en {n_docs} documentos ({1000 * total / max(n_docs, 1):.2f} ms/doc)")
+    for name, secs in sorted(timings.items(), key=lambda kv: -kv[1]):
+        print(f"  {name:<12} {secs:8.3f} s  {100 * secs / total if total else 0:5.1f} %")
+    return total
+
+
+# ========= EXTRACCIÓN =========
+def legacy_extract(html, url, timings):
+    """Pipeline anterior: tres parseos del mismo HTML, todos incondicionales."""
+    import extruct
+    import trafilatura
+    from bs4 import BeautifulSoup
+    from w3lib.html import get_base_url
+
+    t0 = time.process_time()
+    try:
+        extruct.extract(html, base_url=get_base_url(html, url), syntaxes=["json-ld"])
+    except Exception:
+        pass
+    t1 = time.process_time()
+    soup = BeautifulSoup(html, "lxml")
+    soup.select_one("h1")
+    t2 = time.process_time()
+    trafilatura.extract(html, url=url, include_comments=False, include_tables=False)
+    t3 = time.process_time()
+    for name, secs in (("extruct", t1 - t0), ("bs4", t2 - t1), ("trafilatura", t3 - t2)):
+        timings[name] = timings.get(name, 0.0) + secs
+
+def bench_extract(args):
+    pages = load_pages(args.pages)
+    if not pages:
+        sys.exit(f"No hay páginas *.html en {args.pages}")
+    # calentamiento: los imports perezosos (lxml, extruct, trafilatura…) no cuentan
+    for url, html in pages:
+        mh.parse_article_html(html, url, timings={})
+        legacy_extract(html, url, {})
+    new_t, old_t = {}, {}
+    for _ in range(args.repeat):
+        for url, html in pages:
+            mh.parse_article_html(html, url, timings=new_t)
+            legacy_extract(html, url, old_t)
+    n = len(pages) * args.repeat
+    # el anterior no deduplicaba por cuerpo: simhash fuera de la comparación
+    dedup = new_t.pop("simhash", 0.0)
+    old_total = print_stages("Anterior (3 parseos)", old_t, n)
+    new_total = print_stages("Actual (1 parseo, etapas perezosas)", new_t, n)
+    print(f"\nsimhash (aparte): {1000 * dedup / max(n, 1):.2f} ms/doc")
+    if new_total:
+        print(f"Aceleración: x{old_total / new_total:.2f}")
+    return {
+        "ms_per_doc": 1000 * new_total / max(n, 1),
+        "simhash_ms_per_doc": 1000 * dedup / max(n, 1),
+        "speedup": old_total / new_total if new_total else 0.0,
+    }
+
+
+# ========= POOL DE PROCESOS =========
+def _parse_pass(jobs, threads):
+    """docs/s de parse_article() (la ruta de extract_article) desde `threads` hilos."""
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        for _ in ex.map(lambda job: mh.parse_article(*job), jobs):
+            pass
+    return len(jobs) / (time.perf_counter() - t0)
+
+def bench_parse_pool(args):
+    pages = load_pages(args.pages)
+    if not pages:
+        sys.exit(f"No hay páginas *.html en {args.pages}")
+    jobs = [(html, url) for url, html in pages] * args.repeat
+    cfg, sources = mh.load_compiled_config()
+    threads = max(1, int(cfg.get("workers", 16)))
+    print(f"{len(jobs)} documentos, {threads} hilos de descarga, {os.cpu_count()} CPUs")
+
+    results = {}
+    for n in [0] + [int(x) for x in args.workers.split(",") if x.strip()]:
+        # como en producción: parse_workers = n y un parse_article() por hilo
+        mh.configure(dict(cfg, parse_workers=n), sources)
+        try:
+            _parse_pass([(html, url) for url, html in pages], threads)  # calentamiento: arranque e imports
+            rate = _parse_pass(jobs, threads)
+        finally:
+            mh.shutdown_parse_pool()
+        if n == 0:
+            base = results["inline_docs_per_s"] = rate
+            print(f"  en línea     {rate:8.1f} docs/s")
+        else:
+            results[f"workers_{n}_docs_per_s"] = rate
+            print(f"  {n:2d} procesos  {rate:8.1f} docs/s  x{rate / base:.2f}")
+    pool = [v for k, v in results.items() if k.startswith("workers_")]
+    if pool:
+        results["pool_speedup"] = max(pool) / base
+    return results
+
+
+# ========= LISTINGS =========
+def bench_listing(args):
+    use_replay(args.corpus)
+    urls = mh.HttpCorpus(args.corpus).urls("listing")
+    if not urls:
+        sys.exit(f"El corpus {args.corpus} no tiene listings")
+    lat, n_items = [], 0
+    t0 = time.perf_counter()
+    for url in urls:
+        parts = urlsplit(url)
+        t1 = time.perf_counter()
+        try:
+            n_items += len(mh.parse_listing_document(url, f"{parts.scheme}://{parts.netloc}/", 400, "bench"))
+        except Exception:
+            pass
+        lat.append(time.perf_counter() - t1)
+    total = time.perf_counter() - t0
+    pc = percentiles(lat)
+    print(f"{len(urls)} listings, {n_items} enlaces en {total:.2f} s ({len(urls) / total:.1f} docs/s)")
+    print(f"  latencia ms: p50 {1000 * pc[50]:.1f}  p90 {1000 * pc[90]:.1f}  p99 {1000 * pc[99]:.1f}")
+    print(f"  pico RSS: {peak_rss_mb():.0f} MB")
+    return {"docs_per_s": len(urls) / total, "p90_ms": 1000 * pc[90], "links": n_items}
+
+
+# ========= EXTREMO A EXTREMO =========
+def corpus_age_hours(corpus_path):
+    """Horas desde la última respuesta grabada: las fechas de los artículos son de entonces."""
+    db = sqlite3.connect(corpus_path)
+    try:
+        (last,) = db.execute("SELECT MAX(recorded_at) FROM responses").fetchone()
+    finally:
+        db.close()
+    return max(0.0, (time.time() - last) / 3600) if last else 0.0
+
+def write_e2e_config(config_path, dest_dir, age_hours):
+    """config.yaml con la ventana de horas alargada lo que tenga de antigüedad el corpus."""
+    cfg = mh.load_config(config_path)
+    cfg["hours_recent"] = float(cfg.get("hours_recent", 24)) + age_hours
+    for profile in cfg.get("profiles") or []:
+        if profile.get("hours_recent"):
+            profile["hours_recent"] = float(profile["hours_recent"]) + age_hours
+    with open(os.path.join(dest_dir, "config.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f, allow_unicode=True, sort_keys=False)
+
+def bench_e2e(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as state_dir:
+        # se ejecuta en state_dir con una copia de config.yaml: un corpus grabado
+        # hace días (o el de CI) sigue cayendo dentro de la ventana de horas
+        write_e2e_config(os.path.join(here, mh.CONFIG_FILE), state_dir, corpus_age_hours(args.corpus))
+        env = dict(
+            os.environ,
+            NOTICIERO_REPLAY=os.path.abspath(args.corpus),
+            NOTICIERO_REPLAY_LATENCY=str(args.latency),
+            NOTICIERO_REPLAY_ERRORS=args.errors,
+            NOTICIERO_STATE_DIR=state_dir,
+            NOTICIERO_HOST_DELAY=str(args.host_delay),
+            NOTICIERO_DRY_RUN="1",
+        )
+        t0 = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, os.path.join(here, "marca_harvester.py")],
+            cwd=state_dir, env=env, capture_output=True, text=True,
+        )
+        total = time.perf_counter() - t0
+    if proc.returncode:
+        sys.stderr.write(proc.stdout[-4000:] + proc.stderr[-4000:])
+        sys.exit(f"marca_harvester.py terminó con código {proc.returncode}")
+    m = re.search(r"\[REPLAY\] (\d+) servidas, (\d+) ausentes, (\d+) errores", proc.stdout)
+    served = sum(int(x) for x in m.groups()) if m else 0
+    sent = re.search(r"Artículos enviados: (\d+)", proc.stdout)
+    print(f"Ejecución completa: {total:.2f} s, {served} respuestas ({served / total:.1f}/s), "
+          f"{sent.group(1) if sent else '?'} artículos en el resumen")
+    print(f"  pico RSS (mayor proceso): {peak_rss_mb(resource.RUSAGE_CHILDREN):.0f} MB")
+    return {"seconds": total, "responses": served, "articles": int(sent.group(1)) if sent else 0,
+            "peak_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN)}
+
+
+# ========= ARRANQUE =========
+HEAVY_MODULES = ("lxml", "trafilatura", "extruct", "bs4", "dateutil", "smtplib")
+
+_STARTUP_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+import marca_harvester as mh
+t1 = time.perf_counter()
+if {init!r}:
+    mh.init()
+t2 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "init": t2 - t1,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def _startup_sample(here, env, init=False):
+    code = _STARTUP_SNIPPET.format(init=init, heavy=HEAVY_MODULES)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=here, env=env, capture_output=True, text=True)
+    if proc.returncode:
+        sys.exit(proc.stderr[-4000:])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def bench_startup(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as state_dir:
+        base = dict(os.environ, NOTICIERO_STATE_DIR=state_dir, PYTHONPATH=here)
+        _startup_sample(here, base, init=True)  # calienta la caché de config y los .pyc
+        runs = [
+            ("import", dict(base), False),
+            ("import + init() (config compilada)", dict(base), True),
+            ("import + init() (parseando config.yaml)", dict(base, NOTICIERO_CONFIG_CACHE="0"), True),
+        ]
+        results = {}
+        for title, env, init in runs:
+            samples = [_startup_sample(here, env, init) for _ in range(args.repeat)]
+            total = [s["import"] + s["init"] for s in samples]
+            pc = percentiles(total, (50, 90))
+            print(f"{title:<40} p50 {1000 * pc[50]:7.1f} ms  p90 {1000 * pc[90]:7.1f} ms  min {1000 * min(total):7.1f} ms")
+            results[title] = 1000 * pc[50]
+        heavy = samples[-1]["heavy"]
+        print(f"Módulos pesados cargados tras import + init(): {', '.join(heavy) if heavy else 'ninguno'}")
+
+        if args.top:
+            proc = subprocess.run(
+                [sys.executable, "-X", "importtime", "-c", "import marca_harvester"],
+                cwd=here, env=base, capture_output=True, text=True,
+            )
+            rows = []
+            for line in proc.stderr.splitlines():
+                m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+                if m and len(m.group(3)) <= 3:  # sólo imports directos (y sus hijos inmediatos)
+                    rows.append((int(m.group(2)), m.group(4)))
+            print("\nImports más caros (acumulado, ms):")
+            for us, name in sorted(rows, reverse=True)[:args.top]:
+                print(f"  {name:<32} {us / 1000:8.1f}")
+    return {"import_ms": results["import"], "init_ms": results["import + init() (config compilada)"],
+            "heavy_modules": len(heavy)}
+
+
+# ========= CORPUS DE PRUEBA =========
+# Corpus sintético y determinista para CI: los tres primeros medios de
+# config.yaml, uno con sitemap de noticias (robots.txt), otro con RSS en la
+# portada y otro sólo con portada HTML. Hay artículos fuera de la ventana de
+# horas y uno sindicado (mismo cuerpo en dos medios).
+FIXTURE_ARTICLES = 15
+_WORDS = ("mercado bolsa empresa acciones gobierno inversión resultados beneficio sector "
+          "energía banco consejo presidente trimestre millones euros crecimiento ventas "
+          "deuda contrato acuerdo mercados analistas dividendo capital plan estrategia").split()
+
+def _fixture_text(rnd, n_words):
+    words = [rnd.choice(_WORDS) for _ in range(n_words)]
+    return " ".join(" ".join(words[k:k + 18]).capitalize() + "." for k in range(0, n_words, 18))
+
+def _fixture_article(src, k, url, published, body):
+    title = f"{src['name'].title()}: noticia {k} sobre {body.split()[1]} y {body.split()[3]}"
+    ld = {"@type": "NewsArticle", "headline": title, "datePublished": published.isoformat(),
+          "author": {"@type": "Person", "name": f"Redacción {src['name'].title()}"}}
+    paragraphs = "".join(f"<p>{body[i:i + 600]}</p>" for i in range(0, len(body), 600))
+    return (
+        f'<!DOCTYPE html><html lang="es"><head><meta charset="utf-8"><title>{title}</title>'
+        f'<meta property="article:published_time" content="{published.isoformat()}">'
+        f'<meta name="author" content="Redacción {src["name"].title()}">'
+        f'<link rel="canonical" href="{url}">'
+        f'<script type="application/ld+json">{json.dumps(ld, ensure_ascii=False)}</script></head>'
+        f'<body><header><nav><a href="{src["homepage"]}">Portada</a></nav></header>'
+        f'<main><article><h1>{title}</h1><div class="byline">Redacción {src["name"].title()}</div>'
+        f'{paragraphs}</article></main><footer>© {src["name"].title()}</footer></body></html>'
+    ), title
+
+def _fixture_response(url, body, content_type, extra=None):
+    r = requests.Response()
+    r.url, r.status_code = url, 200
+    r.headers.update({"Content-Type": content_type, **(extra or {})})
+    r._content = body.encode("utf-8")
+    return r
+
+def bench_fixture(args):
+    mh.configure(*mh.load_compiled_config())
+    sources = mh.SOURCES[:3]
+    if len(sources) < 3:
+        sys.exit("config.yaml necesita al menos tres fuentes")
+    if os.path.exists(args.corpus):
+        os.remove(args.corpus)
+    corpus = mh.HttpCorpus(args.corpus)
+    rnd = random.Random(2024)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    shared = _fixture_text(rnd, 420)  # el artículo sindicado
+    n_pages = 0
+    for j, src in enumerate(sources):
+        home = src["homepage"].rstrip("/") + "/"
+        entries = []
+        for k in range(FIXTURE_ARTICLES):
+            url = f"{home}economia/2024/noticia-{j}-{k}.html"
+            # uno de cada cinco queda fuera de la ventana de 24 h
+            published = now - timedelta(hours=40 + k if k % 5 == 4 else 1 + k)
+            body = shared if k == 3 and j < 2 else _fixture_text(rnd, rnd.randrange(250, 700))
+            html, title = _fixture_article(src, k, url, published, body)
+            corpus.record(url, _fixture_response(url, html, "text/html; charset=utf-8"), "article")
+            entries.append((url, title, published))
+        links = "".join(f'<article><h2><a href="{u}">{t}</a></h2></article>' for u, t, _ in entries)
+        alternate = f'<link rel="alternate" type="application/rss+xml" href="{home}rss/portada.xml">' if j == 1 else ""
+        page = f"<html><head><title>{src['name']}</title>{alternate}</head><body><main>{links}</main></body></html>"
+        corpus.record(home, _fixture_response(home, page, "text/html; charset=utf-8", {"ETag": f'"{j}"'}), "listing")
+        n_pages += 1
+        if j == 0:
+            robots = f"User-agent: *\nDisallow: /buscador/\nSitemap: {home}sitemap-news.xml\n"
+            corpus.record(home + "robots.txt", _fixture_response(home + "robots.txt", robots, "text/plain"), "page")
+            news = "".join(
+                f"<url><loc>{u}</loc><news:news><news:publication_date>{p.isoformat()}</news:publication_date>"
+                f"<news:title>{t}</news:title></news:news></url>" for u, t, p in entries)
+            sitemap = ('<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+                       f'xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">{news}</urlset>')
+            corpus.record(home + "sitemap-news.xml", _fixture_response(home + "sitemap-news.xml", sitemap, "application/xml"), "listing")
+            n_pages += 2
+        elif j == 1:
+            items = "".join(f"<item><title>{t}</title><link>{u}</link><pubDate>{format_datetime(p)}</pubDate></item>"
+                            for u, t, p in entries)
+            rss = f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>{src["name"]}</title>{items}</channel></rss>'
+            corpus.record(home + "rss/portada.xml", _fixture_response(home + "rss/portada.xml", rss, "application/rss+xml"), "listing")
+            n_pages += 1
+    corpus.close()
+    n_pages += FIXTURE_ARTICLES * len(sources)
+    print(f"{args.corpus}: {n_pages} respuestas de {', '.join(src['name'] for src in sources)} "
+          f"({os.path.getsize(args.corpus) / 1024:.0f} KB)")
+
+
+# ========= BASELINE =========
+def check_baseline(cmd, results, path):
+    """Medidas que se salen de los límites de `path` ({subcomando: {medida: {"max"|"min": valor}}})."""
+    with open(path, encoding="utf-8") as f:
+        limits = json.load(f).get(cmd) or {}
+    failures = []
+    for name, bound in limits.items():
+        value = results.get(name)
+        if value is None:
+            failures.append(f"{name}: no se ha medido")
+        elif "max" in bound and value > bound["max"]:
+            failures.append(f"{name} = {value:.2f} > {bound['max']} (máximo)")
+        elif "min" in bound and value < bound["min"]:
+            failures.append(f"{name} = {value:.2f} < {bound['min']} (mínimo)")
+    return failures
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmarks offline del recolector")
+    ap.add_argument("--baseline", help="JSON con límites por subcomando; sale con 1 si se superan")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("extract", help="CPU por etapa de la extracción de artículos")
+    p.add_argument("pages", help="directorio con páginas guardadas (*.html) o corpus grabado")
+    p.add_argument("--repeat", type=int, default=1)
+    p.set_defaults(func=bench_extract)
+
+    p = sub.add_parser("parse-pool", help="escalado del parseo con el pool de procesos")
+    p.add_argument("pages", help="directorio con páginas guardadas (*.html) o corpus grabado")
+    p.add_argument("--workers", default="1,2,4")
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=bench_parse_pool)
+
+    p = sub.add_parser("listing", help="parseo de listings y feeds del corpus")
+    p.add_argument("corpus")
+    p.set_defaults(func=bench_listing)
+
+    p = sub.add_parser("e2e", help="ejecución completa contra el corpus")
+    p.add_argument("corpus")
+    p.add_argument("--latency", type=float, default=0.05, help="latencia media simulada (s)")
+    p.add_argument("--errors", default="", help="p. ej. 403:0.01,429:0.02,503:0.01")
+    p.add_argument("--host-delay", type=float, default=0.0, help="pausa de cortesía por host (s)")
+    p.set_defaults(func=bench_e2e)
+
+    p = sub.add_parser("startup", help="tiempo de import y arranque del módulo")
+    p.add_argument("--repeat", type=int, default=10)
+    p.add_argument("--top", type=int, default=10, help="imports más caros a mostrar (0 = ninguno)")
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("fixture", help="genera el corpus sintético de CI")
+    p.add_argument("corpus")
+    p.set_defaults(func=bench_fixture)
+
+    args = ap.parse_args(argv)
+    results = args.func(args) or {}
+    if args.baseline:
+        failures = check_baseline(args.cmd, results, args.baseline)
+        for failure in failures:
+            print(f"[BASELINE] {args.cmd}: {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"[BASELINE] {args.cmd}: dentro de los límites de {args.baseline}")
+
+if __name__ == "__main__":
+    main()
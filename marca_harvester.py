@@ -1,44 +1,123 @@
 # noticias_harvester.py
 # -*- coding: utf-8 -*-
-import os, json, time, re, sys, unicodedata, smtplib, ssl, random
-from datetime import datetime
-from urllib.parse import urljoin
+import os, io, json, argparse, html, gzip, tempfile, time, re, sys, signal, unicodedata, random, threading, queue, sqlite3, hashlib, zlib, heapq
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeout
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from urllib.parse import urljoin, urlsplit, urlunsplit
 import requests
+import urllib3
 from requests.adapters import HTTPAdapter, Retry
 from requests.exceptions import HTTPError
-from bs4 import BeautifulSoup
-import trafilatura
-import extruct
 import yaml
-from email.message import EmailMessage
-from w3lib.html import get_base_url
-from dateutil import tz, parser as dateparser
+import email.utils
+# lxml, trafilatura, extruct, bs4, dateutil y smtplib (los más pesados) se
+# importan la primera vez que se usan: importar el módulo cuesta poco
+# (python bench.py startup).
 
 CONFIG_FILE = "config.yaml"
 
 # ========= CONFIG =========
-def load_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f) or {}
+def load_config(path=CONFIG_FILE):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
     return {}
 
-CFG = load_config()
-
-# ========= FUENTES =========
-SOURCES_RAW = CFG.get("sources", [])
-SOURCES = []
-for s in SOURCES_RAW:
-    url = s.get("url")
-    if not url:
-        continue
-    SOURCES.append({
-        "name": s.get("name", "SIN_NOMBRE"),
-        "listing": s.get("listing", url),           # permite RSS/feed si se define
-        "homepage": url,
-        "domain_prefix": s.get("domain_prefix", url),
-        "max_to_fetch": s.get("max_to_fetch", 400),
-    })
+def compile_sources(raw):
+    """Fuentes de config.yaml validadas (sin url se descartan) y con sus valores por defecto."""
+    sources = []
+    for s in raw or []:
+        url = s.get("url")
+        if not url:
+            continue
+        sources.append({
+            "name": sys.intern(s.get("name", "SIN_NOMBRE")),
+            "listing": s.get("listing", url),           # permite RSS/feed si se define
+            "homepage": url,
+            "domain_prefix": s.get("domain_prefix", url),
+            "max_to_fetch": s.get("max_to_fetch", 400),
+            "cache_fresh_seconds": s.get("cache_fresh_seconds"),  # None = valor global de http_cache
+        })
+    return sources
+
+# La config ya validada se guarda como JSON en el __pycache__ de este módulo y
+# se reutiliza mientras config.yaml (ruta, mtime y tamaño) y el propio módulo
+# no cambien: sin leer ni parsear YAML ni revalidar fuentes en cada arranque.
+# NOTICIERO_CONFIG_CACHE=0 la desactiva. Se lee en init(), no al importar.
+CONFIG_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__", "config.yaml.json")
+
+def _config_cache_key(path):
+    """[ruta, mtime, tamaño] de config.yaml y de este módulo; OSError si config.yaml no existe."""
+    st = os.stat(path)
+    try:
+        mod = os.stat(__file__)
+        mod = (mod.st_mtime_ns, mod.st_size)
+    except OSError:
+        mod = (0, 0)
+    return [os.path.abspath(path), st.st_mtime_ns, st.st_size, *mod]
+
+def load_compiled_config(path=CONFIG_FILE, cache_file=CONFIG_CACHE_FILE):
+    """(config, fuentes validadas), desde la caché compilada si sigue vigente."""
+    try:
+        key = _config_cache_key(path)
+    except FileNotFoundError:
+        return {}, []
+    use_cache = os.getenv("NOTICIERO_CONFIG_CACHE", "1") != "0"
+    if use_cache:
+        try:
+            with open(cache_file, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("key") == key:
+                for src in data["sources"]:
+                    src["name"] = sys.intern(src["name"])
+                return data["cfg"], data["sources"]
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            pass
+    with open(path, "rb") as f:
+        cfg = yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader)) or {}
+    sources = compile_sources(cfg.get("sources", []))
+    if use_cache:
+        data = {"key": key, "cfg": cfg, "sources": sources}
+        try:
+            text = json.dumps(data, ensure_ascii=False)
+            # fechas sin comillas, claves numéricas…: si JSON no lo reproduce igual, sin caché
+            if json.loads(text) != data:
+                return cfg, sources
+            os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+            tmp = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, cache_file)
+        except (OSError, TypeError, ValueError):
+            pass  # directorio de sólo lectura o valores sin JSON: se parsea cada vez
+    return cfg, sources
+
+# Config y fuentes: las carga init(); hasta entonces rigen los valores por
+# defecto (ver configure() en ARRANQUE).
+CFG, SOURCES = {}, []
+
+def _parse_shard(argv, env=None):
+    """
+    (i, N) de --shard i/N (o NOTICIERO_SHARD=i/N); None si no se reparte.
+    ValueError si no es un reparto válido.
+    """
+    spec = env
+    for k, arg in enumerate(argv):
+        if arg == "--shard" and k + 1 < len(argv):
+            spec = argv[k + 1]
+        elif arg.startswith("--shard="):
+            spec = arg.split("=", 1)[1]
+    if not spec:
+        return None
+    m = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", spec)
+    if not m or not 0 <= int(m.group(1)) < int(m.group(2)):
+        raise ValueError(f"--shard espera i/N con 0 <= i < N (recibido {spec!r})")
+    return int(m.group(1)), int(m.group(2))
+
+SHARD = None  # (i, N) con --shard; lo fija init()
 
 # ========= CNMV POSICIONES CORTAS =========
 # URL tal y como la usas en el navegador
@@ -54,8 +133,6 @@ def _normalize_cnmv_nifs(cfg: dict):
         return [str(x).strip() for x in raw if str(x).strip()]
     return []
 
-CNMV_NIFS = _normalize_cnmv_nifs(CFG)
-CNMV_LANG = (CFG.get("cnmv_lang") or "es").lower()
 
 # ========= RED =========
 DEFAULT_HEADERS = {
@@ -68,30 +145,718 @@ DEFAULT_HEADERS = {
     "Accept-Language": "es-ES,es;q=0.9,en;q=0.8",
     "Referer": "https://www.google.com/",
     "Connection": "keep-alive",
+    # sólo las compresiones que urllib3 sabe descomprimir aquí (br con brotli instalado)
+    "Accept-Encoding": urllib3.util.make_headers(accept_encoding=True)["accept-encoding"],
 }
 TIMEOUT = 20
-SLEEP_BETWEEN = 0.8
+CONNECT_TIMEOUT = 6  # un host que no acepta conexiones no retiene un hilo TIMEOUT segundos
+HOST_JITTER = 0.25
+# 429/503: se reintenta respetando Retry-After (hasta RETRY_AFTER_MAX) y, si no
+# lo trae, con espera exponencial con jitter; la pausa vale para todo el host.
+STATUS_RETRIES = 2
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+# ========= MÉTRICAS =========
+# Instrumentación del camino caliente: tiempos por petición (conexión, TLS,
+# primer byte, transferencia), listings por fuente, etapas de extracción,
+# motivos de descarte y CNMV. Al final de main() se vuelca un informe JSON
+# (o Prometheus si el fichero acaba en .prom) para decidir qué fuentes
+# cuestan demasiado para lo que aportan.
+_NET_TIMING = threading.local()
+
+def _percentile(sorted_values, p):
+    """Percentil `p` (0-100) de una lista ya ordenada, redondeado a ms; 0.0 si está vacía."""
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[min(len(sorted_values) - 1, int(p / 100 * (len(sorted_values) - 1)))], 3)
+
+class RunMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.http = {}       # host -> agregados
+        self.listings = {}   # fuente -> {"seconds", "links", "strategy", "forbidden"}
+        self.stages = {}     # etapa de extracción -> segundos CPU
+        self.drops = {}      # motivo -> nº
+        self.sources = {}    # fuente -> {"fetched", "in_window", "accepted", "dropped": {motivo: n}}
+        self.cnmv = {}       # nif -> {"seconds", "rows", "ok"}
+
+    def record_http(self, url, status, total, ttfb=0.0, nbytes=0, retries=0, from_cache=False):
+        host = (urlsplit(url).hostname or "").lower()
+        connect = getattr(_NET_TIMING, "connect", 0.0)
+        tls = getattr(_NET_TIMING, "tls", 0.0)
+        with self._lock:
+            h = self.http.setdefault(host, {
+                "requests": 0, "bytes": 0, "retries": 0, "from_cache": 0, "status": {},
+                "seconds": 0.0, "connect": 0.0, "tls": 0.0, "ttfb": 0.0, "transfer": 0.0,
+                "durations": [],
+            })
+            h["requests"] += 1
+            h["bytes"] += nbytes
+            h["retries"] += retries
+            h["from_cache"] += 1 if from_cache else 0
+            h["status"][str(status)] = h["status"].get(str(status), 0) + 1
+            h["seconds"] += total
+            h["connect"] += connect
+            h["tls"] += tls
+            h["ttfb"] += ttfb
+            h["transfer"] += max(0.0, total - ttfb)
+            h["durations"].append(total)
+
+    def record_transfer(self, url, seconds, nbytes):
+        """Cuerpo leído en streaming después de record_http (sólo cabeceras)."""
+        host = (urlsplit(url).hostname or "").lower()
+        with self._lock:
+            h = self.http.get(host)
+            if h is None:
+                return
+            h["bytes"] += nbytes
+            h["seconds"] += seconds
+            h["transfer"] += seconds
+
+    def record_listing(self, source, seconds, links, strategy, forbidden):
+        with self._lock:
+            self.listings[source] = {
+                "seconds": round(seconds, 3), "links": links, "strategy": strategy, "forbidden": forbidden,
+            }
+
+    def record_stages(self, timings):
+        with self._lock:
+            for k, v in (timings or {}).items():
+                self.stages[k] = self.stages.get(k, 0.0) + v
+
+    def _source(self, source):
+        return self.sources.setdefault(source, {"fetched": 0, "in_window": 0, "accepted": 0, "dropped": {}})
+
+    def count(self, source, field):
+        with self._lock:
+            self._source(source)[field] += 1
+
+    def drop(self, reason, source="?"):
+        with self._lock:
+            self.drops[reason] = self.drops.get(reason, 0) + 1
+            d = self._source(source)["dropped"]
+            d[reason] = d.get(reason, 0) + 1
+
+    def record_cnmv(self, nif, seconds, rows, ok):
+        with self._lock:
+            self.cnmv[nif] = {"seconds": round(seconds, 3), "rows": rows, "ok": ok}
+
+    def report(self):
+        with self._lock:
+            hosts = {}
+            for host, h in self.http.items():
+                d = sorted(h["durations"])
+                hosts[host] = {k: (round(v, 3) if isinstance(v, float) else v) for k, v in h.items() if k != "durations"}
+                hosts[host].update({f"p{p}": _percentile(d, p) for p in (50, 90, 99)})
+            host_to_source = {(urlsplit(src["homepage"]).hostname or "").lower(): src["name"] for src in SOURCES}
+            sources = {}
+            for name in set(self.listings) | set(self.sources):
+                row = dict(self.sources.get(name) or {"fetched": 0, "in_window": 0, "accepted": 0, "dropped": {}})
+                row["listing"] = self.listings.get(name)
+                row["http_seconds"] = round(sum(
+                    h["seconds"] for host, h in self.http.items() if host_to_source.get(host) == name
+                ), 3)
+                sources[name] = row
+            return {
+                "started": datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "seconds": round(time.time() - self.started, 3),
+                "http": hosts,
+                "http_cache": dict(HTTP_CACHE.stats) if HTTP_CACHE is not None else None,
+                "extract_stages_cpu": {k: round(v, 3) for k, v in self.stages.items()},
+                "drops": dict(self.drops),
+                "sources": sources,
+                "cnmv": dict(self.cnmv),
+                "blocked_hosts": dict(BREAKER.blocked),
+            }
+
+    @staticmethod
+    def _prom_label(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"')
+
+    def to_prometheus(self, rep):
+        lb = self._prom_label
+        out = [
+            "# TYPE noticiero_run_seconds gauge",
+            f"noticiero_run_seconds {rep['seconds']}",
+            "# TYPE noticiero_http_requests_total counter",
+        ]
+        for host, h in rep["http"].items():
+            for status, n in h["status"].items():
+                out.append(f'noticiero_http_requests_total{{host="{lb(host)}",status="{status}"}} {n}')
+        out.append("# TYPE noticiero_http_seconds_total counter")
+        for host, h in rep["http"].items():
+            for phase in ("connect", "tls", "ttfb", "transfer"):
+                out.append(f'noticiero_http_seconds_total{{host="{lb(host)}",phase="{phase}"}} {h[phase]}')
+        out.append("# TYPE noticiero_http_bytes_total counter")
+        for host, h in rep["http"].items():
+            out.append(f'noticiero_http_bytes_total{{host="{lb(host)}"}} {h["bytes"]}')
+        out.append("# TYPE noticiero_http_retries_total counter")
+        for host, h in rep["http"].items():
+            out.append(f'noticiero_http_retries_total{{host="{lb(host)}"}} {h["retries"]}')
+        if rep["http_cache"]:
+            out.append("# TYPE noticiero_http_cache_total counter")
+            for k, v in rep["http_cache"].items():
+                out.append(f'noticiero_http_cache_total{{result="{k}"}} {v}')
+        out.append("# TYPE noticiero_extract_stage_cpu_seconds_total counter")
+        for k, v in rep["extract_stages_cpu"].items():
+            out.append(f'noticiero_extract_stage_cpu_seconds_total{{stage="{lb(k)}"}} {v}')
+        out.append("# TYPE noticiero_dropped_total counter")
+        for k, v in rep["drops"].items():
+            out.append(f'noticiero_dropped_total{{reason="{lb(k)}"}} {v}')
+        out.append("# TYPE noticiero_source_articles gauge")
+        for name, row in rep["sources"].items():
+            for field in ("fetched", "in_window", "accepted"):
+                out.append(f'noticiero_source_articles{{source="{lb(name)}",stage="{field}"}} {row[field]}')
+        out.append("# TYPE noticiero_source_listing_seconds gauge")
+        for name, row in rep["sources"].items():
+            if row["listing"]:
+                out.append(f'noticiero_source_listing_seconds{{source="{lb(name)}"}} {row["listing"]["seconds"]}')
+        out.append("# TYPE noticiero_cnmv_seconds gauge")
+        for nif, c in rep["cnmv"].items():
+            out.append(f'noticiero_cnmv_seconds{{nif="{lb(nif)}"}} {c["seconds"]}')
+        return "\n".join(out) + "\n"
+
+    def write(self, path=None):
+        path = path or REPORT_FILE
+        rep = self.report()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus(rep))
+            else:
+                json.dump(rep, f, ensure_ascii=False, indent=2)
+        return rep
+
+METRICS = RunMetrics()
+
+class _TimedConnectMixin:
+    """Suma al hilo actual el tiempo de conexión (DNS + TCP) y de TLS."""
+    def _new_conn(self):
+        t0 = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            _NET_TIMING.connect = getattr(_NET_TIMING, "connect", 0.0) + time.perf_counter() - t0
+
+class TimedHTTPConnection(_TimedConnectMixin, urllib3.connection.HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(_TimedConnectMixin, urllib3.connection.HTTPSConnection):
+    def connect(self):
+        t0 = time.perf_counter()
+        c0 = getattr(_NET_TIMING, "connect", 0.0)
+        try:
+            super().connect()
+        finally:
+            tcp = getattr(_NET_TIMING, "connect", 0.0) - c0
+            _NET_TIMING.tls = getattr(_NET_TIMING, "tls", 0.0) + time.perf_counter() - t0 - tcp
+
+class TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool,
+        }
+
+def _reset_net_timing():
+    _NET_TIMING.connect = 0.0
+    _NET_TIMING.tls = 0.0
+
+def _retries_of(r):
+    retries = getattr(getattr(r, "raw", None), "retries", None)
+    return len(retries.history) if retries is not None and retries.history else 0
 
-SESSION = requests.Session()
+# Errores de conexión y 5xx transitorios se reintentan dentro de urllib3;
+# 429/503 los gestiona http_get (Retry-After por host y cortacircuitos).
 RETRIES = Retry(
-    total=4,
+    total=3,
+    connect=2,
+    read=1,
     backoff_factor=0.6,
-    status_forcelist=[429, 500, 502, 503, 504],
+    backoff_max=BACKOFF_MAX,
+    backoff_jitter=0.3,
+    status_forcelist=[500, 502, 504],
     allowed_methods=["GET", "HEAD"],
     raise_on_status=False,
 )
-SESSION.mount("https://", HTTPAdapter(max_retries=RETRIES))
-SESSION.mount("http://", HTTPAdapter(max_retries=RETRIES))
+SESSION = None  # la crea init() (open_session)
+
+def open_session():
+    """
+    Sesión compartida. Pools de conexiones: uno por host (medios, feeds en
+    otros dominios, CNMV) y en cada uno tantas conexiones como hilos, para que
+    ninguna se descarte.
+    """
+    session = requests.Session()
+    for scheme in ("https://", "http://"):
+        session.mount(scheme, TimedHTTPAdapter(
+            max_retries=RETRIES, pool_connections=max(32, 2 * len(SOURCES) + 8), pool_maxsize=WORKERS,
+        ))
+    return session
+
+_LOG_LOCK = threading.Lock()
 
 def log(m):
-    print(m, flush=True)
+    with _LOG_LOCK:
+        print(m, flush=True)
 
-def http_get(url: str, timeout: int = TIMEOUT) -> requests.Response:
-    time.sleep(0.25 + random.random() * 0.5)  # jitter
-    r = SESSION.get(url, headers=DEFAULT_HEADERS, timeout=timeout, allow_redirects=True)
+class HostRateLimiter:
+    """
+    Token bucket por host (variante GCRA): cada host recibe como mucho una
+    petición cada `interval` segundos, con ráfagas de hasta `burst`.
+    Los hilos reservan su turno bajo el lock y duermen fuera de él, así que
+    hosts distintos nunca se bloquean entre sí. `intervals` fija un intervalo
+    propio para hosts concretos (p. ej. la CNMV).
+    """
+    def __init__(self, interval: float, burst: int = 1, jitter: float = 0.0, intervals=None):
+        self.interval = max(0.0, interval)
+        self.burst = max(1, burst)
+        self.jitter = jitter
+        self.intervals = {h.lower(): max(0.0, float(v)) for h, v in (intervals or {}).items()}
+        self._tat = {}  # host -> "theoretical arrival time" del siguiente token
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        host = (urlsplit(url).hostname or "").lower()
+        step = self.intervals.get(host, self.interval) + random.random() * self.jitter
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat.get(host, now), now)
+            delay = max(0.0, tat - (self.burst - 1) * step - now)
+            self._tat[host] = tat + step
+        if delay:
+            time.sleep(delay)
+
+    def defer(self, url: str, seconds: float):
+        """Ningún hilo vuelve a pedir a este host hasta dentro de `seconds`."""
+        host = (urlsplit(url).hostname or "").lower()
+        with self._lock:
+            self._tat[host] = max(self._tat.get(host, 0.0), time.monotonic() + max(0.0, seconds))
+
+class HostBlocked(requests.RequestException):
+    """El cortacircuitos ha cerrado el host: no se le pide nada más en esta ejecución."""
+
+class HostCircuitBreaker:
+    """
+    Fallos seguidos por host que indican bloqueo o saturación (403, 429, 503,
+    timeouts, conexiones rechazadas). Al llegar a `threshold` el host queda
+    abierto el resto de la ejecución: http_get falla al momento con
+    HostBlocked, sin esperar turno ni tocar la red. Una respuesta válida pone
+    el contador a cero.
+    """
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._failures = {}  # host -> fallos seguidos
+            self.blocked = {}    # host -> motivo
+
+    @staticmethod
+    def _host(url):
+        return (urlsplit(url).hostname or "").lower()
+
+    def is_blocked(self, url) -> bool:
+        return self._host(url) in self.blocked
+
+    def check(self, url):
+        reason = self.blocked.get(self._host(url))
+        if reason:
+            raise HostBlocked(f"{self._host(url)} bloqueado: {reason}")
+
+    def success(self, url):
+        if self._failures:
+            with self._lock:
+                self._failures.pop(self._host(url), None)
+
+    def failure(self, url, reason) -> bool:
+        """Anota un fallo; True si el host queda (o ya estaba) bloqueado."""
+        if not self.threshold:
+            return False
+        host = self._host(url)
+        with self._lock:
+            if host in self.blocked:
+                return True
+            n = self._failures[host] = self._failures.get(host, 0) + 1
+        if n < self.threshold:
+            return False
+        self.trip(url, f"{n} fallos seguidos, el último {reason}")
+        return True
+
+    def trip(self, url, reason):
+        host = self._host(url)
+        with self._lock:
+            if host in self.blocked:
+                return
+            self.blocked[host] = reason
+        log(f"[BLOQUEO] {host}: {reason}. No se le pide nada más en esta ejecución.")
+
+def _retry_after_seconds(r):
+    """Espera pedida en Retry-After (segundos o fecha HTTP); None si no la hay."""
+    value = (r.headers.get("Retry-After") or "").strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def _backoff_seconds(attempt):
+    """Espera exponencial con jitter (mitad fija, mitad aleatoria)."""
+    cap = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return cap / 2 + random.random() * cap / 2
+
+# ========= CACHÉ HTTP (GET condicional) =========
+# Listings, feeds y páginas CNMV se guardan con su ETag/Last-Modified; en la
+# siguiente ejecución se piden con If-None-Match/If-Modified-Since y un 304 se
+# sirve desde disco sin descargar el cuerpo.
+
+class HttpCache:
+    """
+    Caché HTTP en disco (SQLite) con expulsión LRU por tamaño total.
+    Contadores: hits (servido sin red), revalidations (304) y misses.
+    """
+    def __init__(self, path=None, max_bytes=None):
+        path = path or HTTP_CACHE_FILE
+        max_bytes = HTTP_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "revalidations": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, headers TEXT,"
+            " encoding TEXT, body BLOB, size INTEGER NOT NULL,"
+            " stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries (accessed_at)")
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get(self, url):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag, last_modified, headers, encoding, body, stored_at FROM entries WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if not row:
+            return None
+        etag, last_modified, headers, encoding, body, stored_at = row
+        return {
+            "etag": etag, "last_modified": last_modified, "headers": json.loads(headers or "{}"),
+            "encoding": encoding, "body": body, "stored_at": stored_at,
+        }
+
+    def touch(self, url, fresh=False):
+        now = time.time()
+        with self._lock, self._db:
+            if fresh:
+                self._db.execute("UPDATE entries SET accessed_at = ?, stored_at = ? WHERE url = ?", (now, now, url))
+            else:
+                self._db.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (now, url))
+
+    def put(self, url, r: requests.Response):
+        body = r.content or b""
+        if len(body) > self.max_bytes:
+            return
+        now = time.time()
+        keep = {k: v for k, v in r.headers.items() if k.lower() in ("content-type", "etag", "last-modified")}
+        with self._lock, self._db:
+            old = self._db.execute("SELECT size FROM entries WHERE url = ?", (url,)).fetchone()
+            self._total -= old[0] if old else 0
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?,?,?,?,?,?,?,?,?)",
+                (url, r.headers.get("ETag"), r.headers.get("Last-Modified"), json.dumps(keep),
+                 r.encoding, body, len(body), now, now),
+            )
+            self._total += len(body)
+            self._evict()
+
+    def _evict(self):
+        while self._total > self.max_bytes:
+            victims = self._db.execute(
+                "SELECT url, size FROM entries ORDER BY accessed_at LIMIT 32"
+            ).fetchall()
+            if not victims:
+                break
+            # las más antiguas, sólo hasta volver por debajo del límite
+            gone = []
+            for url, size in victims:
+                if self._total <= self.max_bytes:
+                    break
+                gone.append((url,))
+                self._total -= size
+            self._db.executemany("DELETE FROM entries WHERE url = ?", gone)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def as_response(url, entry) -> requests.Response:
+        r = requests.Response()
+        r.url = url
+        r.status_code = 200
+        r.reason = "OK (cache)"
+        r.headers.update(entry["headers"])
+        r.encoding = entry["encoding"]
+        r._content = entry["body"]
+        r.from_cache = True
+        return r
+
+HTTP_CACHE = None  # se abre en init()
+
+def open_http_cache():
+    if HTTP_CACHE_MAX_BYTES <= 0:
+        return None
+    try:
+        return HttpCache()
+    except sqlite3.Error as e:
+        log(f"[CACHE] No se pudo abrir {HTTP_CACHE_FILE}: {e}. Caché HTTP desactivada.")
+        return None
+
+# ========= GRABACIÓN / REPRODUCCIÓN HTTP =========
+# NOTICIERO_RECORD=fichero.sqlite graba cada respuesta de http_get en un
+# corpus (cuerpos comprimidos, índice por URL). NOTICIERO_REPLAY=fichero.sqlite
+# monta un adaptador en SESSION que sirve ese corpus sin red, con latencia
+# (NOTICIERO_REPLAY_LATENCY, segundos) y errores inyectados
+# (NOTICIERO_REPLAY_ERRORS="403:0.02,429:0.05,503:0.01"). Ver bench.py.
+_HOP_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection"}
+
+class HttpCorpus:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY, kind TEXT NOT NULL, status INTEGER NOT NULL,"
+            " headers TEXT NOT NULL, body BLOB NOT NULL, size INTEGER NOT NULL,"
+            " recorded_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_kind ON responses (kind)")
+
+    def record(self, url, r: requests.Response, kind, body=None):
+        body = r.content if body is None else body
+        headers = {k: v for k, v in r.headers.items() if k.lower() not in _HOP_HEADERS}
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?,?,?,?,?,?,?)",
+                (url, kind, r.status_code, json.dumps(headers), zlib.compress(body or b"", 6),
+                 len(body or b""), time.time()),
+            )
+
+    def get(self, url):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, headers, body FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], json.loads(row[1]), zlib.decompress(row[2])
+
+    def urls(self, kind=None, status=200):
+        q = "SELECT url FROM responses WHERE status = ?"
+        args = [status]
+        if kind:
+            q += " AND kind = ?"
+            args.append(kind)
+        with self._lock:
+            return [u for (u,) in self._db.execute(q + " ORDER BY url", args)]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+class ReplayAdapter(HTTPAdapter):
+    """Adaptador de requests que responde desde un HttpCorpus (URL ausente = 404)."""
+    def __init__(self, corpus, latency=0.0, errors=None, seed=0):
+        super().__init__()
+        self.corpus = corpus
+        self.latency = latency
+        self.errors = errors or []  # [(status, probabilidad)]
+        self._rnd = random.Random(seed)
+        self.stats = {"served": 0, "missing": 0, "injected": 0}
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if self.latency:
+            time.sleep(self.latency * (0.5 + self._rnd.random()))
+        roll, acc, injected = self._rnd.random(), 0.0, None
+        for status, prob in self.errors:
+            acc += prob
+            if roll < acc:
+                injected = status
+                break
+        hit = None if injected else self.corpus.get(request.url)
+        if injected:
+            self.stats["injected"] += 1
+            status, headers, body = injected, {"Content-Type": "text/plain"}, b""
+        elif hit is None:
+            self.stats["missing"] += 1
+            status, headers, body = 404, {"Content-Type": "text/plain"}, b""
+        else:
+            self.stats["served"] += 1
+            status, headers, body = hit
+        headers = dict(headers, **{"Content-Length": str(len(body))})
+        raw = urllib3.HTTPResponse(
+            body=io.BytesIO(body), headers=headers, status=status,
+            preload_content=False, decode_content=False, request_method=request.method,
+        )
+        return self.build_response(request, raw)
+
+def _parse_replay_errors(spec):
+    out = []
+    for part in (spec or "").split(","):
+        if ":" in part:
+            status, prob = part.split(":", 1)
+            out.append((int(status), float(prob)))
+    return out
+
+RECORDER = None
+REPLAY = None
+
+def setup_record_replay():
+    global RECORDER, REPLAY
+    if multiprocessing.current_process().name != "MainProcess":
+        return  # procesos del pool de parseo: no hacen red
+    if os.getenv("NOTICIERO_REPLAY"):
+        REPLAY = ReplayAdapter(
+            HttpCorpus(os.getenv("NOTICIERO_REPLAY")),
+            latency=float(os.getenv("NOTICIERO_REPLAY_LATENCY") or 0),
+            errors=_parse_replay_errors(os.getenv("NOTICIERO_REPLAY_ERRORS")),
+        )
+        SESSION.mount("https://", REPLAY)
+        SESSION.mount("http://", REPLAY)
+        log(f"[REPLAY] Sirviendo respuestas desde {REPLAY.corpus.path}")
+    elif os.getenv("NOTICIERO_RECORD"):
+        RECORDER = HttpCorpus(os.getenv("NOTICIERO_RECORD"))
+        log(f"[RECORD] Grabando respuestas en {RECORDER.path}")
+
+
+class ResponseTooLarge(requests.RequestException):
+    """La respuesta supera max_response_mb."""
+
+def _read_capped(r, url, limit=None):
+    """Lee el cuerpo de una respuesta en streaming sin pasar de `limit` bytes."""
+    limit = limit or MAX_RESPONSE_BYTES
+    declared = r.headers.get("Content-Length", "")
+    if declared.isdigit() and int(declared) > limit:
+        r.close()
+        raise ResponseTooLarge(f"{url}: {declared} bytes (máximo {limit})", response=r)
+    buf = bytearray()
+    for chunk in r.iter_content(CHUNK_SIZE):
+        buf += chunk
+        if len(buf) > limit:
+            r.close()
+            raise ResponseTooLarge(f"{url}: más de {limit} bytes", response=r)
+    r._content = bytes(buf)
+    r._content_consumed = True
+    return r
+
+def http_get(url: str, timeout: int = TIMEOUT, cache_ttl: float = None, stream: bool = False) -> requests.Response:
+    """
+    cache_ttl=None no usa la caché (artículos). Con cache_ttl >= 0 la copia en
+    disco se sirve sin red durante cache_ttl segundos y después se revalida
+    con GET condicional. Con stream=True el cuerpo no se lee (ni se cachea);
+    si no, se lee en streaming hasta max_response_mb.
+    """
+    headers = DEFAULT_HEADERS
+    entry = None
+    if cache_ttl is not None and HTTP_CACHE is not None and not stream:
+        entry = HTTP_CACHE.get(url)
+        if entry and time.time() - entry["stored_at"] < cache_ttl:
+            HTTP_CACHE.count("hits")
+            HTTP_CACHE.touch(url)
+            r = HttpCache.as_response(url, entry)
+            METRICS.record_http(url, r.status_code, 0.0, nbytes=len(r.content), from_cache=True)
+            if RECORDER is not None:
+                RECORDER.record(url, r, "listing")
+            return r
+        if entry:
+            headers = dict(DEFAULT_HEADERS)
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+    # 429/503: el host pide que se espere; la pausa (Retry-After o backoff)
+    # se aplica al host entero vía POLITENESS, no sólo a este hilo.
+    for attempt in range(STATUS_RETRIES + 1):
+        BREAKER.check(url)
+        POLITENESS.wait(url)
+        _reset_net_timing()
+        t0 = time.perf_counter()
+        try:
+            r = SESSION.get(
+                url, headers=headers, timeout=(min(CONNECT_TIMEOUT, timeout), timeout),
+                allow_redirects=True, stream=True,
+            )
+            throttled = r.status_code in (429, 503)
+            if throttled:
+                r.close()
+            elif not stream:
+                _read_capped(r, url)
+        except requests.RequestException as e:
+            METRICS.record_http(url, type(e).__name__, time.perf_counter() - t0)
+            if isinstance(e, (requests.Timeout, requests.ConnectionError)):
+                BREAKER.failure(url, type(e).__name__)
+            raise
+        ttfb = r.elapsed.total_seconds()
+        # Con stream=True sólo se han leído las cabeceras: la transferencia del
+        # cuerpo la mide read_article_html.
+        METRICS.record_http(
+            url, r.status_code, time.perf_counter() - t0 if not stream else ttfb, ttfb=ttfb,
+            nbytes=0 if stream or throttled else len(r.content),
+            retries=_retries_of(r) + (1 if attempt else 0),
+        )
+        if not throttled or BREAKER.failure(url, str(r.status_code)) or attempt == STATUS_RETRIES:
+            break
+        delay = _retry_after_seconds(r)
+        if delay is not None and delay > RETRY_AFTER_MAX:
+            BREAKER.trip(url, f"{r.status_code} con Retry-After de {int(delay)} s")
+            break
+        POLITENESS.defer(url, _backoff_seconds(attempt) if delay is None else delay)
+    if r.status_code == 403:
+        BREAKER.failure(url, "403")
+    elif r.status_code < 500 and r.status_code != 429:
+        BREAKER.success(url)
+    if r.status_code == 304 and entry:
+        HTTP_CACHE.count("revalidations")
+        HTTP_CACHE.touch(url, fresh=True)
+        r = HttpCache.as_response(url, entry)
+    if RECORDER is not None and not stream:
+        RECORDER.record(url, r, "listing" if cache_ttl is not None else "page")
+    if getattr(r, "from_cache", False):
+        return r
     if r.status_code == 403:
         raise HTTPError(f"403 Forbidden for {url}", response=r)
     r.raise_for_status()
+    if cache_ttl is not None and HTTP_CACHE is not None and not stream:
+        HTTP_CACHE.count("misses")
+        if cache_ttl > 0 or r.headers.get("ETag") or r.headers.get("Last-Modified"):
+            HTTP_CACHE.put(url, r)
     return r
 
 # ========= EMAIL (Gmail SSL 465) =========
@@ -99,14 +864,393 @@ SMTP_HOST = "smtp.gmail.com"
 SMTP_PORT = 465
 SMTP_USER = "anartz.azumendi@brainandcode.tech"
 SMTP_PASS = os.getenv("SMTP_PASS")
-TO_EMAILS = CFG.get("to_emails", ["anartz2001@gmail.com"])
 
 # ========= UTILIDADES =========
+class _StripCombining(dict):
+    """Tabla para str.translate que elimina diacríticos; se rellena bajo demanda."""
+    def __missing__(self, cp):
+        v = None if unicodedata.combining(chr(cp)) else cp
+        self[cp] = v
+        return v
+
+_STRIP_COMBINING = _StripCombining()
+NORM_CACHE_MAX_LEN = 512  # títulos, URLs, keywords: se memorizan
+
+def _norm(s: str) -> str:
+    if s.isascii():
+        return s.lower()
+    return unicodedata.normalize('NFKD', s).translate(_STRIP_COMBINING).lower()
+
+_norm_cached = lru_cache(maxsize=65536)(_norm)
+
 def norm(s: str) -> str:
     if not s:
         return ""
-    s = unicodedata.normalize('NFKD', s)
-    return ''.join(c for c in s if not unicodedata.combining(c)).lower()
+    if len(s) <= NORM_CACHE_MAX_LEN:
+        return _norm_cached(s)
+    return _norm(s)
+
+# ========= FECHAS =========
+# Camino rápido antes de dateutil: ISO 8601 (JSON-LD, metas, sitemaps) con
+# datetime.fromisoformat, RFC 822 (pubDate de RSS) con email.utils y
+# dd/mm/aaaa (CNMV, webs en español; dateutil lo leería como mm/dd).
+# Resultados y zonas horarias se memorizan.
+_DMY_RE = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})$")
+_RFC822_RE = re.compile(r"^(?:[A-Za-z]{3},\s*)?\d{1,2}\s+[A-Za-z]{3}\s+\d{2,4}\s")
+
+@lru_cache(maxsize=None)
+def get_tz(tzname):
+    from dateutil import tz
+    return tz.gettz(tzname)
+
+@lru_cache(maxsize=8192)
+def parse_datetime(text):
+    """datetime (con o sin zona) de un texto de fecha, o None si no se entiende."""
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        return datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith(("Z", "z")) else text)
+    except ValueError:
+        pass
+    m = _DMY_RE.match(text)
+    if m:
+        try:
+            return datetime(int(m.group(3)), int(m.group(2)), int(m.group(1)))
+        except ValueError:
+            return None
+    if _RFC822_RE.match(text):
+        try:
+            return email.utils.parsedate_to_datetime(text)
+        except (TypeError, ValueError):
+            pass
+    from dateutil import parser as dateparser
+    try:
+        return dateparser.parse(text)
+    except (ValueError, OverflowError):
+        return None
+
+class KeywordMatcher:
+    """
+    Todas las keywords (sin tildes, minúsculas) compiladas en una única regex:
+    cada texto se normaliza y recorre una sola vez, sea cual sea el nº de
+    keywords. Misma semántica que `any(k in norm(texto) for k in keywords)`.
+    """
+    def __init__(self, keywords):
+        if isinstance(keywords, str):
+            keywords = [keywords]
+        kws = []
+        for k in keywords or []:
+            nk = norm(str(k)) if k else ""
+            if nk and nk not in kws:
+                kws.append(nk)
+        self.keywords = kws
+        alts = "|".join(re.escape(k) for k in sorted(kws, key=len, reverse=True))
+        self._any = re.compile(alts) if kws else None
+        # lookahead: una coincidencia por posición (la keyword más larga)
+        self._all = re.compile(f"(?=({alts}))") if kws else None
+        # si casa una keyword, casan también las que contiene
+        self._implied = {k: [o for o in kws if o != k and o in k] for k in kws}
+
+    def __bool__(self):
+        return bool(self.keywords)
+
+    def search(self, text, normalized=False) -> bool:
+        if self._any is None or not text:
+            return False
+        return self._any.search(text if normalized else norm(text)) is not None
+
+    def matches(self, text, normalized=False) -> dict:
+        """{keyword: posición de su primera aparición} en el texto normalizado."""
+        if self._all is None or not text:
+            return {}
+        t = text if normalized else norm(text)
+        hit = set()
+        for m in self._all.finditer(t):
+            k = m.group(1)
+            if k not in hit:
+                hit.add(k)
+                hit.update(self._implied[k])
+        return {k: t.find(k) for k in sorted(hit, key=t.find)}
+
+# ========= REGISTROS COMPACTOS =========
+# Items de listing y artículos con __slots__ en lugar de dicts (decenas de
+# miles por ejecución). Conservan el acceso tipo dict (r["url"], r.get(...),
+# r["source"] = ...) que usa el resto del código. El cuerpo de un artículo
+# aceptado se vuelca a disco (BodyStore) y se relee sólo al renderizar.
+class Record:
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, **fields):
+        for k, v in fields.items():
+            setattr(self, k, v)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return hasattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def setdefault(self, key, default=None):
+        if not hasattr(self, key):
+            setattr(self, key, default)
+        return getattr(self, key)
+
+    def pop(self, key, default=None):
+        value = getattr(self, key, default)
+        if hasattr(self, key):
+            delattr(self, key)
+        return value
+
+    def keys(self):
+        return [k for k in self.FIELDS if hasattr(self, k)]
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.keys()}
+
+    def replace(self, **changes):
+        """Copia superficial con `changes` (sin leer el cuerpo volcado a disco)."""
+        new = object.__new__(type(self))
+        for cls in type(self).__mro__:
+            for k in getattr(cls, "__slots__", ()):
+                if hasattr(self, k):
+                    object.__setattr__(new, k, getattr(self, k))
+        for k, v in changes.items():
+            setattr(new, k, v)
+        return new
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.get('url')!r})"
+
+class ListingItem(Record):
+    __slots__ = ("url", "title", "time_hint", "source")
+    FIELDS = __slots__
+
+class BodyStore:
+    """Cuerpos de artículos en un temporal en disco, comprimidos; se leen por (offset, tamaño)."""
+    def __init__(self):
+        self._f = None
+        self._lock = threading.Lock()
+
+    def put(self, text):
+        data = zlib.compress(text.encode("utf-8"), 1)
+        with self._lock:
+            if self._f is None:
+                self._f = tempfile.TemporaryFile(prefix="noticiero-cuerpos-")
+            self._f.seek(0, io.SEEK_END)
+            offset = self._f.tell()
+            self._f.write(data)
+        return (offset, len(data))
+
+    def load(self, ref):
+        offset, size = ref
+        with self._lock:
+            self._f.seek(offset)
+            data = self._f.read(size)
+        return zlib.decompress(data).decode("utf-8")
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+    def compact(self, arts):
+        """Empieza un temporal nuevo con sólo los cuerpos de `arts` (el resto se descarta)."""
+        kept = [(a, a.content) for a in arts if getattr(a, "_body_ref", None) is not None]
+        self.close()
+        for a, text in kept:
+            a.content = text
+            a.spill()
+
+BODIES = BodyStore()
+
+class Article(Record):
+    __slots__ = (
+        "url", "canonical", "title", "author", "published", "_published_dt", "_content", "_body_ref",
+        "fingerprint", "source", "keywords", "outlets", "timings",
+    )
+    FIELDS = ("url", "canonical", "title", "author", "published", "content", "fingerprint",
+              "source", "keywords", "outlets")
+
+    @property
+    def published_dt(self):
+        """`published` ya parseado (se parsea una vez como mucho)."""
+        dt = getattr(self, "_published_dt", None)
+        if dt is None and self.get("published"):
+            dt = self._published_dt = parse_datetime(self.published)
+        return dt
+
+    @property
+    def content(self):
+        ref = getattr(self, "_body_ref", None)
+        if ref is not None:
+            return BODIES.load(ref)
+        return getattr(self, "_content", "")
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+        self._body_ref = None
+
+    def spill(self):
+        """Vuelca el cuerpo a BODIES y lo suelta de memoria."""
+        text = getattr(self, "_content", None)
+        if text:
+            self._body_ref = BODIES.put(text)
+            self._content = None
+        return self
+
+    @classmethod
+    def from_dict(cls, d):
+        art = cls(**{k: v for k, v in d.items() if k in cls.FIELDS})
+        if art.get("source"):
+            art.source = sys.intern(art.source)
+        return art
+
+# ========= PERFILES DE DESTINATARIOS =========
+# Varios equipos con sus keywords, correos, ventana y NIFs servidos desde una
+# sola pasada: se descarga la unión, cada artículo se recorre una vez con el
+# matcher de todas las keywords y luego se reparte por perfil. Sin `profiles`
+# en config.yaml hay un único perfil con las claves de primer nivel.
+def _keyword_list(raw):
+    if isinstance(raw, str):
+        raw = [raw]
+    return [str(k).strip() for k in raw or [] if k and str(k).strip()]
+
+def load_profiles(cfg=None, keyword=None):
+    cfg = CFG if cfg is None else cfg
+    raw = cfg.get("profiles")
+    if not raw:
+        kws = keyword if keyword is not None else (cfg.get("keywords") or cfg.get("keyword"))
+        raw = [{"name": "principal", "keywords": kws}]
+    profiles = []
+    for i, p in enumerate(raw):
+        keywords = _keyword_list(p.get("keywords") or p.get("keyword"))
+        profiles.append({
+            "name": str(p.get("name") or f"perfil{i + 1}"),
+            "keywords": keywords,
+            "matcher": KeywordMatcher(keywords),
+            "to_emails": p.get("to_emails") or cfg.get("to_emails") or TO_EMAILS,
+            "hours": float(p.get("hours_recent") or cfg.get("hours_recent", 24)),
+            "cnmv_nifs": _normalize_cnmv_nifs(p) if ("cnmv_nifs" in p or "CNMV_NIFS" in p) else CNMV_NIFS,
+        })
+    return profiles
+
+def union_matcher(profiles):
+    """(matcher con todas las keywords, ¿todos los perfiles filtran por keywords?)"""
+    return (
+        KeywordMatcher([k for p in profiles for k in p["keywords"]]),
+        all(p["matcher"] for p in profiles),
+    )
+
+def profile_articles(profile, arts, tzname="Europe/Madrid"):
+    """Artículos del resumen común que corresponden a un perfil."""
+    own = set(profile["matcher"].keywords)
+    out = []
+    for a in arts:
+        if not is_recent(a.get("published_dt"), tzname=tzname, hours=profile["hours"]):
+            continue
+        if own:
+            hits = [k for k in a.get("keywords") or [] if k in own]
+            if not hits:
+                continue
+            a = a.replace(keywords=hits)
+        else:
+            a = a.replace(keywords=[])
+        out.append(a)
+    return out
+
+# ========= DUPLICADOS: URL CANÓNICA Y SIMHASH =========
+# La misma noticia llega con parámetros de tracking, en variante AMP/móvil o
+# sindicada (Europa Press, EFE…) en varios medios. La URL canónica es sólo la
+# clave de deduplicación y del estado de URLs vistas: se descarga siempre la URL
+# del listing tal cual (m.cincodias.elpais.com no tiene versión www.) y, ya
+# descargada, manda el <link rel=canonical>/og:url de la página. Los cuerpos se
+# comparan por SimHash de 64 bits.
+_TRACKING_PARAM_RE = re.compile(
+    r"^(utm_\w+|ns_\w+|at_\w+|fbclid|gclid|dclid|msclkid|yclid|igshid|mc_cid|mc_eid|_ga"
+    r"|cmpid|intcmp|ocid|ref|ref_src|s_kwcid|amp|outputtype)$", re.I
+)
+_AMP_PATH_RE = re.compile(r"(/amp)(?=/|$)|[._]amp(?=\.html?$)", re.I)
+SIMHASH_MAX_DISTANCE = 3   # bits distintos (de 64) para considerar dos cuerpos la misma noticia
+SIMHASH_MIN_WORDS = 40     # por debajo no hay texto suficiente para comparar
+SIMHASH_MAX_WORDS = 300    # sólo el arranque del cuerpo: la pieza sindicada se reconoce por sus primeros párrafos
+# byte -> 1/0 según el bit k, para contar bits por columna con bytes.translate
+_BIT_TABLES = [bytes((b >> k) & 1 for b in range(256)) for k in range(8)]
+TITLE_KEY_MIN_WORDS = 5
+
+def canonical_url(url: str) -> str:
+    """
+    Host en minúsculas, sin fragmento, sin tracking y sin variante AMP/móvil.
+    Es una clave para deduplicar, no una URL que se pueda descargar.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return url
+    if parts.scheme not in ("http", "https"):
+        return url
+    host = (parts.hostname or "").lower()
+    for prefix in ("amp.", "m."):
+        if host.startswith(prefix) and host.count(".") >= 2:
+            host = "www." + host[len(prefix):]
+    netloc = host if not parts.port or parts.port in (80, 443) else f"{host}:{parts.port}"
+    path = _AMP_PATH_RE.sub("", parts.path) or "/"
+    query = "&".join(
+        kv for kv in parts.query.split("&")
+        if kv and not _TRACKING_PARAM_RE.match(kv.split("=", 1)[0])
+    )
+    return urlunsplit((parts.scheme.lower(), netloc, path, query, ""))
+
+def title_key(title: str):
+    """Clave de título para detectar la misma pieza sindicada sin descargarla."""
+    words = re.findall(r"\w+", norm(title or ""))
+    return " ".join(words) if len(words) >= TITLE_KEY_MIN_WORDS else None
+
+def simhash(text: str):
+    """
+    SimHash de 64 bits (hex) sobre tripletas de las primeras SIMHASH_MAX_WORDS
+    palabras, o None si hay poco texto.
+    """
+    words = re.findall(r"\w+", norm(text or ""))
+    if len(words) < SIMHASH_MIN_WORDS:
+        return None
+    words = words[:SIMHASH_MAX_WORDS]
+    blake = hashlib.blake2b
+    digests = b"".join([
+        blake(f"{a} {b} {c}".encode("utf-8"), digest_size=8).digest()
+        for a, b, c in zip(words, words[1:], words[2:])
+    ])
+    n = len(digests) // 8
+    # mayoría por bit: cada byte del digest es una columna de `digests` (rápido en C)
+    fp = 0
+    for j in range(8):
+        column = digests[j::8]
+        for k in range(8):
+            if 2 * column.translate(_BIT_TABLES[k]).count(1) > n:
+                fp |= 1 << (8 * (7 - j) + k)
+    return f"{fp:016x}"
+
+def near_duplicate(fp, fingerprints, max_distance=SIMHASH_MAX_DISTANCE):
+    """Clave del primer fingerprint de `fingerprints` (dict clave -> hex) a distancia <= max_distance."""
+    if not fp:
+        return None
+    a = int(fp, 16)
+    for key, other in fingerprints.items():
+        if bin(a ^ int(other, 16)).count("1") <= max_distance:
+            return key
+    return None
 
 def extract_urls_regex(html, base, domain_prefix):
     urls = set()
@@ -117,17 +1261,22 @@ def extract_urls_regex(html, base, domain_prefix):
     return list(urls)
 
 # ========= CNMV SCRAPER =========
-def get_cnmv_short_positions(nif: str, lang: str = None):
+def get_cnmv_short_positions(nif: str, lang: str = None, known_hash: str = None):
     """
     Devuelve un dict con:
       {
         "nif": nif,
         "issuer": <nombre emisor o "">,
         "url": url,
+        "body_hash": <sha1 de la página>,
         "rows": [
             {"holder": str, "net_short_pct": float, "date": "YYYY-MM-DD" o str}
         ]
       }
+    Si la página es idéntica a la de `known_hash` no se parsea y se devuelve
+    {"nif", "url", "body_hash", "unchanged": True}. Sin tabla de posiciones
+    (mantenimiento, página de error servida con 200) devuelve None, como un
+    fallo de descarga: una tabla vacía no es lo mismo que no tener tabla.
     """
     # replicamos la URL real; 'lang' se añade sólo si está definido
     url = f"{CNMV_BASE_URL}?nif={nif}"
@@ -135,11 +1284,16 @@ def get_cnmv_short_positions(nif: str, lang: str = None):
         url += f"&lang={(lang or CNMV_LANG)}"
 
     try:
-        res = http_get(url)
+        res = http_get(url, cache_ttl=HTTP_CACHE_FRESH)
     except Exception as e:
         log(f"[CNMV] Error descargando {url}: {e}")
         return None
 
+    body_hash = hashlib.sha1(res.content).hexdigest()
+    if known_hash and body_hash == known_hash:
+        return {"nif": nif, "url": url, "body_hash": body_hash, "unchanged": True}
+
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(res.text, "lxml")
 
     # Intenta localizar la tabla de posiciones cortas
@@ -152,13 +1306,8 @@ def get_cnmv_short_positions(nif: str, lang: str = None):
             break
 
     if table is None:
-        log(f"[CNMV] No se encontró tabla de posiciones para {nif}")
-        return {
-            "nif": nif,
-            "issuer": "",
-            "url": url,
-            "rows": [],
-        }
+        log(f"[CNMV] No se encontró tabla de posiciones para {nif}: se ignora esta consulta")
+        return None
 
     # Emisor (mejor esfuerzo)
     issuer = ""
@@ -206,22 +1355,148 @@ def get_cnmv_short_positions(nif: str, lang: str = None):
         "nif": nif,
         "issuer": issuer,
         "url": url,
+        "body_hash": body_hash,
         "rows": rows,
     }
 
-def build_html_cnmv(blocks):
+# ========= HISTÓRICO CNMV =========
+# Las posiciones vivas de cada emisor se guardan en cnmv.sqlite; cada consulta
+# se compara con la anterior para que el correo pueda mostrar sólo los cambios:
+# titulares nuevos, % que cambia y posiciones que bajan del 0,5% (desaparecen
+# de la tabla de la CNMV). Si la página no ha cambiado (mismo sha1) ni se parsea.
+class CnmvHistory:
+    def __init__(self, path=None):
+        path = path or CNMV_DB_FILE
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS issuers ("
+            " nif TEXT PRIMARY KEY, issuer TEXT, url TEXT, body_hash TEXT, checked_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS positions ("
+            " nif TEXT NOT NULL, holder TEXT NOT NULL, net_short_pct REAL NOT NULL, date TEXT,"
+            " first_seen REAL NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (nif, holder))"
+        )
+        self._lock = threading.Lock()
+
+    def body_hash(self, nif):
+        with self._lock:
+            row = self._db.execute("SELECT body_hash FROM issuers WHERE nif = ?", (nif,)).fetchone()
+        return row[0] if row else None
+
+    def _positions(self, nif):
+        return {
+            holder: {"holder": holder, "net_short_pct": pct, "date": date}
+            for holder, pct, date in self._db.execute(
+                "SELECT holder, net_short_pct, date FROM positions WHERE nif = ? ORDER BY net_short_pct DESC", (nif,)
+            )
+        }
+
+    def update(self, block):
+        """
+        Guarda el bloque y le añade los cambios respecto a la consulta anterior:
+        "new" y "changed" (con "prev_pct") y "dropped" (bajo el 0,5%).
+        "first" indica que el emisor no tenía histórico (no hay cambios que mostrar).
+        """
+        nif, now = block["nif"], time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT issuer FROM issuers WHERE nif = ?", (nif,)).fetchone()
+            old = self._positions(nif)
+            if block.get("unchanged"):
+                self._db.execute("UPDATE issuers SET checked_at = ? WHERE nif = ?", (now, nif))
+                return dict(block, issuer=row[0] if row else "", rows=list(old.values()),
+                            new=[], changed=[], dropped=[], first=False)
+
+            cur = {r["holder"]: r for r in block.get("rows") or []}
+            # primera consulta del emisor: es la línea base, no una novedad
+            new = [r for h, r in cur.items() if h not in old] if row is not None else []
+            changed = [
+                dict(r, prev_pct=old[h]["net_short_pct"]) for h, r in cur.items()
+                if h in old and round(r["net_short_pct"], 3) != round(old[h]["net_short_pct"], 3)
+            ]
+            dropped = [r for h, r in old.items() if h not in cur]
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO issuers VALUES (?,?,?,?,?)",
+                (nif, block.get("issuer") or "", block.get("url"), block.get("body_hash"), now),
+            )
+            self._db.executemany(
+                "DELETE FROM positions WHERE nif = ? AND holder = ?", [(nif, r["holder"]) for r in dropped]
+            )
+            self._db.executemany(
+                "INSERT INTO positions VALUES (?,?,?,?,?,?) ON CONFLICT(nif, holder) DO UPDATE SET"
+                " net_short_pct = excluded.net_short_pct, date = excluded.date, updated_at = excluded.updated_at",
+                [(nif, r["holder"], r["net_short_pct"], r["date"], now, now) for r in cur.values()],
+            )
+        return dict(block, new=new, changed=changed, dropped=dropped, first=row is None)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def open_cnmv_history():
+    try:
+        return CnmvHistory(CNMV_DB_FILE)
+    except sqlite3.Error as e:
+        log(f"[CNMV] No se pudo abrir {CNMV_DB_FILE}: {e}. Se sigue sin histórico.")
+        return None
+
+def cnmv_has_changes(block):
+    return bool(block.get("first") or block.get("new") or block.get("changed") or block.get("dropped"))
+
+def _cnmv_changes_html(b):
+    """Tabla de cambios de un emisor respecto a la consulta anterior."""
+    cell = '<td style="padding:4px 8px;">'
+    num = '<td style="padding:4px 8px;text-align:right;">'
+    lines = []
+    for r in b.get("new") or []:
+        lines.append((r, "Nueva", "—", f'{r["net_short_pct"]:.3f}'))
+    for r in b.get("changed") or []:
+        lines.append((r, "Sube" if r["net_short_pct"] > r["prev_pct"] else "Baja",
+                      f'{r["prev_pct"]:.3f}', f'{r["net_short_pct"]:.3f}'))
+    for r in b.get("dropped") or []:
+        lines.append((r, "Bajo 0,5%", f'{r["net_short_pct"]:.3f}', "&lt; 0,500"))
+    if not lines:
+        return ""
+    parts = [
+        '<table style="border-collapse:collapse;font-size:13px;margin-bottom:12px;">'
+        '<thead><tr>'
+        '<th style="border-bottom:1px solid #ccc;padding:4px 8px;text-align:left;">Cambio</th>'
+        '<th style="border-bottom:1px solid #ccc;padding:4px 8px;text-align:left;">Titular</th>'
+        '<th style="border-bottom:1px solid #ccc;padding:4px 8px;text-align:right;">Antes</th>'
+        '<th style="border-bottom:1px solid #ccc;padding:4px 8px;text-align:right;">Ahora</th>'
+        '<th style="border-bottom:1px solid #ccc;padding:4px 8px;text-align:left;">Fecha posición</th>'
+        '</tr></thead><tbody>'
+    ]
+    for r, what, before, now in lines:
+        parts.append(
+            f"<tr>{cell}<b>{what}</b></td>{cell}{html.escape(r['holder'])}</td>"
+            f"{num}{before}</td>{num}{now}</td>{cell}{html.escape(str(r['date'] or ''))}</td></tr>"
+        )
+    parts.append("</tbody></table>")
+    return "".join(parts)
+
+def build_html_cnmv(blocks, only_changes=None):
     """
-    blocks: lista de dicts devueltos por get_cnmv_short_positions
-    Devuelve un bloque HTML para incrustar en el email.
+    blocks: lista de dicts devueltos por get_cnmv_short_positions (con los
+    cambios de CnmvHistory.update, si los hay).
+    Devuelve un bloque HTML para incrustar en el email. Con `only_changes`
+    los emisores sin cambios se resumen en una línea.
     """
+    only_changes = CNMV_ONLY_CHANGES if only_changes is None else only_changes
     if not blocks:
         return ""
 
+    unchanged = [b for b in blocks if not cnmv_has_changes(b)] if only_changes else []
     parts = []
     parts.append('<hr style="margin:32px 0;">')
     parts.append('<h2 style="margin-bottom:8px;">Posiciones cortas CNMV (≥ 0,5%)</h2>')
     for b in blocks:
-        issuer = (b.get("issuer") or "").strip()
+        if only_changes and not cnmv_has_changes(b):
+            continue
+        issuer = html.escape((b.get("issuer") or "").strip())
         title = f"{issuer} ({b['nif']})" if issuer else b["nif"]
         parts.append(f'<h3 style="margin:16px 0 4px 0;">{title}</h3>')
         parts.append(
@@ -229,6 +1504,12 @@ def build_html_cnmv(blocks):
             f'Fuente: <a href="{b["url"]}">{b["url"]}</a></div>'
         )
 
+        changes = _cnmv_changes_html(b)
+        if changes:
+            parts.append(changes)
+            if only_changes:
+                continue
+
         rows = b.get("rows") or []
         if not rows:
             parts.append('<p style="font-size:13px;color:#666;">Sin posiciones vivas publicadas.</p>')
@@ -245,71 +1526,406 @@ def build_html_cnmv(blocks):
         for r in rows:
             parts.append(
                 "<tr>"
-                f'<td style="padding:4px 8px;">{r["holder"]}</td>'
+                f'<td style="padding:4px 8px;">{html.escape(r["holder"])}</td>'
                 f'<td style="padding:4px 8px;text-align:right;">{r["net_short_pct"]:.3f}</td>'
                 f'<td style="padding:4px 8px;">{r["date"]}</td>'
                 "</tr>"
             )
         parts.append("</tbody></table>")
 
+    if unchanged:
+        parts.append(
+            f'<p style="font-size:13px;color:#666;">Sin cambios en {len(unchanged)} emisores más.</p>'
+        )
     return "\n".join(parts)
 
+# ========= FEEDS: SITEMAPS DE NOTICIAS Y RSS =========
+# Vía preferente de listing: dan URLs con fecha exacta (el filtro de recencia
+# actúa antes de descargar nada) y son mucho más baratos que una portada.
+# Los feeds de cada fuente se descubren (robots.txt, rutas habituales de
+# sitemap de noticias, <link rel=alternate> de la portada) y se cachean.
+FEED_DISCOVERY_TTL = 7 * 24 * 3600
+NEWS_SITEMAP_PATHS = ["/sitemap-news.xml", "/news-sitemap.xml", "/sitemap_news.xml"]
+_FEED_START_RE = re.compile(rb"^\s*(<\?xml|<rss|<feed|<urlset|<sitemapindex|<rdf:RDF)", re.I)
+_XP_ALTERNATE_FEEDS = '//link[@rel="alternate"][contains(@type, "rss") or contains(@type, "atom")]/@href'
+
+@lru_cache(maxsize=None)
+def _xpath(expr):
+    """XPath compilado una vez (lxml se importa al primer uso)."""
+    from lxml import etree
+    return etree.XPath(expr)
+
+@lru_cache(maxsize=1)
+def _xml_parser():
+    from lxml import etree
+    return etree.XMLParser(recover=True, resolve_entities=False, no_network=True)
+
+def _local(tag):
+    # "{espacio}nombre" -> "nombre" (comentarios e instrucciones no tienen tag str)
+    return tag.rpartition("}")[2] if isinstance(tag, str) else ""
+
+def _find_text(el, *names):
+    for c in el.iter():
+        if _local(c.tag) in names and (c.text or "").strip():
+            return c.text.strip()
+    return ""
+
+def looks_like_feed(res: requests.Response) -> bool:
+    ctype = (res.headers.get("Content-Type") or "").lower()
+    return "xml" in ctype or bool(_FEED_START_RE.match(res.content[:512]))
+
+def parse_feed_document(content: bytes, base_url: str):
+    """
+    RSS, Atom o sitemap (urlset / sitemapindex).
+    Devuelve (items, sitemaps_hijos); items = [{"url", "title", "time_hint"}],
+    sitemaps_hijos = [(loc, lastmod)] si es un índice.
+    """
+    from lxml import etree
+    try:
+        root = etree.fromstring(content, _xml_parser())
+    except (etree.XMLSyntaxError, ValueError):
+        return [], []
+    if root is None:
+        return [], []
+    kind = _local(root.tag)
+    items, children = [], []
+    if kind == "sitemapindex":
+        for sm in root:
+            if _local(sm.tag) == "sitemap":
+                loc = _find_text(sm, "loc")
+                if loc:
+                    children.append((urljoin(base_url, loc), _find_text(sm, "lastmod")))
+    elif kind == "urlset":
+        for el in root:
+            if _local(el.tag) != "url":
+                continue
+            loc = _find_text(el, "loc")
+            if loc:
+                items.append(ListingItem(
+                    url=urljoin(base_url, loc),
+                    title=_find_text(el, "title"),
+                    time_hint=_find_text(el, "publication_date") or _find_text(el, "lastmod"),
+                ))
+        # los sitemaps no garantizan orden: primero lo más nuevo (fechas W3C)
+        items.sort(key=lambda it: it["time_hint"], reverse=True)
+    elif kind == "feed":
+        for e in root:
+            if _local(e.tag) != "entry":
+                continue
+            href = ""
+            for link in e:
+                if _local(link.tag) == "link" and link.get("rel", "alternate") == "alternate":
+                    href = link.get("href") or ""
+                    break
+            if href:
+                items.append(ListingItem(
+                    url=urljoin(base_url, href),
+                    title=_find_text(e, "title"),
+                    time_hint=_find_text(e, "published", "updated"),
+                ))
+    else:  # rss / rdf:RDF
+        for it in root.iter():
+            if _local(it.tag) != "item":
+                continue
+            u = _find_text(it, "link")
+            if u:
+                items.append(ListingItem(
+                    url=urljoin(base_url, u),
+                    title=_find_text(it, "title"),
+                    time_hint=_find_text(it, "pubDate", "date", "published"),
+                ))
+    return items, children
+
+def discover_feeds(src):
+    """Candidatos a feed de una fuente, del más barato/preciso al menos."""
+    home = src["homepage"]
+    parts = urlsplit(home)
+    root = f"{parts.scheme}://{parts.netloc}"
+    found = []
+
+    # 1) robots.txt -> Sitemap: …news…
+    try:
+        robots = http_get(root + "/robots.txt", cache_ttl=HTTP_CACHE_FRESH).text
+    except Exception:
+        robots = ""
+    for line in robots.splitlines():
+        if line.lower().startswith("sitemap:"):
+            u = line.split(":", 1)[1].strip()
+            if "news" in u.lower() or "noticias" in u.lower():
+                found.append(u)
+
+    # 2) rutas habituales del sitemap de noticias
+    if not found:
+        for path in NEWS_SITEMAP_PATHS:
+            try:
+                r = http_get(root + path, cache_ttl=HTTP_CACHE_FRESH)
+            except Exception:
+                continue
+            if looks_like_feed(r):
+                found.append(root + path)
+                break
+
+    # 3) RSS/Atom anunciado en la portada
+    try:
+        tree = parse_html_tree(http_get(home, cache_ttl=HTTP_CACHE_FRESH).content)
+        if tree is not None:
+            found.extend(urljoin(home, h) for h in _xpath(_XP_ALTERNATE_FEEDS)(tree)[:2])
+    except Exception:
+        pass
+
+    return list(dict.fromkeys(found))
+
+class FeedDirectory:
+    """Feeds descubiertos por fuente, cacheados FEED_DISCOVERY_TTL (también los 'no hay')."""
+    def __init__(self, path=None):
+        path = path or SOURCES_DB_FILE
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS feeds ("
+            " source TEXT PRIMARY KEY, urls TEXT NOT NULL, checked_at REAL NOT NULL)"
+        )
+
+    def get(self, name):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT urls, checked_at FROM feeds WHERE source = ?", (name,)
+            ).fetchone()
+        if not row or time.time() - row[1] > FEED_DISCOVERY_TTL:
+            return None
+        return json.loads(row[0])
+
+    def put(self, name, urls):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO feeds (source, urls, checked_at) VALUES (?,?,?)",
+                (name, json.dumps(urls), time.time()),
+            )
+
+    def feeds_for(self, src):
+        if src["listing"] != src["homepage"]:
+            return []  # listing explícito en config.yaml: manda el usuario
+        urls = self.get(src["name"])
+        if urls is None:
+            urls = discover_feeds(src)
+            self.put(src["name"], urls)
+            log(f"[FEED] {src['name']}: {', '.join(urls) if urls else 'sin feeds'}")
+        return urls
+
+# en memoria hasta init(), que abre el de STATE_DIR
+FEEDS = FeedDirectory(":memory:")
+
+# ========= PERFIL POR FUENTE =========
+# Memoria entre ejecuciones de cada fuente: qué estrategia de listing
+# funcionó, cuántos enlaces da, latencia, historial de 403 y tasa de
+# aceptación. Con ella se prueba primero lo que funciona y se aparcan
+# (con re-sondeo periódico) las fuentes que solo dan 403 o nada útil.
+LISTING_STRATEGIES = ("feed", "listing", "home")
+PROFILE_EMA = 0.3                  # peso de la última ejecución en las medias
+SKIP_AFTER_403 = 3                 # ejecuciones seguidas con 403 → se aparca
+SKIP_AFTER_EMPTY = 5               # días seguidos (con alguna ejecución) sin artículos en ventana → se aparca
+REPROBE_SECONDS = 3 * 24 * 3600    # una fuente aparcada se vuelve a probar cada 3 días
+
+# Modo continuo (--daemon): cada fuente se sondea con su propio intervalo,
+# que se acorta si su listing trae muchos enlaces nuevos y se alarga si no
+# cambia, buscando unos pocos enlaces nuevos por sondeo.
+POLL_TARGET_LINKS = 5              # enlaces nuevos por sondeo a los que se apunta
+POLL_BACKOFF = 1.5                 # factor máximo de cambio del intervalo por sondeo
+
+class SourceForbidden(Exception):
+    """La fuente responde 403 al listing."""
+
+class SourceProfiles:
+    def __init__(self, path=None):
+        path = path or SOURCES_DB_FILE
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            " source TEXT PRIMARY KEY, strategy TEXT, links_ema REAL, latency_ema REAL,"
+            " consecutive_403 INTEGER NOT NULL DEFAULT 0, total_403 INTEGER NOT NULL DEFAULT 0,"
+            " empty_runs INTEGER NOT NULL DEFAULT 0, fetched INTEGER NOT NULL DEFAULT 0,"
+            " in_window INTEGER NOT NULL DEFAULT 0, accepted INTEGER NOT NULL DEFAULT 0,"
+            " last_probe REAL, updated_at REAL, poll_interval REAL, next_poll REAL, last_empty_day TEXT)"
+        )
+        cols = [d[1] for d in self._db.execute("PRAGMA table_info(profiles)")]
+        # perfiles creados por versiones anteriores
+        for col, kind in (("poll_interval", "REAL"), ("next_poll", "REAL"), ("last_empty_day", "TEXT")):
+            if col not in cols:
+                with self._db:
+                    self._db.execute(f"ALTER TABLE profiles ADD COLUMN {col} {kind}")
+                cols.append(col)
+        self._cache = {
+            row[0]: dict(zip(cols, row)) for row in self._db.execute("SELECT * FROM profiles")
+        }
+
+    def get(self, name):
+        with self._lock:
+            return dict(self._cache.get(name) or {"source": name})
+
+    def _save(self, prof):
+        prof["updated_at"] = time.time()
+        with self._lock, self._db:
+            self._cache[prof["source"]] = prof
+            cols = list(prof)
+            self._db.execute(
+                f"INSERT OR REPLACE INTO profiles ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                [prof[c] for c in cols],
+            )
+
+    def skip_reason(self, name):
+        """Motivo para no visitar la fuente en esta ejecución (o None)."""
+        prof = self.get(name)
+        if time.time() - (prof.get("last_probe") or 0) >= REPROBE_SECONDS:
+            return None
+        if (prof.get("consecutive_403") or 0) >= SKIP_AFTER_403:
+            return f"{prof['consecutive_403']} ejecuciones seguidas con 403"
+        if (prof.get("empty_runs") or 0) >= SKIP_AFTER_EMPTY:
+            return f"{prof['empty_runs']} días seguidos sin artículos en ventana"
+        return None
+
+    def plan(self, src):
+        """Estrategias de listing en orden: primero la que funcionó la última vez."""
+        order = [s for s in LISTING_STRATEGIES if s != "home" or src["homepage"] != src["listing"]]
+        last = self.get(src["name"]).get("strategy")
+        if last in order:
+            order.remove(last)
+            order.insert(0, last)
+        # feeds sin descubrir o caducados: se re-sondean antes (son lo más barato)
+        if order[0] != "feed" and FEEDS.get(src["name"]) is None:
+            order.remove("feed")
+            order.insert(0, "feed")
+        return order
+
+    def acceptance_rate(self, name):
+        prof = self.get(name)
+        # suavizado de Laplace: las fuentes nuevas parten de 0,5
+        return ((prof.get("accepted") or 0) + 1) / ((prof.get("fetched") or 0) + 2)
+
+    def priority(self, name):
+        """Clave de orden de las fuentes: más aceptación y menos latencia primero."""
+        prof = self.get(name)
+        return (-self.acceptance_rate(name), prof.get("latency_ema") or 0.0)
+
+    @staticmethod
+    def _ema(old, new):
+        return new if old is None else (1 - PROFILE_EMA) * old + PROFILE_EMA * new
+
+    def record_listing(self, name, strategy, n_links, latency, forbidden):
+        prof = self.get(name)
+        prof["last_probe"] = time.time()
+        prof["latency_ema"] = self._ema(prof.get("latency_ema"), latency)
+        prof["links_ema"] = self._ema(prof.get("links_ema"), n_links)
+        if strategy:
+            prof["strategy"] = strategy
+        if forbidden and not n_links:
+            prof["consecutive_403"] = (prof.get("consecutive_403") or 0) + 1
+            prof["total_403"] = (prof.get("total_403") or 0) + 1
+        else:
+            prof["consecutive_403"] = 0
+        self._save(prof)
+
+    def poll_due(self, name, now=None):
+        return (self.get(name).get("next_poll") or 0) <= (now or time.time())
+
+    def record_poll(self, name, new_links):
+        """Ajusta el intervalo de sondeo de la fuente según los enlaces nuevos que trajo."""
+        prof = self.get(name)
+        interval = prof.get("poll_interval") or (POLL_MIN_SECONDS * POLL_MAX_SECONDS) ** 0.5
+        factor = POLL_TARGET_LINKS / new_links if new_links else POLL_BACKOFF
+        interval *= min(POLL_BACKOFF, max(1 / POLL_BACKOFF, factor))
+        prof["poll_interval"] = min(POLL_MAX_SECONDS, max(POLL_MIN_SECONDS, interval))
+        # algo de dispersión para que las fuentes no acaben sincronizadas
+        prof["next_poll"] = time.time() + prof["poll_interval"] * random.uniform(0.9, 1.1)
+        self._save(prof)
+        return prof["poll_interval"]
+
+    def record_articles(self, name, fetched, in_window, accepted):
+        if not fetched:
+            return
+        prof = self.get(name)
+        prof["fetched"] = (prof.get("fetched") or 0) + fetched
+        prof["in_window"] = (prof.get("in_window") or 0) + in_window
+        prof["accepted"] = (prof.get("accepted") or 0) + accepted
+        if in_window:
+            prof["empty_runs"] = 0
+        else:
+            # el modo continuo sondea muchas veces al día: se cuentan días vacíos, no sondeos
+            today = time.strftime("%Y-%m-%d")
+            if prof.get("last_empty_day") != today:
+                prof["empty_runs"] = (prof.get("empty_runs") or 0) + 1
+                prof["last_empty_day"] = today
+        self._save(prof)
+
+# en memoria hasta init(), que abre el de STATE_DIR
+PROFILES = SourceProfiles(":memory:")
+
+def dedup_items(items, max_to_fetch):
+    seen, out = set(), []
+    for it in items:
+        u = canonical_url(it["url"])
+        if u in seen:
+            continue
+        seen.add(u)
+        out.append(it)
+        if len(out) >= max_to_fetch:
+            break
+    return out
+
+def parse_feed_listing(feed_url, max_to_fetch, cache_ttl=None, domain_prefix="http"):
+    """
+    Items de un feed; en un índice de sitemaps se siguen los hijos más
+    recientes. Como en el listing HTML, sólo se quedan las URLs bajo
+    `domain_prefix` (un feed descubierto puede enlazar a otros medios).
+    """
+    ttl = HTTP_CACHE_FRESH if cache_ttl is None else cache_ttl
+    res = http_get(feed_url, cache_ttl=ttl)
+    if not looks_like_feed(res):
+        return []
+    items, children = parse_feed_document(res.content, feed_url)
+    if children:
+        children.sort(key=lambda c: c[1] or "", reverse=True)
+        news = [c for c in children if "news" in c[0].lower()] or children
+        for loc, _ in news[:3]:
+            try:
+                sub = http_get(loc, cache_ttl=ttl)
+            except Exception as e:
+                log(f"[FEED] Error en {loc}: {e}")
+                continue
+            items.extend(parse_feed_document(sub.content, loc)[0])
+    items = [it for it in items if it["url"].startswith(domain_prefix)]
+    return dedup_items(items, max_to_fetch)
+
 # ========= LISTINGS NOTICIAS =========
-def parse_listing_document(url, domain_prefix, max_to_fetch, debug_name):
+def parse_listing_document(url, domain_prefix, max_to_fetch, debug_name, cache_ttl=None):
     """
-    1) RSS/Atom si hay <rss> o <feed>.
+    1) RSS/Atom/sitemap si el documento es XML.
     2) HTML con selectores comunes.
     3) Fallback por regex.
     """
     try:
-        res = http_get(url)
+        res = http_get(url, cache_ttl=HTTP_CACHE_FRESH if cache_ttl is None else cache_ttl)
     except HTTPError as e:
         if e.response is not None and e.response.status_code == 403:
-            log(f"[SKIP] {debug_name}: 403 en {url}. Se ignora la fuente.")
-            return []
+            log(f"[SKIP] {debug_name}: 403 en {url}.")
+            raise SourceForbidden(url)
         raise
     html = res.text
     items = []
-    soup = BeautifulSoup(html, "lxml")
-
-    # 1) RSS/Atom
-    if soup.find("rss") or soup.find("feed"):
-        for it in soup.select("item"):
-            link = it.find("link")
-            title = it.find("title")
-            pub = it.find("pubdate") or it.find("dc:date") or it.find("published")
-            u = (link.text or link.get_text(strip=True)) if link else ""
-            if not u:
-                continue
-            if not u.startswith("http"):
-                u = urljoin(url, u)
-            items.append({
-                "url": u,
-                "title": title.get_text(strip=True) if title else "",
-                "time_hint": pub.get_text(strip=True) if pub else "",
-            })
-            if len(items) >= max_to_fetch:
-                break
-        if not items:
-            for e in soup.select("entry"):
-                link = e.find("link")
-                href = link.get("href") if link else ""
-                title = e.find("title")
-                updated = e.find("updated") or e.find("published")
-                if not href:
-                    continue
-                if not href.startswith("http"):
-                    href = urljoin(url, href)
-                items.append({
-                    "url": href,
-                    "title": title.get_text(strip=True) if title else "",
-                    "time_hint": updated.get_text(strip=True) if updated else "",
-                })
-                if len(items) >= max_to_fetch:
-                    break
+
+    # 1) RSS/Atom/sitemap
+    if looks_like_feed(res):
+        items = [it for it in parse_feed_document(res.content, url)[0] if it["url"].startswith(domain_prefix)]
+        items = items[:max_to_fetch]
 
     # 2) HTML
     if not items:
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, "lxml")
         candidates = (
             soup.select("article a[href$='.html']") or
             soup.select("h2 a[href$='.html'], h3 a[href$='.html']")
@@ -325,348 +1941,2010 @@ def parse_listing_document(url, domain_prefix, max_to_fetch, debug_name):
             parent = a.find_parent(["article", "li", "div"])
             time_el = parent.select_one("time, .ue-c-article__published-date, .mod-date") if parent else None
             time_hint = time_el.get_text(strip=True) if time_el else ""
-            items.append({"url": url_abs, "title": title, "time_hint": time_hint})
+            items.append(ListingItem(url=url_abs, title=title, time_hint=time_hint))
             if len(items) >= max_to_fetch:
                 break
 
     # 3) Fallback regex
     if len(items) < 5:
         for u in extract_urls_regex(res.text, url, domain_prefix):
-            items.append({"url": u, "title": "", "time_hint": ""})
+            items.append(ListingItem(url=u, title="", time_hint=""))
             if len(items) >= max_to_fetch:
                 break
 
-    # dedup
-    seen, out = set(), []
-    for it in items:
-        u = it["url"]
-        if u in seen:
+    return dedup_items(items, max_to_fetch)
+
+def _listing_strategy(src, strategy):
+    name = src["name"]
+    ttl = src.get("cache_fresh_seconds")
+    if strategy == "feed":
+        for feed in FEEDS.feeds_for(src):
+            try:
+                items = parse_feed_listing(feed, src["max_to_fetch"], ttl, src["domain_prefix"])
+            except Exception as e:
+                log(f"[FEED] {name}: error en {feed}: {e}")
+                continue
+            if items:
+                log(f"{name}: usando feed {feed}")
+                return items
+        return []
+    url = src["listing"] if strategy == "listing" else src["homepage"]
+    return parse_listing_document(
+        url, src["domain_prefix"], src["max_to_fetch"], f"{name.lower()}_{strategy}", cache_ttl=ttl
+    )
+
+def fetch_source_listing(src, stop=None):
+    """
+    Listing de una fuente según su perfil: estrategias en el orden del plan
+    (feed, listing, portada) hasta que una da enlaces. Nunca lanza excepción.
+    Con `stop` activado no se prueba la estrategia siguiente.
+    """
+    name = src["name"]
+    skip = PROFILES.skip_reason(name)
+    if skip:
+        log(f"[SKIP] {name}: {skip}. Se reintentará más adelante.")
+        return []
+    log(f"— Fuente: {name}")
+    t0 = time.monotonic()
+    items, used, forbidden = [], None, False
+    for strategy in PROFILES.plan(src):
+        if stop is not None and stop.is_set():
+            return []  # presupuesto agotado: ni se anota en el perfil de la fuente
+        try:
+            items = _listing_strategy(src, strategy)
+        except SourceForbidden:
+            forbidden = True
             continue
-        seen.add(u)
-        out.append(it)
-        if len(out) >= max_to_fetch:
+        except HostBlocked:
+            continue  # ya avisado por el cortacircuitos
+        except Exception as e:
+            log(f"[ERROR] {name} ({strategy}): {e}")
+            continue
+        if items:
+            used = strategy
             break
-    return out
+        if strategy != "feed":
+            log(f"Aviso: 0 enlaces en {name} ({strategy}).")
+    items = dedup_items(items, src["max_to_fetch"])
+    PROFILES.record_listing(name, used, len(items), time.monotonic() - t0, forbidden)
+    METRICS.record_listing(name, time.monotonic() - t0, len(items), used, forbidden)
+    log(f"{name}: enlaces encontrados = {len(items)}" + (f" (vía {used})" if used else ""))
+    for it in items:
+        it["source"] = name
+    return items
+
+def _checkpointed_listing(src, checkpoint, stop=None):
+    """Listing de la fuente; si ya se hizo en esta ventana, desde el punto de control."""
+    items = checkpoint.listing(src["name"])
+    if items is not None:
+        log(f"[REANUDAR] {src['name']}: {len(items)} enlaces del punto de control")
+        return items
+    items = fetch_source_listing(src, stop)
+    if items:  # un listing fallido se vuelve a intentar al reanudar
+        checkpoint.save_listing(src["name"], items)
+    return items
+
+def iter_listings(sources=None, checkpoint=None, stop=None):
+    """
+    Descarga los listings de todas las fuentes en paralelo y va devolviendo
+    los items según llega cada fuente, con dedup global por URL. Si se activa
+    `stop` (presupuesto agotado) se cancelan los listings que no han empezado
+    y no se espera a los que están en curso.
+    """
+    sources = SOURCES if sources is None else sources
+    # primero las fuentes que más artículos útiles han dado históricamente
+    sources = sorted(sources, key=lambda src: PROFILES.priority(src["name"]))
+    dedup = set()
+    pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="listing")
+    try:
+        if checkpoint is not None:
+            running = {pool.submit(_checkpointed_listing, src, checkpoint, stop) for src in sources}
+        else:
+            running = {pool.submit(fetch_source_listing, src, stop) for src in sources}
+        while running:
+            done, running = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+            if stop is not None and stop.is_set():
+                return
+            for fut in done:
+                for it in fut.result():
+                    key = canonical_url(it["url"])
+                    if key in dedup:
+                        continue
+                    dedup.add(key)
+                    yield it
+    finally:
+        pool.shutdown(wait=stop is None or not stop.is_set(), cancel_futures=True)
+    log(f"Total combinado (sin duplicados): {len(dedup)}")
 
 def parse_all_listings():
-    all_items = []
-    for src in SOURCES:
-        name = src["name"]
-        log(f"— Fuente: {name}")
-        try:
-            items = parse_listing_document(
-                src["listing"], src["domain_prefix"], src["max_to_fetch"], f"{name.lower()}_listing"
-            )
-            if len(items) == 0 and src["homepage"] != src["listing"]:
-                log(f"Aviso: 0 enlaces en {name} listing. Probando portada…")
-                items = parse_listing_document(
-                    src["homepage"], src["domain_prefix"], src["max_to_fetch"], f"{name.lower()}_home"
-                )
-        except Exception as e:
-            log(f"[ERROR] {name}: {e}")
-            items = []
-        log(f"{name}: enlaces encontrados = {len(items)}")
-        for it in items:
-            it["source"] = name
-        all_items.extend(items)
-    # dedup global
-    dedup, out = set(), []
-    for it in all_items:
-        if it["url"] in dedup:
-            continue
-        dedup.add(it["url"])
-        out.append(it)
-    log(f"Total combinado (sin duplicados): {len(out)}")
-    return out
+    return list(iter_listings())
 
-def extract_jsonld(html_text, url):
+# ========= PLANIFICADOR CON PRESUPUESTO DE TIEMPO =========
+# run_budget_seconds acota la ejecución (0 = sin límite). Al agotarse (menos
+# la reserva para CNMV y correo) deja de descargar, espera un poco a lo que
+# está en vuelo y envía el resumen con lo que haya; lo no visitado no se
+# marca como visto y entra en la ejecución siguiente.
+
+def budget_left(t_start, keep=0.0):
+    """Segundos de RUN_BUDGET que quedan desde `t_start`, guardando `keep`; None sin presupuesto."""
+    if not RUN_BUDGET:
+        return None
+    return max(0.0, t_start + RUN_BUDGET - keep - time.monotonic())
+
+def article_value(it, prefilter_hit=True, tzname="Europe/Madrid"):
+    """
+    Valor esperado de descargar un item del listing: aceptación histórica de
+    su fuente × acierto del prefiltro × frescura del time_hint.
+    """
+    value = PROFILES.acceptance_rate(it.get("source", "?"))
+    if not prefilter_hit:
+        value *= 0.4
+    hint = time_hint_datetime(it.get("time_hint"), tzname)
+    if hint is None:
+        return value * 0.5
+    hours = CFG.get("hours_recent", 24)
+    age = (datetime.now(hint.tzinfo) - hint).total_seconds() / 3600
+    return value * max(0.1, 1 - max(0.0, age) / hours)
+
+class ArticleScheduler:
+    """
+    Cola de artículos pendientes ordenada por valor esperado. Dentro de cada
+    fuente sale primero el item más valioso; entre fuentes se reparte por
+    stride scheduling (cada turno cuesta 1/valor), así que con valores iguales
+    es un round robin (A1, B1, C1, A2…) y los hilos trabajan sobre hosts
+    distintos en vez de hacer cola ante el mismo.
+    """
+    def __init__(self):
+        self._heaps = {}   # source -> heap [(-valor, orden, item)]
+        self._pass = {}    # source -> pasada acumulada
+        self._vtime = 0.0  # pasada del último turno servido
+        self._seq = 0
+
+    def push(self, item, value=1.0):
+        src = item.get("source", "?")
+        if src not in self._heaps:
+            self._heaps[src] = []
+            # una fuente que llega tarde entra al ritmo actual, sin ráfaga
+            self._pass[src] = max(self._pass.get(src, 0.0), self._vtime)
+        heapq.heappush(self._heaps[src], (-value, self._seq, item))
+        self._seq += 1
+
+    def pop(self):
+        src = min(self._heaps, key=self._pass.__getitem__)
+        heap = self._heaps[src]
+        neg_value, _, item = heapq.heappop(heap)
+        if not heap:
+            del self._heaps[src]
+        self._vtime = self._pass[src]
+        self._pass[src] += 1 / max(-neg_value, 0.01)
+        return item
+
+    def drain(self):
+        """Vacía la cola y devuelve los items que quedaban."""
+        items = [entry[2] for heap in self._heaps.values() for entry in heap]
+        self._heaps.clear()
+        return items
+
+    def __len__(self):
+        return sum(len(h) for h in self._heaps.values())
+
+# ========= EXTRACCIÓN DE ARTÍCULOS =========
+# El HTML se parsea una sola vez (árbol lxml compartido). Cada etapa de
+# fallback (JSON-LD → metas → <time> → trafilatura) solo corre si las
+# anteriores dejaron vacío su campo.
+@lru_cache(maxsize=None)
+def _jsonld_extractor():
+    # extruct arrastra rdflib y compañía: sólo si hay que leer JSON-LD
+    from extruct.jsonld import JsonLdExtractor
+    return JsonLdExtractor()
+
+_XP_JSONLD = '//script[@type="application/ld+json"]'
+
+def parse_html_tree(html):
+    """Árbol lxml del documento (o None si está vacío/roto)."""
+    if not html:
+        return None
+    import lxml.html
+    from lxml import etree
     try:
-        data = extruct.extract(html_text, base_url=get_base_url(html_text, url), syntaxes=['json-ld'])
-        jsonld = data.get('json-ld', []) if data else []
-        for block in jsonld:
-            t = block.get("@type")
-            if t == "NewsArticle" or (isinstance(t, list) and "NewsArticle" in t):
-                return block
-    except Exception:
+        return lxml.html.fromstring(html)
+    except ValueError:
+        # str con declaración de encoding <?xml ...?>: lxml exige bytes
+        return lxml.html.fromstring(html.encode("utf-8"))
+    except etree.ParserError:
+        return None
+
+def _is_news_article(block):
+    t = block.get("@type")
+    return t == "NewsArticle" or (isinstance(t, list) and "NewsArticle" in t)
+
+def extract_jsonld(tree):
+    """Primer bloque JSON-LD de tipo NewsArticle (también dentro de @graph)."""
+    if tree is None:
         return None
+    for node in _xpath(_XP_JSONLD)(tree):
+        try:
+            blocks = _jsonld_extractor().extract_items(node)
+        except Exception:
+            continue
+        for block in blocks:
+            if not isinstance(block, dict):
+                continue
+            if _is_news_article(block):
+                return block
+            for sub in block.get("@graph") or []:
+                if isinstance(sub, dict) and _is_news_article(sub):
+                    return sub
     return None
 
 def normalize_datetime(dt_str, tzname="Europe/Madrid"):
     if not dt_str:
         return None
     try:
-        dt = dateparser.parse(dt_str)
+        dt = dt_str if isinstance(dt_str, datetime) else parse_datetime(str(dt_str))
         if not dt:
             return None
         if not dt.tzinfo:
-            dt = dt.replace(tzinfo=tz.UTC)
-        target = tz.gettz(tzname)
-        return dt.astimezone(target)
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(get_tz(tzname))
     except Exception:
         return None
 
-def extract_published_from_html(soup, tzname="Europe/Madrid"):
+_PUBLISHED_XPATHS = [
+    '//meta[@property="article:published_time"]',
+    '//meta[@name="date"]',
+    '//meta[@itemprop="datePublished"]',
+    '//meta[@name="pubdate"]',
+    '//meta[@property="og:updated_time"]',
+    '//time',
+]
+
+def extract_published_from_html(tree, tzname="Europe/Madrid"):
     # Metas comunes y <time>
-    meta_selectors = [
-        ('meta', {'property': 'article:published_time'}),
-        ('meta', {'name': 'date'}),
-        ('meta', {'itemprop': 'datePublished'}),
-        ('meta', {'name': 'pubdate'}),
-        ('meta', {'property': 'og:updated_time'}),
-        ('time', {}),
-    ]
-    for sel in meta_selectors:
-        tag = soup.find(*sel)
-        if not tag:
+    if tree is None:
+        return None
+    for xp in _PUBLISHED_XPATHS:
+        found = _xpath(xp)(tree)
+        if not found:
             continue
-        content = tag.get("content") or tag.get("datetime") or tag.get_text(strip=True)
+        tag = found[0]
+        content = tag.get("content") or tag.get("datetime") or tag.text_content().strip()
         dt = normalize_datetime(content, tzname)
         if dt:
             return dt
     return None
 
-def extract_article(url, tzname="Europe/Madrid"):
-    try:
-        res = http_get(url)
-    except HTTPError as e:
-        if e.response is not None and e.response.status_code == 403:
-            raise RuntimeError(f"403 al abrir artículo: {url}")
-        raise
-    html = res.text
-    meta = extract_jsonld(html, url) or {}
+_AUTHOR_META_XPATHS = [
+    '//meta[@name="author"]/@content',
+    '//meta[@property="article:author"]/@content',
+    '//meta[@name="byl"]/@content',
+    '//meta[@name="dc.creator"]/@content',
+    '//meta[@name="parsely-author"]/@content',
+]
+_AUTHOR_NODE_XPATH = (
+    '//*[@itemprop="author"]//*[@itemprop="name"] | //*[@rel="author"]'
+    ' | //*[contains(concat(" ", normalize-space(@class), " "), " author ")]'
+    ' | //*[contains(concat(" ", normalize-space(@class), " "), " byline ")]'
+    ' | //*[contains(concat(" ", normalize-space(@class), " "), " by-author ")]'
+)
+_H1_XPATH = "//h1"
+_CANONICAL_XPATH = '//link[@rel="canonical"]/@href | //meta[@property="og:url"]/@content'
 
-    published = normalize_datetime(meta.get("datePublished") or meta.get("dateModified"), tzname)
-    headline = meta.get("headline")
-    article_body = meta.get("articleBody")
+def _text(el):
+    return " ".join(el.text_content().split())
+
+def _pick_name(x):
+    if isinstance(x, dict):
+        return x.get("name") or x.get("@id") or ""
+    if isinstance(x, str):
+        return x
+    return ""
 
-    # Autor
-    author = ""
+def _author_from_jsonld(meta):
     auth = meta.get("author")
-    def pick_name(x):
-        if isinstance(x, dict):
-            return x.get("name") or x.get("@id") or ""
-        if isinstance(x, str):
-            return x
-        return ""
     if isinstance(auth, list):
-        names = [pick_name(a) for a in auth if pick_name(a)]
-        author = ", ".join(names)
-    else:
-        author = pick_name(auth)
-
-    soup = BeautifulSoup(html, "lxml")
-
-    if not author:
-        for sel in [
-            ('meta', {"name":"author"}),
-            ('meta', {"property":"article:author"}),
-            ('meta', {"name":"byl"}),
-            ('meta', {"name":"dc.creator"}),
-            ('meta', {"name":"parsely-author"}),
-        ]:
-            tag = soup.find(*sel)
-            if tag and tag.get("content"):
-                author = tag["content"].strip()
-                break
-        if not author:
-            cand = soup.select_one('[itemprop="author"] [itemprop="name"], [rel="author"], .author, .byline, .by-author')
-            if cand:
-                author = cand.get_text(strip=True)
+        return ", ".join(n for n in (_pick_name(a) for a in auth) if n)
+    return _pick_name(auth)
+
+def _author_from_html(tree):
+    for xp in _AUTHOR_META_XPATHS:
+        for content in _xpath(xp)(tree):
+            if content.strip():
+                return content.strip()
+    for el in _xpath(_AUTHOR_NODE_XPATH)(tree):
+        return _text(el)
+    return ""
+
+def _body_from_tree(tree, url):
+    import trafilatura
+    body = trafilatura.extract(tree, url=url, include_comments=False, include_tables=False) or ""
+    return body.strip()
+
+def parse_article_html(html, url, tzname="Europe/Madrid", timings=None):
+    """
+    Mitad CPU de extract_article: del HTML descargado a los campos del
+    artículo. Si se pasa `timings` (dict), acumula el tiempo de CPU por etapa.
+    """
+    def stage(name, fn, *args):
+        t0 = time.process_time()
+        try:
+            return fn(*args)
+        finally:
+            if timings is not None:
+                timings[name] = timings.get(name, 0.0) + time.process_time() - t0
 
-    if not article_body:
-        article_body = trafilatura.extract(html, url=url, include_comments=False, include_tables=False) or ""
-        article_body = article_body.strip()
+    tree = stage("parse", parse_html_tree, html)
+    meta = stage("jsonld", extract_jsonld, tree) or {}
 
-    if not headline:
-        h = soup.select_one("h1") or soup.select_one("header h1")
-        headline = h.get_text(strip=True) if h else ""
+    published = normalize_datetime(meta.get("datePublished") or meta.get("dateModified"), tzname)
+    headline = meta.get("headline")
+    article_body = meta.get("articleBody")
+    author = _author_from_jsonld(meta)
 
-    # fecha desde HTML si falta
-    if not published:
-        published_dt = extract_published_from_html(soup, tzname)
-        if published_dt:
-            published = published_dt
+    if tree is not None:
+        if not author:
+            author = stage("meta", _author_from_html, tree)
+
+        if not headline:
+            h = _xpath(_H1_XPATH)(tree)
+            headline = _text(h[0]) if h else ""
+
+        # fecha desde HTML si falta
+        if not published:
+            published = stage("published", extract_published_from_html, tree, tzname)
+
+        if not article_body:
+            article_body = stage("trafilatura", _body_from_tree, tree, url)
+
+    canonical = None
+    if tree is not None:
+        found = _xpath(_CANONICAL_XPATH)(tree)
+        if found and found[0].strip():
+            canonical = canonical_url(urljoin(url, found[0].strip()))
+
+    return Article(
+        url=url,
+        canonical=canonical,
+        title=headline or "",
+        author=author or "",
+        published=published.isoformat() if isinstance(published, datetime) else (published if published else None),
+        _published_dt=published if isinstance(published, datetime) else None,
+        content=article_body or "",
+        fingerprint=stage("simhash", simhash, article_body or ""),
+    )
+
+# ========= DESCARGA CON CORTE POR FECHA =========
+# El artículo se lee en streaming; en cuanto llega el </head> se busca la
+# fecha (JSON-LD y metas). Si ya está fuera de la ventana se cierra la
+# conexión sin descargar ni extraer el cuerpo.
+HEAD_MAX_BYTES = 256 * 1024
+CHUNK_SIZE = 16 * 1024
+_HEAD_END_RE = re.compile(rb"</head\s*>|<body[\s>]", re.I)
+_YEAR_RE = re.compile(r"\b(19|20)\d{2}\b")
+
+class ArticleTooOld(Exception):
+    """La fecha del artículo (o del listing) ya está fuera de la ventana."""
+
+def published_from_tree(tree, tzname="Europe/Madrid"):
+    """Fecha de publicación con la misma prioridad que parse_article_html."""
+    meta = extract_jsonld(tree) or {}
+    published = normalize_datetime(meta.get("datePublished") or meta.get("dateModified"), tzname)
+    return published or extract_published_from_html(tree, tzname)
 
-    return {
-        "url": url,
-        "title": headline or "",
-        "author": author or "",
-        "published": published.isoformat() if isinstance(published, datetime) else (published if published else None),
-        "content": article_body or ""
-    }
+@lru_cache(maxsize=8192)
+def time_hint_datetime(hint, tzname="Europe/Madrid"):
+    """
+    Fecha del listing (pubDate de RSS, <time>…) solo si es una fecha completa:
+    textos como "hace 2 horas" o "12:30" no sirven para descartar nada.
+    """
+    if not hint or not _YEAR_RE.search(hint):
+        return None
+    return normalize_datetime(hint, tzname)
+
+def read_article_html(res: requests.Response, url, tzname="Europe/Madrid", hours=None):
+    buf = bytearray()
+    t0 = time.perf_counter()
+    try:
+        return _read_article_body(res, url, tzname, hours, buf)
+    finally:
+        METRICS.record_transfer(url, time.perf_counter() - t0, len(buf))
+
+def _read_article_body(res, url, tzname, hours, buf):
+    scan_from = 0
+    head_checked = False
+    for chunk in res.iter_content(CHUNK_SIZE):
+        buf += chunk
+        if len(buf) > MAX_RESPONSE_BYTES:
+            # el HTML truncado se parsea igual (lxml recupera); el resto no se lee
+            log(f"Aviso: artículo de más de {MAX_RESPONSE_BYTES} bytes, se trunca: {url}")
+            del buf[MAX_RESPONSE_BYTES:]
+            res.close()
+            break
+        if head_checked:
+            continue
+        m = _HEAD_END_RE.search(buf, max(0, scan_from - 16))
+        scan_from = len(buf)
+        if not m and len(buf) < HEAD_MAX_BYTES:
+            continue
+        head_checked = True
+        if not m:
+            continue
+        published = published_from_tree(parse_html_tree(bytes(buf[:m.start()])), tzname)
+        if published and not is_recent(published, tzname=tzname, hours=hours):
+            if RECORDER is not None:
+                RECORDER.record(url, res, "article", body=bytes(buf))
+            res.close()
+            raise ArticleTooOld(f"{published.isoformat()} fuera de ventana: {url}")
+    res._content = bytes(buf)
+    res._content_consumed = True
+    if RECORDER is not None:
+        RECORDER.record(url, res, "article")
+    return res.text
+
+# ========= POOL DE PROCESOS PARA EL PARSEO =========
+# La red va en hilos; el parseo (lxml, extruct, trafilatura, dateutil) es CPU
+# pura bajo el GIL, así que el HTML se manda a un pool de procesos y vuelve
+# solo el registro compacto del artículo. parse_workers: 0 = parseo en el hilo.
+_PARSE_POOL = None
+_PARSE_POOL_LOCK = threading.Lock()
+
+def get_parse_pool():
+    global _PARSE_POOL
+    if PARSE_WORKERS <= 0:
+        return None
+    with _PARSE_POOL_LOCK:
+        if _PARSE_POOL is None:
+            # spawn: el pool se crea con hilos ya en marcha y fork no es seguro ahí
+            # los procesos importan el módulo con los valores por defecto: se
+            # les pasa la config ya cargada (sin volver a leer config.yaml)
+            _PARSE_POOL = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                initializer=configure, initargs=(CFG, SOURCES, SHARD),
+            )
+        return _PARSE_POOL
+
+def shutdown_parse_pool():
+    global _PARSE_POOL
+    with _PARSE_POOL_LOCK:
+        if _PARSE_POOL is not None:
+            _PARSE_POOL.shutdown()
+            _PARSE_POOL = None
+
+def _parse_timed(html, url, tzname="Europe/Madrid"):
+    # los tiempos por etapa viajan con el registro para sobrevivir al pool
+    timings = {}
+    art = parse_article_html(html, url, tzname, timings=timings)
+    art["timings"] = timings
+    return art
+
+def parse_article(html, url, tzname="Europe/Madrid"):
+    pool = get_parse_pool()
+    if pool is None:
+        return _parse_timed(html, url, tzname)
+    return pool.submit(_parse_timed, html, url, tzname).result()
+
+def extract_article(url, tzname="Europe/Madrid", hours=None):
+    try:
+        res = http_get(url, stream=True)
+    except HTTPError as e:
+        if e.response is not None and e.response.status_code == 403:
+            raise RuntimeError(f"403 al abrir artículo: {url}")
+        raise
+    with res:
+        html = read_article_html(res, url, tzname, hours)
+    return parse_article(html, url, tzname)
 
 def is_recent(dt_iso, tzname="Europe/Madrid", hours=None):
+    """dt_iso: datetime ya parseado (preferible) o texto ISO."""
     hours = hours or CFG.get("hours_recent", 24)
     if not dt_iso:
         return False
     try:
-        target = tz.gettz(tzname)
+        target = get_tz(tzname)
         now = datetime.now(target)
-        dt = dateparser.parse(dt_iso).astimezone(target)
-        return (now - dt).total_seconds() <= hours * 3600
+        dt = dt_iso if isinstance(dt_iso, datetime) else parse_datetime(dt_iso)
+        return (now - dt.astimezone(target)).total_seconds() <= hours * 3600
     except Exception:
         return False
 
-def build_html_multi(arts, tzname="Europe/Madrid"):
-    target = tz.gettz(tzname)
-    now = datetime.now(target).strftime("%Y-%m-%d %H:%M")
-    blocks = []
-    for a in arts:
-        p = a.get("published")
-        p_h = dateparser.parse(p).strftime("%Y-%m-%d %H:%M") if p else "Sin fecha"
-        author_html = f'<div style="font-size:12px;color:#555;">{a.get("author")}</div>' if a.get("author") else ""
-        content_html = a.get("content","")
-        blocks.append(f"""
+def build_html_skipped(skipped_by_source):
+    """Nota al pie cuando el presupuesto de tiempo dejó artículos sin mirar."""
+    if not skipped_by_source:
+        return ""
+    total = sum(skipped_by_source.values())
+    detail = ", ".join(f"{k} ({v})" for k, v in sorted(skipped_by_source.items(), key=lambda kv: -kv[1]))
+    return (
+        '<hr style="margin:32px 0;">'
+        f'<p style="font-size:12px;color:#999;">Tiempo de ejecución agotado: {total} artículos '
+        f'no se revisaron y se mirarán en el próximo envío. Fuentes: {detail}.</p>'
+    )
+
+# ========= RESUMEN HTML =========
+# El resumen se escribe por trozos en un "sink" (fichero, StringIO, gzip) en
+# vez de montarse en memoria. digest.excerpt_chars recorta cada cuerpo y
+# digest.max_kb acota cada correo: lo que no cabe va en varios correos
+# (overflow: split) o entero en un adjunto .html.gz (overflow: attachment).
+
+def excerpt(text, limit):
+    if not limit or len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > limit // 2 else limit].rstrip() + " …"
+
+def article_html(a, excerpt_chars=None):
+    esc = html.escape
+    p = a.get("published_dt")
+    p_h = p.strftime("%Y-%m-%d %H:%M") if p else "Sin fecha"
+    author_html = f'<div style="font-size:12px;color:#555;">{esc(a["author"])}</div>' if a.get("author") else ""
+    outlets = a.get("outlets") or []
+    outlets_html = (
+        '<div style="font-size:12px;color:#666;">También en: '
+        + ", ".join(f'<a href="{esc(o["url"])}">{esc(o["source"])}</a>' for o in outlets)
+        + "</div>"
+    ) if outlets else ""
+    limit = EXCERPT_CHARS if excerpt_chars is None else excerpt_chars
+    content_html = esc(excerpt(a.get("content") or "", limit))
+    url = esc(a["url"])
+    return f"""
         <article style="margin-bottom:24px;">
-          <div style="font-size:12px;color:#999">{a.get('source','')}</div>
-          <h3 style="margin:2px 0 2px 0;">{a['title']}</h3>
+          <div style="font-size:12px;color:#999">{esc(a.get('source') or '')}</div>
+          <h3 style="margin:2px 0 2px 0;">{esc(a.get('title') or '')}</h3>
           {author_html}
-          <div style="font-size:12px;color:#666;">{p_h} — <a href="{a['url']}">{a['url']}</a></div>
+          <div style="font-size:12px;color:#666;">{p_h} — <a href="{url}">{url}</a></div>
+          {outlets_html}
           <p style="white-space:pre-wrap; line-height:1.45; margin-top:10px;">
             {content_html}
           </p>
-        </article>""")
+        </article>"""
+
+def _digest_head(tzname, title_suffix=""):
+    now = datetime.now(get_tz(tzname)).strftime("%Y-%m-%d %H:%M")
     return f"""<!doctype html>
-<html lang="es"><head><meta charset="utf-8"><title>Noticias ( {now} )</title></head>
+<html lang="es"><head><meta charset="utf-8"><title>Noticias ( {now} ){title_suffix}</title></head>
 <body style="font-family:system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial; max-width:800px; margin:24px auto; padding:0 16px;">
-<h1 style="margin-bottom:8px;">Noticias de hoy</h1>
+<h1 style="margin-bottom:8px;">Noticias de hoy{title_suffix}</h1>
 <div style="color:#666; font-size:12px; margin-bottom:16px;">Generado {now} ({tzname})</div>
-{''.join(blocks) if blocks else '<p>No hay artículos en el rango actual.</p>'}
-</body></html>"""
+"""
+
+_DIGEST_TAIL = "\n</body></html>"
+
+def write_digest(sink, arts, tzname="Europe/Madrid", extra_html="", excerpt_chars=None, title_suffix=""):
+    """Escribe el resumen en `sink` (cualquier objeto con .write) artículo a artículo."""
+    sink.write(_digest_head(tzname, title_suffix))
+    n = 0
+    for a in arts:
+        sink.write(article_html(a, excerpt_chars))
+        n += 1
+    if not n:
+        sink.write("<p>No hay artículos en el rango actual.</p>")
+    if extra_html:
+        sink.write(extra_html)
+    sink.write(_DIGEST_TAIL)
+
+def build_html_multi(arts, tzname="Europe/Madrid", extra_html=""):
+    sink = io.StringIO()
+    write_digest(sink, arts, tzname, extra_html)
+    return sink.getvalue()
+
+def digest_parts(arts, tzname="Europe/Madrid", extra_html="", max_bytes=None, excerpt_chars=None):
+    """
+    Reparte los artículos en tramos cuyo HTML no pase de max_bytes (el
+    primero lleva además extra_html). Un artículo que por sí solo supera el
+    límite va en un tramo propio.
+    """
+    max_bytes = max_bytes or DIGEST_MAX_BYTES
+    overhead = len((_digest_head(tzname, " (00/00)") + _DIGEST_TAIL).encode("utf-8"))
+    parts, current = [], []
+    size = overhead + len(extra_html.encode("utf-8"))
+    for a in arts:
+        n = len(article_html(a, excerpt_chars).encode("utf-8"))
+        if current and size + n > max_bytes:
+            parts.append(current)
+            current, size = [], overhead
+        current.append(a)
+        size += n
+    parts.append(current)
+    return parts
+
+def send_digest_html(mailer, arts, subject, to_emails=None, tzname="Europe/Madrid", extra_html="", tag=""):
+    """Envía el resumen respetando digest.max_kb (varios correos o adjunto comprimido)."""
+    parts = digest_parts(arts, tzname, extra_html)
+    if len(parts) == 1:
+        mailer.send(build_html_multi(arts, tzname, extra_html), subject, to_emails, tag)
+        return 1
+    log(f"Resumen de {len(arts)} artículos por encima de {DIGEST_MAX_BYTES // 1024} KB: {DIGEST_OVERFLOW}")
+    if DIGEST_OVERFLOW == "attachment":
+        # el resumen completo, en streaming a gzip; en el cuerpo, lo que cabe
+        buf = io.BytesIO()
+        writer = io.TextIOWrapper(gzip.GzipFile(fileobj=buf, mode="wb"), encoding="utf-8")
+        write_digest(writer, arts, tzname, extra_html)
+        writer.close()
+        note = (
+            '<p style="font-size:13px;color:#666;">Se muestran {} de {} artículos; '
+            'el resumen completo va adjunto (resumen.html.gz).</p>'
+        )
+        # el aviso también ocupa: se vuelve a repartir contándolo
+        shown = digest_parts(arts, tzname, note.format(len(arts), len(arts)) + extra_html)[0]
+        body = build_html_multi(shown, tzname, note.format(len(shown), len(arts)) + extra_html)
+        mailer.send(body, subject, to_emails, tag, attachments=[("resumen.html.gz", buf.getvalue(), "application", "gzip")])
+        return 1
+    total = len(parts)
+    for k, part in enumerate(parts, 1):
+        suffix = f" ({k}/{total})"
+        sink = io.StringIO()
+        write_digest(sink, part, tzname, extra_html if k == 1 else "", title_suffix=suffix)
+        mailer.send(sink.getvalue(), subject + suffix, to_emails, f"{tag}_{k}" if tag else str(k))
+    return total
 
 # ========= STATE =========
-def load_state():
-    return set()
+# Resultado de cada URL en ejecuciones anteriores. Una URL conocida y vigente
+# se salta antes de cualquier petición de red. state_ttl_hours las ajusta.
+STATE_TTL_DEFAULT_HOURS = {
+    "sent": 24 * 30,     # ya enviada en un resumen
+    "accepted": 48,      # aceptada, a la espera de que salga el resumen (punto de control)
+    "old": 24 * 7,       # fuera de la ventana de horas (o sin fecha)
+    "keyword": 24 * 3,   # no contenía las keywords (solo vale con las mismas keywords)
+    "error": 6,          # fallo de red/extracción: se reintenta pronto
+}
+
+class SeenStore:
+    """
+    Almacén SQLite de URLs ya procesadas: url -> (resultado, firma, ts, caduca).
+    Las URLs se guardan por su canonical_url(). Se carga entero en memoria al
+    arrancar; las escrituras se agrupan.
+    """
+    def __init__(self, path=None, signature=""):
+        path = path or STATE_FILE
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.signature = signature
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " url TEXT PRIMARY KEY, outcome TEXT NOT NULL, sig TEXT NOT NULL DEFAULT '',"
+            " ts REAL NOT NULL, expires REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._pending = []
+        now = time.time()
+        self._entries = {
+            url: (outcome, sig, expires)
+            for url, outcome, sig, expires in self._db.execute(
+                "SELECT url, outcome, sig, expires FROM seen WHERE expires > ?", (now,)
+            )
+        }
+
+    def __contains__(self, url):
+        e = self._entries.get(canonical_url(url))
+        if not e or e[2] <= time.time():
+            return False
+        outcome, sig, _ = e
+        return outcome != "keyword" or sig == self.signature
+
+    def __len__(self):
+        return len(self._entries)
+
+    def outcome(self, url):
+        e = self._entries.get(canonical_url(url))
+        return e[0] if e and e[2] > time.time() else None
+
+    def record(self, url, outcome):
+        url = canonical_url(url)
+        now = time.time()
+        expires = now + STATE_TTL_HOURS.get(outcome, 24) * 3600
+        with self._lock:
+            self._entries[url] = (outcome, self.signature, expires)
+            self._pending.append((url, outcome, self.signature, now, expires))
+            if len(self._pending) >= 200:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO seen (url, outcome, sig, ts, expires) VALUES (?,?,?,?,?)",
+                self._pending,
+            )
+        self._pending = []
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            with self._db:
+                self._db.execute("DELETE FROM seen WHERE expires <= ?", (time.time(),))
+            self._db.close()
+
+def keywords_signature(kw_list):
+    if not kw_list:
+        return ""
+    return hashlib.sha1("\n".join(sorted(set(kw_list))).encode("utf-8")).hexdigest()[:16]
+
+def load_state(kw_list=None):
+    try:
+        store = SeenStore(STATE_FILE, keywords_signature(kw_list))
+    except sqlite3.Error as e:
+        log(f"[STATE] No se pudo abrir {STATE_FILE}: {e}. Se usa estado en memoria.")
+        store = SeenStore(":memory:", keywords_signature(kw_list))
+    log(f"[STATE] URLs conocidas: {len(store)}")
+    return store
 
 def save_state(seen):
-    return
+    seen.close()
+
+def mark_sent(seen, arts):
+    """Tras enviar el resumen, sus URLs (y las de sus duplicados) pasan de "accepted" a "sent"."""
+    for art in arts:
+        for url in [art.get("url"), art.get("canonical")] + [o["url"] for o in art.get("outlets") or []]:
+            if url:
+                seen.record(url, "sent")
+
+# ========= PUNTOS DE CONTROL =========
+# Una ejecución cortada (fallo, timeout del job) no pierde lo hecho: cada
+# CHECKPOINT_SECONDS se vuelcan el estado de URLs, el archivo y los artículos
+# aceptados (resumen pendiente, el mismo fichero que usa el modo continuo),
+# y los listings de la ventana quedan en state.sqlite. La ejecución siguiente
+# parte de ahí. Cada perfil recibe como mucho un resumen por ventana (el día
+# en una pasada normal, la hora de envío en el modo continuo).
+CHECKPOINT_KEEP_DAYS = 7
+
+def load_digest(path=None):
+    path = path or DIGEST_FILE
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [Article.from_dict(d).spill() for d in json.load(f)]
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError) as e:
+        log(f"[REANUDAR] No se pudo leer {path}: {e}. Se empieza un resumen nuevo.")
+        return []
+
+def save_digest(digest, path=None):
+    path = path or DIGEST_FILE
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        # artículo a artículo: los cuerpos vuelcados a disco se leen de uno en uno
+        f.write("[")
+        for k, art in enumerate(digest):
+            if k:
+                f.write(",\n")
+            json.dump(art.to_dict(), f, ensure_ascii=False)
+        f.write("]")
+    os.replace(tmp, path)
+
+class RunCheckpoint:
+    """Listings ya descargados y resúmenes ya enviados de una ventana."""
+    def __init__(self, window, path=None):
+        path = path or STATE_FILE
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.window = window
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS run_listings ("
+            " window TEXT NOT NULL, source TEXT NOT NULL, items TEXT NOT NULL, ts REAL NOT NULL,"
+            " PRIMARY KEY (window, source))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS digests_sent ("
+            " window TEXT NOT NULL, profile TEXT NOT NULL, articles INTEGER NOT NULL, sent_at REAL NOT NULL,"
+            " PRIMARY KEY (window, profile))"
+        )
+        cutoff = time.time() - CHECKPOINT_KEEP_DAYS * 86400
+        with self._db:
+            self._db.execute("DELETE FROM run_listings WHERE ts < ?", (cutoff,))
+            self._db.execute("DELETE FROM digests_sent WHERE sent_at < ?", (cutoff,))
+        self._lock = threading.Lock()
+
+    def listing(self, source):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT items FROM run_listings WHERE window = ? AND source = ?", (self.window, source)
+            ).fetchone()
+        return [ListingItem(**dict(d, source=source)) for d in json.loads(row[0])] if row else None
+
+    def save_listing(self, source, items):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO run_listings VALUES (?,?,?,?)",
+                (self.window, source, json.dumps([it.to_dict() for it in items], ensure_ascii=False), time.time()),
+            )
 
-# ========= EMAIL =========
-def enviar_correo(html_content, subject):
-    if not SMTP_PASS:
-        raise RuntimeError("SMTP_PASS no está definido (variable de entorno).")
-    msg = EmailMessage()
-    msg["From"] = SMTP_USER
-    msg["To"] = ", ".join(TO_EMAILS)
-    msg["Subject"] = subject
-    msg.set_content("Resumen diario en HTML.")
-    msg.add_alternative(html_content, subtype="html")
-    with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=ssl.create_default_context()) as s:
-        s.login(SMTP_USER, SMTP_PASS)
-        s.send_message(msg)
-    log(f"Correo enviado a {', '.join(TO_EMAILS)} ✅")
+    def was_sent(self, profile):
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM digests_sent WHERE window = ? AND profile = ?", (self.window, profile)
+            ).fetchone() is not None
+
+    def mark_sent(self, profile, n_articles):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO digests_sent VALUES (?,?,?,?)",
+                (self.window, profile, n_articles, time.time()),
+            )
 
-# ========= MAIN =========
-def main(keyword=None, tzname="Europe/Madrid"):
-    log(f"CNMV_NIFS configurados: {CNMV_NIFS}")
-    seen = load_state()
-    listing = parse_all_listings()
-
-    print("Primeros 15 títulos del listing combinado:")
-    for it in listing[:15]:
-        print(" -", f"[{it.get('source','?')}] {(it.get('title') or '').strip()}")
-
-    # Normaliza keyword(s) -> lista
-    kw_list = None
-    if keyword:
-        if isinstance(keyword, (list, tuple, set)):
-            kw_list = [norm(k) for k in keyword if k]
-        else:
-            kw_list = [norm(keyword)]
-
-    # Prefiltro ADAPTATIVO por título/URL (solo si reduce significativamente)
-    if kw_list:
-        before = len(listing)
-        pre = [
-            it for it in listing
-            if any(k in norm(it.get("title","")) or k in norm(it.get("url","")) for k in kw_list)
-        ]
-        THRESH_ABS = 50
-        THRESH_REL = 0.2  # 20%
-        use_prefilter = len(pre) >= max(THRESH_ABS, int(before * THRESH_REL))
-        if use_prefilter:
-            listing = pre
-            print(f"Prefiltro por {kw_list} aplicado: {len(listing)} (antes {before})")
-        else:
-            print(f"Prefiltro por {kw_list} NO aplicado ({len(pre)} candidatos). Buscaré en el cuerpo de {before} URLs.")
+    def save_progress(self, arts, seen, archive=None):
+        """Punto de control: estado de URLs, archivo y artículos aceptados, en ese orden."""
+        seen.flush()
+        if archive is not None:
+            archive.flush()
+        save_digest(arts)
 
-    collected = []
-    for i, item in enumerate(listing, 1):
-        url = item["url"]
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+def open_checkpoint(window):
+    try:
+        return RunCheckpoint(window)
+    except sqlite3.Error as e:
+        log(f"[REANUDAR] No se pudo abrir {STATE_FILE}: {e}. Se sigue sin puntos de control.")
+        return None
 
-        # respeta 'seen' solo si no hay filtro
-        if not kw_list and url in seen:
+# ========= ARCHIVO DE ARTÍCULOS (SQLite FTS5) =========
+# Todo artículo extraído se guarda con su cuerpo. Un índice FTS5 de trigramas
+# sobre el texto normalizado (sin tildes, minúsculas) da la misma semántica de
+# subcadena que KeywordMatcher, así que cualquier filtro de keywords se puede
+# responder desde aquí sin volver a descargar (python marca_harvester.py --query).
+ARCHIVE_FIELDS = ("url", "canonical", "source", "title", "author", "published", "content", "fingerprint")
+
+class ArticleArchive:
+    def __init__(self, path=None):
+        path = path or ARCHIVE_FILE
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS articles ("
+            " url TEXT PRIMARY KEY, canonical TEXT, source TEXT, title TEXT, author TEXT,"
+            " published TEXT, published_ts REAL, content TEXT, fingerprint TEXT, stored_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS articles_published ON articles (published_ts)")
+        self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(text, tokenize='trigram')")
+        self._lock = threading.Lock()
+        self._pending = {}  # url -> artículo aún no escrito
+
+    def __contains__(self, url):
+        if url in self._pending:
+            return True
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM articles WHERE url = ?", (url,)).fetchone() is not None
+
+    def get(self, url):
+        art = self._pending.get(url)
+        if art is not None:
+            return Article.from_dict({k: art[k] for k in ARCHIVE_FIELDS})
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(ARCHIVE_FIELDS)} FROM articles WHERE url = ?", (url,)
+            ).fetchone()
+        return Article.from_dict(dict(zip(ARCHIVE_FIELDS, row))) if row else None
+
+    def put(self, art):
+        if not art.get("url") or not art.get("published"):
+            return
+        rec = {k: art.get(k) for k in ARCHIVE_FIELDS}
+        rec["published_ts"] = art.published_dt.timestamp()
+        with self._lock:
+            self._pending[art["url"]] = rec
+            if len(self._pending) >= 50:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        now = time.time()
+        with self._db:
+            for art in self._pending.values():
+                cur = self._db.execute(
+                    f"INSERT OR IGNORE INTO articles ({', '.join(ARCHIVE_FIELDS)}, published_ts, stored_at)"
+                    f" VALUES ({', '.join('?' * len(ARCHIVE_FIELDS))}, ?, ?)",
+                    [art[k] for k in ARCHIVE_FIELDS] + [art["published_ts"], now],
+                )
+                if cur.rowcount:
+                    self._db.execute(
+                        "INSERT INTO articles_fts (rowid, text) VALUES (?, ?)",
+                        (cur.lastrowid, norm(f"{art.get('title') or ''} {art.get('content') or ''}")),
+                    )
+        self._pending = {}
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def search(self, matcher=None, since=None, until=None):
+        """
+        Artículos publicados en [since, until] (datetimes con zona) que casan
+        con `matcher` (KeywordMatcher; sin keywords, todos), más recientes primero.
+        """
+        with self._lock:
+            self._flush()
+            where, args = ["a.published_ts BETWEEN ? AND ?"], [
+                since.timestamp() if since else 0, until.timestamp() if until else time.time() + 86400
+            ]
+            join = ""
+            # el índice de trigramas sólo sirve si todas las keywords tienen 3+ letras
+            if matcher and all(len(k) >= 3 for k in matcher.keywords):
+                join = "JOIN articles_fts f ON f.rowid = a.rowid"
+                where.append("articles_fts MATCH ?")
+                args.append(" OR ".join('"' + k.replace('"', '""') + '"' for k in matcher.keywords))
+            rows = self._db.execute(
+                f"SELECT {', '.join('a.' + k for k in ARCHIVE_FIELDS)} FROM articles a {join}"
+                f" WHERE {' AND '.join(where)} ORDER BY a.published_ts DESC",
+                args,
+            ).fetchall()
+        out = []
+        for row in rows:
+            art = Article.from_dict(dict(zip(ARCHIVE_FIELDS, row)))
+            if matcher:
+                hits = matcher.matches((art.get("title") or "") + " " + (art.get("content") or ""))
+                if not hits:
+                    continue
+                art["keywords"] = list(hits)
+            out.append(art)
+        return out
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            cutoff = time.time() - ARCHIVE_KEEP_DAYS * 86400
+            with self._db:
+                self._db.execute(
+                    "DELETE FROM articles_fts WHERE rowid IN (SELECT rowid FROM articles WHERE published_ts < ?)",
+                    (cutoff,),
+                )
+                self._db.execute("DELETE FROM articles WHERE published_ts < ?", (cutoff,))
+            self._db.close()
+
+def open_archive():
+    if ARCHIVE_CFG.get("enabled", True) is False:
+        return None
+    try:
+        return ArticleArchive(ARCHIVE_FILE)
+    except sqlite3.Error as e:
+        log(f"[ARCHIVO] No se pudo abrir {ARCHIVE_FILE}: {e}. Se sigue sin archivo.")
+        return None
+
+def query_archive(keyword=None, hours=None, until=None, tzname="Europe/Madrid"):
+    """
+    Filtro de keywords sobre el archivo para una ventana de `hours` horas
+    que termina en `until` (por defecto, ahora). Colapsa duplicados igual que main().
+    """
+    archive = open_archive()
+    if archive is None:
+        return []
+    matcher = KeywordMatcher(keyword)
+    until = until or datetime.now(get_tz(tzname))
+    since = until - timedelta(hours=hours or CFG.get("hours_recent", 24))
+    try:
+        arts = archive.search(matcher or None, since, until)
+    finally:
+        archive.close()
+    out, by_url, by_fp = [], {}, {}
+    for art in arts:
+        canon = art.get("canonical") or canonical_url(art["url"])
+        dup = by_url.get(canon)
+        if dup is None:
+            dup = near_duplicate(art.get("fingerprint"), by_fp)
+        if dup is not None:
+            if art.get("source") != out[dup].get("source"):
+                out[dup].setdefault("outlets", []).append({"source": art.get("source"), "url": art["url"]})
             continue
+        by_url[canon] = len(out)
+        if art.get("fingerprint"):
+            by_fp[len(out)] = art["fingerprint"]
+        out.append(art)
+    return out
+
+def run_query_cli(argv):
+    init()
+    ap = argparse.ArgumentParser(
+        prog="marca_harvester.py --query",
+        description="Busca en el archivo de artículos ya descargados (sin red).",
+    )
+    ap.add_argument("keywords", nargs="*", help="keywords (por defecto, las de config.yaml)")
+    ap.add_argument("--hours", type=float, default=CFG.get("hours_recent", 24), help="horas de ventana")
+    ap.add_argument("--until", help="fin de la ventana (fecha/hora; por defecto, ahora)")
+    ap.add_argument("--html", help="guarda el resumen HTML en este fichero")
+    ap.add_argument("--send", action="store_true", help="envía el resumen por correo")
+    args = ap.parse_args(argv)
+    tzname = CFG.get("tzname", "Europe/Madrid")
+    until = None
+    if args.until:
+        until = parse_datetime(args.until)
+        if until is None:
+            ap.error(f"--until: fecha no reconocida: {args.until!r} (p. ej. 2025-05-01 o 01/05/2025 18:00)")
+        if until.tzinfo is None:
+            until = until.replace(tzinfo=get_tz(tzname))
+    keywords = args.keywords or CFG.get("keywords") or [CFG.get("keyword")]
+    arts = query_archive(keywords, args.hours, until, tzname)
+    for a in arts:
+        kw_info = f" ({', '.join(a['keywords'])})" if a.get("keywords") else ""
+        print(f"{a.get('published','')[:16]}  [{a.get('source','?')}] {(a.get('title') or '')[:90]}{kw_info}\n    {a['url']}")
+    print(f"{len(arts)} artículos en el archivo")
+    if args.html or args.send:
+        html = build_html_multi(arts, tzname=tzname)
+        if args.html:
+            with open(args.html, "w", encoding="utf-8") as f:
+                f.write(html)
+        if args.send and arts:
+            enviar_correo(html, subject=f"Noticias del archivo ({datetime.now().strftime('%Y-%m-%d')})")
 
-        time.sleep(SLEEP_BETWEEN)
+# ========= EMAIL =========
+DRY_RUN = bool(os.getenv("NOTICIERO_DRY_RUN"))
+
+class Mailer:
+    """
+    Una sola conexión SMTP (abierta al primer envío) para todos los
+    resúmenes de la ejecución. Se usa como context manager.
+    """
+    def __init__(self):
+        self._smtp = None
+
+    def _connect(self):
+        if self._smtp is None:
+            if not SMTP_PASS:
+                raise RuntimeError("SMTP_PASS no está definido (variable de entorno).")
+            import smtplib
+            import ssl
+            self._smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=ssl.create_default_context())
+            self._smtp.login(SMTP_USER, SMTP_PASS)
+        return self._smtp
+
+    def send(self, html_content, subject, to_emails=None, tag="", attachments=()):
+        """attachments: [(nombre, bytes, maintype, subtype)]"""
+        to_emails = to_emails or TO_EMAILS
+        if DRY_RUN:
+            path = os.path.join(STATE_DIR, f"ultimo_resumen{'_' + tag if tag else ''}.html")
+            os.makedirs(STATE_DIR, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(html_content)
+            for name, data, _, _ in attachments:
+                with open(os.path.join(STATE_DIR, name), "wb") as f:
+                    f.write(data)
+            log(f"[DRY-RUN] No se envía correo. Resumen '{subject}' guardado en {path}")
+            return
+        import smtplib
+        from email.message import EmailMessage
+        msg = EmailMessage()
+        msg["From"] = SMTP_USER
+        msg["To"] = ", ".join(to_emails)
+        msg["Subject"] = subject
+        msg.set_content("Resumen diario en HTML.")
+        msg.add_alternative(html_content, subtype="html")
+        for name, data, maintype, subtype in attachments:
+            msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=name)
         try:
-            art = extract_article(url, tzname=tzname)
-        except Exception as e:
-            log(f"Error extrayendo {url}: {e}")
-            continue
+            self._connect().send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # el servidor cerró la conexión entre envíos: se reabre una vez
+            self._smtp = None
+            self._connect().send_message(msg)
+        log(f"Correo enviado a {', '.join(to_emails)} ✅")
+
+    def close(self):
+        if self._smtp is not None:
+            import smtplib
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def enviar_correo(html_content, subject, to_emails=None, mailer=None, tag=""):
+    if mailer is not None:
+        return mailer.send(html_content, subject, to_emails, tag)
+    with Mailer() as m:
+        m.send(html_content, subject, to_emails, tag)
+
+# ========= MAIN =========
+# ========= ARRANQUE =========
+# Importar el módulo no lee nada de disco: la config (compilada), la sesión
+# HTTP y lo que tiene estado (caché HTTP, feeds y perfiles de fuentes,
+# grabación/reproducción) los abre init(), que llaman los puntos de entrada
+# (main, --daemon, --shard, --merge, --query). Es idempotente.
+_INITIALIZED = False
+
+def configure(cfg, sources=(), shard=None):
+    """Fija los ajustes que dependen de config.yaml, del reparto y de las variables de entorno."""
+    global CFG, SOURCES, SHARD, BASE_STATE_DIR, STATE_DIR, SHARD_DIR, SHARD_RECEIPTS_FILE, REPORT_FILE
+    global CNMV_NIFS, CNMV_LANG, CNMV_WORKERS, CNMV_HOST_DELAY, CNMV_ONLY_CHANGES
+    global WORKERS, HOST_DELAY, MAX_RESPONSE_BYTES, RETRY_AFTER_MAX, BREAKER_FAILURES, POLITENESS, BREAKER
+    global HTTP_CACHE_CFG, HTTP_CACHE_FILE, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_FRESH, TO_EMAILS
+    global CNMV_DB_FILE, SOURCES_DB_FILE, DAEMON_CFG, POLL_MIN_SECONDS, POLL_MAX_SECONDS, FLUSH_TIMES
+    global RUN_BUDGET, BUDGET_RESERVE, PARSE_WORKERS, DIGEST_CFG, EXCERPT_CHARS, DIGEST_MAX_BYTES, DIGEST_OVERFLOW
+    global STATE_FILE, STATE_TTL_HOURS, CHECKPOINT_SECONDS, DIGEST_FILE, ARCHIVE_CFG, ARCHIVE_FILE, ARCHIVE_KEEP_DAYS
+    CFG, SOURCES, SHARD = cfg, list(sources), shard
+
+    # Directorio de estado persistente entre ejecuciones (caché en GitHub Actions).
+    # Con --shard cada proceso lleva su propio estado (sus fuentes no se solapan
+    # con las de los demás); los resultados parciales van a SHARD_DIR.
+    BASE_STATE_DIR = os.getenv("NOTICIERO_STATE_DIR") or cfg.get("state_dir", ".noticiero")
+    STATE_DIR = os.path.join(BASE_STATE_DIR, f"shard-{SHARD[0]}-of-{SHARD[1]}") if SHARD else BASE_STATE_DIR
+    SHARD_DIR = os.getenv("NOTICIERO_SHARD_DIR") or os.path.join(BASE_STATE_DIR, "shards")
+    # URLs que el merge ha llegado a enviar: cada shard las da por enviadas al arrancar
+    SHARD_RECEIPTS_FILE = os.path.join(BASE_STATE_DIR, "shards_entregados.json")
+    REPORT_FILE = os.getenv("NOTICIERO_REPORT") or os.path.join(STATE_DIR, "run_report.json")
+    HTTP_CACHE_FILE = os.path.join(STATE_DIR, "http_cache.sqlite")
+    CNMV_DB_FILE = os.path.join(STATE_DIR, "cnmv.sqlite")
+    SOURCES_DB_FILE = os.path.join(STATE_DIR, "sources.sqlite")
+    STATE_FILE = os.path.join(STATE_DIR, "state.sqlite")
+    DIGEST_FILE = os.path.join(STATE_DIR, "resumen_pendiente.json")
+    ARCHIVE_FILE = os.path.join(STATE_DIR, "archive.sqlite")
+
+    CNMV_NIFS = _normalize_cnmv_nifs(cfg)
+    CNMV_LANG = (cfg.get("cnmv_lang") or "es").lower()
+    CNMV_WORKERS = max(1, int(cfg.get("cnmv_workers", 4)))
+    CNMV_HOST_DELAY = float(os.getenv("NOTICIERO_HOST_DELAY") or cfg.get("cnmv_delay_seconds", 0.5))  # entre consultas a la CNMV
+    CNMV_ONLY_CHANGES = bool(cfg.get("cnmv_only_changes", False))  # el correo sólo muestra cambios
+
+    # Concurrencia: nº de hilos que descargan artículos a la vez (entre medios distintos)
+    WORKERS = max(1, int(cfg.get("workers", 16)))
+    # Cortesía por medio: segundos mínimos entre peticiones al mismo host (+ jitter)
+    HOST_DELAY = float(os.getenv("NOTICIERO_HOST_DELAY") or cfg.get("host_delay_seconds", 1.3))
+    # tope por respuesta: un listing o artículo desmesurado no dispara la memoria
+    MAX_RESPONSE_BYTES = int(float(cfg.get("max_response_mb", 8)) * 1024 * 1024)
+    RETRY_AFTER_MAX = float(cfg.get("retry_after_max_seconds", 60))
+    # Cortacircuitos: tras breaker_failures fallos seguidos (403, 429, 503,
+    # timeouts) no se vuelve a pedir nada a ese host en la ejecución (0 = nunca).
+    BREAKER_FAILURES = max(0, int(cfg.get("breaker_failures", 3)))
+    POLITENESS = HostRateLimiter(
+        HOST_DELAY, jitter=HOST_JITTER,
+        intervals={urlsplit(CNMV_BASE_URL).hostname: CNMV_HOST_DELAY},
+    )
+    BREAKER = HostCircuitBreaker(BREAKER_FAILURES)
+
+    HTTP_CACHE_CFG = cfg.get("http_cache") or {}
+    HTTP_CACHE_MAX_BYTES = int(float(HTTP_CACHE_CFG.get("max_mb", 64)) * 1024 * 1024)
+    # Segundos durante los que una copia se sirve sin preguntar al servidor (0 = revalidar siempre)
+    HTTP_CACHE_FRESH = float(HTTP_CACHE_CFG.get("fresh_seconds", 0))
+
+    TO_EMAILS = cfg.get("to_emails", ["anartz2001@gmail.com"])
+
+    DAEMON_CFG = cfg.get("daemon") or {}
+    POLL_MIN_SECONDS = 60 * float(DAEMON_CFG.get("poll_min_minutes", 10))
+    POLL_MAX_SECONDS = 60 * float(DAEMON_CFG.get("poll_max_minutes", 240))
+    FLUSH_TIMES = DAEMON_CFG.get("flush_times") or ["07:00", "14:00", "20:00"]
+
+    RUN_BUDGET = max(0.0, float(cfg.get("run_budget_seconds", 0) or 0))
+    BUDGET_RESERVE = max(0.0, float(cfg.get("budget_reserve_seconds", 90)))
+    PARSE_WORKERS = max(0, int(cfg.get("parse_workers", 0)))
+
+    DIGEST_CFG = cfg.get("digest") or {}
+    EXCERPT_CHARS = int(DIGEST_CFG.get("excerpt_chars", 0))          # 0 = cuerpo completo
+    DIGEST_MAX_BYTES = int(1024 * float(DIGEST_CFG.get("max_kb", 2048)))
+    DIGEST_OVERFLOW = DIGEST_CFG.get("overflow", "split")
+
+    STATE_TTL_HOURS = {**STATE_TTL_DEFAULT_HOURS, **(cfg.get("state_ttl_hours") or {})}
+    CHECKPOINT_SECONDS = float(cfg.get("checkpoint_seconds", 30))
+
+    ARCHIVE_CFG = cfg.get("archive") or {}
+    ARCHIVE_KEEP_DAYS = float(ARCHIVE_CFG.get("keep_days", 30))
+
+configure({})
+
+def init(shard=None, config_path=CONFIG_FILE):
+    """Carga la config y abre sesión y almacenes; con `shard` (i, N) el estado va a su subdirectorio."""
+    global SESSION, HTTP_CACHE, FEEDS, PROFILES, _INITIALIZED
+    if _INITIALIZED:
+        return
+    _INITIALIZED = True
+    configure(*load_compiled_config(config_path), shard=shard)
+    SESSION = open_session()
+    HTTP_CACHE = open_http_cache()
+    try:
+        FEEDS = FeedDirectory()
+    except sqlite3.Error as e:
+        log(f"[FEED] No se pudo abrir {SOURCES_DB_FILE}: {e}. Descubrimiento en memoria.")
+    try:
+        PROFILES = SourceProfiles()
+    except sqlite3.Error as e:
+        log(f"[PERFIL] No se pudo abrir {SOURCES_DB_FILE}: {e}. Perfiles en memoria.")
+    setup_record_replay()
 
-        # si hay keywords, deben aparecer en título o cuerpo
-        if kw_list:
-            fulltxt = norm((art.get("title") or "") + " " + (art.get("content") or ""))
-            if not any(k in fulltxt for k in kw_list):
+def harvest(matcher, seen, archive=None, tzname="Europe/Madrid", sources=None, budget=None,
+            prior=None, require_match=True, hours=None, checkpoint=None):
+    """
+    Listing, descarga y filtrado de `sources` (todas por defecto). Devuelve
+    (artículos aceptados, {fuente: sin descargar por tiempo}, {fuente: enlaces
+    nuevos}). `prior` son artículos ya aceptados (el resumen pendiente del
+    modo continuo o de una ejecución cortada): van delante y los nuevos se
+    comparan con ellos. Con `checkpoint` (RunCheckpoint) los listings de la
+    ventana se reutilizan y el progreso se vuelca cada CHECKPOINT_SECONDS.
+    Con require_match=False (algún perfil sin keywords) no se descarta nada
+    por keywords, pero cada artículo lleva igualmente las que contiene.
+    """
+    t_start = time.monotonic()
+    budget = RUN_BUDGET if budget is None else budget
+    # a partir de `deadline` no se lanzan descargas; en `hard_deadline` se
+    # abandona lo que siga en vuelo
+    deadline = t_start + max(0.0, budget - BUDGET_RESERVE) if budget else None
+    hard_deadline = deadline + BUDGET_RESERVE / 2 if deadline else None
+    kw_list = (matcher.keywords or None) if require_match else None
+    n_archived = 0
+
+    # El listing llega en streaming (fuentes en paralelo) mientras se descargan
+    # artículos de las fuentes que ya han respondido.
+    feed = queue.Queue()
+    stop_listing = threading.Event()
+    def _feeder():
+        try:
+            for it in iter_listings(sources, checkpoint, stop_listing):
+                feed.put(it)
+        finally:
+            feed.put(None)
+    threading.Thread(target=_feeder, name="listings", daemon=True).start()
+
+    # Prefiltro ADAPTATIVO por título/URL (solo si reduce significativamente).
+    # Los candidatos que casan se descargan ya; el resto espera a que termine
+    # el listing para decidir si el prefiltro compensa.
+    THRESH_ABS = 50
+    THRESH_REL = 0.2  # 20%
+    held = []
+    n_listing = n_pre = 0
+    listing_done = False
+
+    pending = ArticleScheduler()
+    in_flight = {}
+    skipped = []           # items que no se llegaron a descargar por tiempo
+    out_of_time = False
+    collected = {}     # orden de encolado -> artículo aceptado
+    by_url = {}        # URL (y canónica) -> orden
+    by_title = {}      # title_key -> orden
+    by_fp = {}         # orden -> simhash
+    funnel = {}        # fuente -> [descargados, en ventana, aceptados]
+    new_links = {}     # fuente -> enlaces no vistos antes
+
+    def _accept(i, art, item_title=None):
+        collected[i] = art
+        by_url[canonical_url(art["url"])] = i
+        if art.get("canonical"):
+            by_url[art["canonical"]] = i
+        if art.get("fingerprint"):
+            by_fp[i] = art["fingerprint"]
+        for key in (title_key(art.get("title")), title_key(item_title)):
+            if key:
+                by_title.setdefault(key, i)
+
+    for i, art in enumerate(prior or []):
+        _accept(i, art)
+    n_sent = len(collected)
+
+    def _count(source, stage):
+        METRICS.count(source, stage)
+        funnel.setdefault(source, {"fetched": 0, "in_window": 0, "accepted": 0})[stage] += 1
+
+    def _add_outlet(i, source, url):
+        art = collected[i]
+        if source != art.get("source") and all(o["source"] != source for o in art.get("outlets", [])):
+            art.setdefault("outlets", []).append({"source": source, "url": url})
+            log(f"    ↳ duplicado en {source}: {url}")
+
+    def _admit(it, hit=True):
+        # URLs ya resueltas en ejecuciones anteriores: ni se descargan
+        if it["url"] in seen:
+            METRICS.drop("seen", it.get("source", "?"))
+            return
+        new_links[it.get("source", "?")] = new_links.get(it.get("source", "?"), 0) + 1
+        # fecha exacta en el listing (RSS/sitemap) y ya antigua: tampoco
+        hint = time_hint_datetime(it.get("time_hint"), tzname)
+        if hint and not is_recent(hint, tzname=tzname, hours=hours):
+            seen.record(it["url"], "old")
+            METRICS.drop("old_hint", it.get("source", "?"))
+            return
+        pending.push(it, article_value(it, hit, tzname))
+
+    log("Primeros 15 títulos del listing combinado:")
+    pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="article")
+    next_checkpoint = time.monotonic() + CHECKPOINT_SECONDS
+    n_checkpointed = len(collected)
+    try:
+        while True:
+            if checkpoint is not None and time.monotonic() >= next_checkpoint:
+                if len(collected) != n_checkpointed:
+                    checkpoint.save_progress([collected[i] for i in sorted(collected)], seen, archive)
+                    n_checkpointed = len(collected)
+                next_checkpoint = time.monotonic() + CHECKPOINT_SECONDS
+
+            if deadline and not out_of_time and time.monotonic() >= deadline:
+                out_of_time = True
+                stop_listing.set()
+                skipped.extend(pending.drain())
+                if not listing_done:
+                    skipped.extend(held)
+                    held = []
+                    listing_done = True
+                    log("[PRESUPUESTO] Tiempo agotado durante el listing: se corta aquí.")
+                log(f"[PRESUPUESTO] Tiempo agotado: {len(skipped)} artículos sin descargar, {len(in_flight)} en vuelo.")
+
+            while not listing_done:
+                block = not (in_flight or pending)
+                try:
+                    it = feed.get(
+                        block=block,
+                        timeout=max(0.0, deadline - time.monotonic()) if block and deadline else None,
+                    )
+                except queue.Empty:
+                    break
+                if it is None:
+                    listing_done = True
+                    if kw_list:
+                        use_prefilter = n_pre >= max(THRESH_ABS, int(n_listing * THRESH_REL))
+                        if use_prefilter:
+                            log(f"Prefiltro por {kw_list} aplicado: {n_pre} (antes {n_listing})")
+                        else:
+                            log(f"Prefiltro por {kw_list} NO aplicado ({n_pre} candidatos). Buscaré en el cuerpo de {n_listing} URLs.")
+                            for h in held:
+                                _admit(h, hit=False)
+                        held = []
+                    break
+                n_listing += 1
+                if n_listing <= 15:
+                    log(f" - [{it.get('source','?')}] {(it.get('title') or '').strip()}")
+                if kw_list and not (
+                    matcher.search(it.get("title","")) or matcher.search(it.get("url",""))
+                ):
+                    held.append(it)
+                    continue
+                n_pre += 1
+                _admit(it)
+
+            while pending and len(in_flight) < WORKERS * 2:
+                it = pending.pop()
+                # host cortado en esta ejecución: sin marcar como visto, para la próxima
+                if BREAKER.is_blocked(it["url"]):
+                    METRICS.drop("blocked", it.get("source", "?"))
+                    continue
+                # misma pieza (título idéntico) ya aceptada de otro medio: no se descarga
+                key = title_key(it.get("title"))
+                if key in by_title:
+                    _add_outlet(by_title[key], it.get("source", "?"), it["url"])
+                    seen.record(it["url"], "accepted")
+                    METRICS.drop("duplicate_title", it.get("source", "?"))
+                    continue
+                n_sent += 1
+                # ya extraído en otra ejecución (p. ej. con otras keywords): sin red
+                art = archive.get(it["url"]) if archive is not None else None
+                if art is not None:
+                    fut = Future()
+                    fut.set_result(art)
+                    n_archived += 1
+                else:
+                    fut = pool.submit(extract_article, it["url"], tzname=tzname, hours=hours)
+                in_flight[fut] = (n_sent, it)
+
+            if not in_flight:
+                if listing_done and not pending:
+                    break
                 continue
 
-        # exigir fecha y limitar por ventana reciente
-        if not art.get("published") or not is_recent(art.get("published"), tzname=tzname):
-            continue
+            if out_of_time and time.monotonic() >= hard_deadline:
+                log(f"[PRESUPUESTO] Se abandonan {len(in_flight)} descargas en vuelo.")
+                skipped.extend(item for _, item in in_flight.values())
+                in_flight.clear()
+                break
 
-        art["source"] = item.get("source","?")
-        collected.append(art)
-        seen.add(url)
-        log(f"[{i}/{len(listing)}] OK [{art['source']}]: {art.get('title','')[:80]}")
+            done, _ = wait(in_flight, timeout=0.2, return_when=FIRST_COMPLETED)
+            for fut in done:
+                i, item = in_flight.pop(fut)
+                url = item["url"]
+                source = item.get("source", "?")
+                if isinstance(fut.exception(), HostBlocked):
+                    METRICS.drop("blocked", source)
+                    continue
+                _count(source, "fetched")
+                try:
+                    art = fut.result()
+                except ArticleTooOld:
+                    seen.record(url, "old")
+                    METRICS.drop("old_head", source)
+                    continue
+                except Exception as e:
+                    log(f"Error extrayendo {url}: {e}")
+                    seen.record(url, "error")
+                    METRICS.drop("error", source)
+                    continue
+                timings = art.pop("timings", None)
+                art["source"] = source
+                if timings is not None:  # recién extraído, no sacado del archivo
+                    METRICS.record_stages(timings)
+                    if archive is not None:
+                        archive.put(art)
+
+                # exigir fecha y limitar por ventana reciente
+                if not art.get("published") or not is_recent(art.published_dt, tzname=tzname, hours=hours):
+                    seen.record(url, "old")
+                    METRICS.drop("old", source)
+                    continue
+                _count(source, "in_window")
+
+                # si hay keywords, deben aparecer en título o cuerpo
+                if matcher:
+                    hits = matcher.matches((art.get("title") or "") + " " + (art.get("content") or ""))
+                    if not hits and kw_list:
+                        seen.record(url, "keyword")
+                        METRICS.drop("keyword", source)
+                        continue
+                    art["keywords"] = list(hits)
+
+                # duplicado: misma URL canónica o cuerpo casi idéntico a uno aceptado
+                canon = art.get("canonical")
+                dup = by_url.get(canon) if canon else None
+                if dup is None:
+                    dup = near_duplicate(art.get("fingerprint"), by_fp)
+                if dup is not None:
+                    _add_outlet(dup, source, url)
+                    seen.record(url, "accepted")
+                    METRICS.drop("duplicate", source)
+                    continue
+                if canon and canon != canonical_url(url) and seen.outcome(canon) in ("sent", "accepted"):
+                    seen.record(url, seen.outcome(canon))
+                    METRICS.drop("seen", source)
+                    continue
 
-    save_state(seen)
+                _count(source, "accepted")
+                # el cuerpo ya no hace falta hasta renderizar el resumen
+                art.spill()
+                _accept(i, art, item.get("title"))
+                # "sent" cuando salga el resumen (mark_sent)
+                if canon:
+                    seen.record(canon, "accepted")
+                seen.record(url, "accepted")
+                kw_info = f" ({', '.join(art['keywords'])})" if art.get("keywords") else ""
+                log(f"[{i}] OK [{art['source']}]: {art.get('title','')[:80]}{kw_info}")
+    finally:
+        # con descargas abandonadas no se espera a sus hilos
+        stop_listing.set()
+        pool.shutdown(wait=not out_of_time, cancel_futures=True)
+
+    skipped_by_source = {}
+    for it in skipped:
+        METRICS.drop("budget", it.get("source", "?"))
+        skipped_by_source[it.get("source", "?")] = skipped_by_source.get(it.get("source", "?"), 0) + 1
+    if out_of_time:
+        log("[PRESUPUESTO] Sin descargar por tiempo: "
+            + ", ".join(f"{k}={v}" for k, v in sorted(skipped_by_source.items(), key=lambda kv: -kv[1])))
+
+    for name, row in funnel.items():
+        PROFILES.record_articles(name, row["fetched"], row["in_window"], row["accepted"])
+    if n_archived:
+        log(f"[ARCHIVO] {n_archived} artículos reutilizados del archivo sin descargar")
+
+    # mismo orden en que se encolaron, independientemente de qué hilo terminó antes
+    return [collected[i] for i in sorted(collected)], skipped_by_source, new_links
+
+def _fetch_cnmv_one(nif, history):
+    t0 = time.perf_counter()
+    try:
+        block = get_cnmv_short_positions(nif, known_hash=history.body_hash(nif) if history else None)
+        if block is not None and history is not None:
+            block = history.update(block)
+    except Exception as e:
+        log(f"[CNMV] Error procesando NIF {nif}: {e}")
+        METRICS.record_cnmv(nif, time.perf_counter() - t0, 0, False)
+        return None
+    METRICS.record_cnmv(nif, time.perf_counter() - t0, len((block or {}).get("rows") or []), block is not None)
+    return block
 
-    # HTML principal de noticias
-    html_news = build_html_multi(collected, tzname=tzname)
+def fetch_cnmv_blocks(nifs, stop=None):
+    """
+    {nif: bloque} de posiciones cortas; cada NIF se consulta una vez y en
+    paralelo (CNMV_WORKERS hilos; el ritmo lo marca POLITENESS para la CNMV).
+    Cada bloque lleva sus cambios respecto al histórico. Con `stop` activado
+    los NIFs que faltan ya no se consultan.
+    """
+    nifs = list(dict.fromkeys(n for n in (str(x).strip() for x in nifs) if n))
+    if not nifs:
+        return {}
+    history = open_cnmv_history()
+    blocks = {}
+    try:
+        def fetch_one(nif):
+            if stop is not None and stop.is_set():
+                return None
+            return _fetch_cnmv_one(nif, history)
+
+        with ThreadPoolExecutor(max_workers=min(CNMV_WORKERS, len(nifs)), thread_name_prefix="cnmv") as pool:
+            for nif, block in zip(nifs, pool.map(fetch_one, nifs)):
+                if block is not None:
+                    blocks[nif] = block
+    finally:
+        if history is not None:
+            history.close()
+    n_changed = sum(1 for b in blocks.values() if cnmv_has_changes(b))
+    log(f"[CNMV] {len(blocks)}/{len(nifs)} emisores consultados, {n_changed} con cambios")
+    return blocks
+
+def start_cnmv_fetch(nifs):
+    """Lanza fetch_cnmv_blocks en segundo plano (en paralelo al rastreo); devuelve su Future."""
+    runner = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cnmv-main")
+    stop = threading.Event()
+    job = runner.submit(fetch_cnmv_blocks, list(nifs), stop)
+    job.stop = stop
+    runner.shutdown(wait=False)
+    return job
+
+def cnmv_result(job, timeout=None):
+    """
+    Bloques de start_cnmv_fetch. Si no terminan en `timeout` segundos (lo que
+    queda de presupuesto) se abandonan los NIFs pendientes y se sigue sin CNMV.
+    """
+    try:
+        return job.result(timeout=timeout)
+    except FutureTimeout:
+        job.stop.set()
+        log(f"[CNMV] Sin terminar tras {timeout:.0f} s de espera: se envía sin posiciones cortas")
+    except Exception as e:
+        log(f"[CNMV] Error consultando la CNMV: {e}")
+    return {}
 
-    # Bloque CNMV (posiciones cortas) a partir de la config
-    cnmv_blocks = []
-    for nif in CNMV_NIFS:
-        if not nif:
-            continue
-        try:
-            block = get_cnmv_short_positions(str(nif).strip())
-        except Exception as e:
-            log(f"[CNMV] Error procesando NIF {nif}: {e}")
-            continue
-        if block:
-            cnmv_blocks.append(block)
+def send_digests(profiles, collected, tzname="Europe/Madrid", skipped_by_source=None, cnmv=None, checkpoint=None):
+    """
+    Un resumen por perfil (sus artículos y sus NIFs CNMV) por una única
+    conexión SMTP. `cnmv` son los bloques ya descargados (si no, se consultan
+    aquí). Con `checkpoint` cada perfil recibe como mucho un resumen por
+    ventana. Devuelve ({perfil: (artículos, bloques CNMV)}, [perfiles cuyo
+    envío falló]).
+    """
+    if checkpoint is not None:
+        done = [p["name"] for p in profiles if checkpoint.was_sent(p["name"])]
+        if done:
+            log(f"[REANUDAR] Resumen de {checkpoint.window} ya enviado a: {', '.join(done)}")
+        profiles = [p for p in profiles if p["name"] not in done]
+    if cnmv is None:
+        cnmv = fetch_cnmv_blocks(nif for p in profiles for nif in p["cnmv_nifs"])
+    sent, failed = {}, []
+    with Mailer() as mailer:
+        for p in profiles:
+            arts = profile_articles(p, collected, tzname)
+            cnmv_blocks = [cnmv[n] for n in p["cnmv_nifs"] if cnmv.get(n)]
+            if CNMV_ONLY_CHANGES and not any(cnmv_has_changes(b) for b in cnmv_blocks):
+                cnmv_blocks = []  # sin cambios no hay nada que contar
+            sent[p["name"]] = (len(arts), len(cnmv_blocks))
+            # Enviar correo si hay noticias, datos CNMV o se cortó por tiempo
+            if not (arts or cnmv_blocks or skipped_by_source):
+                log(f"[{p['name']}] No hay artículos ni posiciones cortas para enviar en el rango actual.")
+                continue
 
-    cnmv_html = build_html_cnmv(cnmv_blocks)
+            extra_html = build_html_cnmv(cnmv_blocks) + build_html_skipped(skipped_by_source)
+            filtro = f" — filtro: {', '.join(p['keywords'])}" if p["keywords"] else ""
+            asunto = f"Noticias de hoy ({datetime.now().strftime('%Y-%m-%d')}){filtro}"
+            tag = p["name"] if len(profiles) > 1 else ""
+            try:
+                send_digest_html(mailer, arts, asunto, p["to_emails"], tzname, extra_html, tag)
+            except Exception as e:
+                if len(profiles) == 1:
+                    raise
+                # un perfil con destinatarios rotos no deja sin correo a los demás
+                log(f"[{p['name']}] Error enviando el resumen: {e}")
+                failed.append(p["name"])
+                continue
+            if checkpoint is not None and not DRY_RUN:
+                checkpoint.mark_sent(p["name"], len(arts))
+    return sent, failed
 
-    if cnmv_html and "</body></html>" in html_news:
-        html = html_news.replace("</body></html>", cnmv_html + "\n</body></html>")
-    else:
-        html = html_news + (cnmv_html or "")
-
-    # Enviar correo si hay noticias o datos CNMV
-    if collected or cnmv_blocks:
-        filtro = ""
-        if kw_list:
-            filtro_vals = keyword if isinstance(keyword, (list, tuple, set)) else [keyword]
-            filtro = f" — filtro: {', '.join(str(k) for k in filtro_vals if k)}"
-        asunto = f"Noticias de hoy ({datetime.now().strftime('%Y-%m-%d')}){filtro}"
-        enviar_correo(html, subject=asunto)
+def split_delivered(profiles, collected, failed, tzname="Europe/Madrid"):
+    """
+    (entregados, pendientes): lo que algún perfil de `failed` tenía que
+    recibir sigue pendiente para el próximo intento; el resto ya salió.
+    """
+    owed = {a["url"] for p in profiles if p["name"] in failed for a in profile_articles(p, collected, tzname)}
+    if owed:
+        log(f"[ENVÍO] Falló el envío a {', '.join(failed)}: {len(owed)} artículos quedan pendientes")
+    return [a for a in collected if a["url"] not in owed], [a for a in collected if a["url"] in owed]
+
+def main(keyword=None, tzname="Europe/Madrid", profiles=None):
+    init()
+    profiles = profiles or load_profiles(CFG, keyword)
+    log(f"Perfiles: {', '.join(p['name'] for p in profiles)}; "
+        f"CNMV_NIFS configurados: {sorted({n for p in profiles for n in p['cnmv_nifs']})}")
+    METRICS.reset()
+    t_start = time.monotonic()
+    # una pasada normal es un resumen al día: si ya salió, no se repite
+    checkpoint = open_checkpoint(datetime.now(get_tz(tzname)).strftime("%Y-%m-%d"))
+    if checkpoint is not None and all(checkpoint.was_sent(p["name"]) for p in profiles):
+        log(f"[REANUDAR] El resumen de {checkpoint.window} ya se envió; nada que hacer.")
+        checkpoint.close()
+        return
+    # la CNMV se consulta en paralelo al rastreo, desde el principio
+    cnmv_job = start_cnmv_fetch(nif for p in profiles for nif in p["cnmv_nifs"])
+    # keywords de todos los perfiles compiladas en un único matcher
+    matcher, require_match = union_matcher(profiles)
+    seen = load_state(matcher.keywords or None)
+    archive = open_archive()
+    # artículos aceptados por una ejecución anterior que no llegó a enviar
+    prior = load_digest()
+    if prior:
+        log(f"[REANUDAR] {len(prior)} artículos recuperados del punto de control")
+    try:
+        collected, skipped_by_source, _ = harvest(
+            matcher, seen, archive, tzname, prior=prior,
+            require_match=require_match, hours=max(p["hours"] for p in profiles),
+            checkpoint=checkpoint,
+        )
+        save_digest(collected)
+    finally:
+        shutdown_parse_pool()
+        seen.flush()
+        if archive is not None:
+            archive.close()
+
+    # la CNMV espera como mucho lo que queda de presupuesto (menos el envío)
+    cnmv = cnmv_result(cnmv_job, budget_left(t_start, keep=BUDGET_RESERVE / 4))
+    try:
+        sent, failed = send_digests(profiles, collected, tzname, skipped_by_source, cnmv, checkpoint)
+        # lo entregado pasa de "accepted" a "sent"; lo de perfiles con fallo
+        # se queda en el resumen pendiente para la siguiente ejecución
+        delivered, pending = split_delivered(profiles, collected, failed, tzname)
+        # en DRY_RUN no sale nada: ni se marca como enviado ni se vacía lo
+        # pendiente (igual que el punto de control)
+        if not DRY_RUN:
+            mark_sent(seen, delivered)
+            save_digest(pending)
+    finally:
+        save_state(seen)
+        if checkpoint is not None:
+            checkpoint.close()
+
+    log(f"Artículos enviados: {len(delivered)}")
+    log(f"NIFs CNMV procesados: {sum(c for _, c in sent.values())}")
+    if len(profiles) > 1:
+        for name, (n_arts, n_cnmv) in sent.items():
+            log(f"  [{name}] {n_arts} artículos, {n_cnmv} NIFs CNMV")
+    log(f"Tiempo total: {time.monotonic() - t_start:.1f} s" + (f" (presupuesto {RUN_BUDGET:.0f} s)" if RUN_BUDGET else ""))
+    if REPLAY is not None:
+        st = REPLAY.stats
+        log(f"[REPLAY] {st['served']} servidas, {st['missing']} ausentes, {st['injected']} errores inyectados")
+    if HTTP_CACHE is not None:
+        st = HTTP_CACHE.stats
+        log(f"Caché HTTP: {st['hits']} hits, {st['revalidations']} revalidaciones (304), {st['misses']} misses")
+    write_run_report()
+
+def write_run_report(path=None):
+    """Vuelca el informe de la ejecución y resume las fuentes más caras."""
+    try:
+        rep = METRICS.write(path)
+    except Exception as e:
+        log(f"[INFORME] No se pudo escribir el informe: {e}")
+        return None
+    costly = sorted(
+        rep["sources"].items(),
+        key=lambda kv: -((kv[1]["listing"] or {}).get("seconds", 0.0) + kv[1]["http_seconds"]),
+    )
+    for name, row in costly[:3]:
+        secs = (row["listing"] or {}).get("seconds", 0.0) + row["http_seconds"]
+        log(f"[COSTE] {name}: {secs:.1f} s de red para {row['fetched']} descargados, {row['accepted']} aceptados")
+    if rep["drops"]:
+        log("[DESCARTES] " + ", ".join(f"{k}={v}" for k, v in sorted(rep["drops"].items())))
+    log(f"Informe de ejecución: {path or REPORT_FILE}")
+    return rep
+
+# ========= MODO CONTINUO =========
+# python marca_harvester.py --daemon: en vez de una pasada diaria, cada fuente
+# se sondea según su intervalo adaptativo (ver PERFIL POR FUENTE) y los
+# artículos aceptados se acumulan en un resumen pendiente (persistido en
+# disco) que se envía a las horas de daemon.flush_times.
+
+def next_flush_time(tzname="Europe/Madrid", now=None):
+    """Próxima hora de envío (epoch) según FLUSH_TIMES en la zona `tzname`."""
+    zone = get_tz(tzname)
+    now = now or datetime.now(zone)
+    candidates = []
+    for day in (0, 1):
+        for hhmm in FLUSH_TIMES:
+            h, m = (int(x) for x in str(hhmm).split(":"))
+            t = (now + timedelta(days=day)).replace(hour=h, minute=m, second=0, microsecond=0)
+            if t > now:
+                candidates.append(t)
+    return min(candidates).timestamp()
+
+def run_daemon(keyword=None, tzname="Europe/Madrid", profiles=None):
+    init()
+    profiles = profiles or load_profiles(CFG, keyword)
+    matcher, require_match = union_matcher(profiles)
+    hours = max(p["hours"] for p in profiles)
+    seen = load_state(matcher.keywords or None)
+    archive = open_archive()
+    digest = load_digest()
+    next_flush = next_flush_time(tzname)
+    log(f"[DAEMON] En marcha: {len(SOURCES)} fuentes, {len(digest)} artículos pendientes, "
+        f"próximo envío {datetime.fromtimestamp(next_flush).strftime('%Y-%m-%d %H:%M')}")
+
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+    METRICS.reset()
+    try:
+        while not stop.is_set():
+            now = time.time()
+            due = [src for src in SOURCES if PROFILES.poll_due(src["name"], now)]
+            if due:
+                log(f"[DAEMON] Sondeo de {len(due)} fuentes")
+                n_before = len(digest)
+                digest, _, new_links = harvest(
+                    matcher, seen, archive, tzname, sources=due, budget=0, prior=digest,
+                    require_match=require_match, hours=hours,
+                )
+                for src in due:
+                    PROFILES.record_poll(src["name"], new_links.get(src["name"], 0))
+                seen.flush()
+                if archive is not None:
+                    archive.flush()
+                save_digest(digest)
+                log(f"[DAEMON] {sum(new_links.values())} enlaces nuevos, {len(digest) - n_before} artículos al resumen ({len(digest)} pendientes)")
+
+            if time.time() >= next_flush:
+                # la ventana es la hora de envío: un reinicio no la repite
+                checkpoint = open_checkpoint(datetime.fromtimestamp(next_flush).strftime("%Y-%m-%d %H:%M"))
+                try:
+                    _, failed = send_digests(profiles, digest, tzname, checkpoint=checkpoint)
+                except Exception as e:
+                    # un fallo de correo (SMTP caído, credenciales) no para el
+                    # demonio: el resumen sigue pendiente para el próximo envío
+                    log(f"[DAEMON] Error enviando el resumen: {e}. Se reintenta en el próximo envío.")
+                    failed = [p["name"] for p in profiles]
+                finally:
+                    if checkpoint is not None:
+                        checkpoint.close()
+                delivered, digest = split_delivered(profiles, digest, failed, tzname)
+                if not DRY_RUN:
+                    mark_sent(seen, delivered)
+                if delivered:
+                    log(f"[DAEMON] Resumen enviado con {len(delivered)} artículos")
+                save_digest(digest)
+                # los cuerpos ya enviados no se vuelven a leer: el temporal se rehace
+                BODIES.compact(digest)
+                next_flush = next_flush_time(tzname)
+                write_run_report()
+                METRICS.reset()
+                BREAKER.reset()  # los hosts cortados vuelven a probarse tras cada envío
+
+            next_poll = min((PROFILES.get(src["name"]).get("next_poll") or 0) for src in SOURCES) if SOURCES else next_flush
+            stop.wait(max(1.0, min(next_poll, next_flush) - time.time()))
+    finally:
+        shutdown_parse_pool()
+        save_state(seen)
+        if archive is not None:
+            archive.close()
+        save_digest(digest)
+        log(f"[DAEMON] Detenido con {len(digest)} artículos pendientes de envío")
+
+# ========= REPARTO EN SHARDS =========
+# python marca_harvester.py --shard i/N rastrea sólo las fuentes cuyo dominio
+# cae en el shard i (crc32 del host, así cada host lo visita un único proceso y
+# la cortesía por host se mantiene) y deja sus artículos en
+# SHARD_DIR/shard-i-of-N.json, con un .done.json al terminar. Después,
+# python marca_harvester.py --merge junta los parciales, quita duplicados entre
+# shards, consulta la CNMV y envía un único resumen por perfil.
+# El shard no da nada por enviado: sus artículos siguen en su resumen
+# pendiente hasta que el merge anota en SHARD_RECEIPTS_FILE lo que de verdad
+# salió. Si el merge falla o se pierde un parcial, la siguiente pasada del
+# shard los vuelve a entregar.
+_SHARD_FILE_RE = re.compile(r"^shard-(\d+)-of-(\d+)\.json$")
+
+def shard_of(src, n):
+    host = (urlsplit(src["homepage"]).hostname or src["name"]).lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return zlib.crc32(host.encode("utf-8")) % n
+
+def shard_sources(shard, sources=None):
+    i, n = shard
+    return [src for src in (SOURCES if sources is None else sources) if shard_of(src, n) == i]
+
+def shard_paths(shard, shard_dir=None):
+    base = os.path.join(shard_dir or SHARD_DIR, f"shard-{shard[0]}-of-{shard[1]}")
+    return base + ".json", base + ".done.json"
+
+def load_shard_receipts(path=None):
+    """{URL: instante de envío} de lo que el merge ya ha enviado."""
+    try:
+        with open(path or SHARD_RECEIPTS_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def record_shard_receipts(arts, path=None):
+    """Anota como enviados `arts` (y sus duplicados); olvida lo de más de CHECKPOINT_KEEP_DAYS."""
+    path = path or SHARD_RECEIPTS_FILE
+    now = time.time()
+    receipts = {u: t for u, t in load_shard_receipts(path).items() if now - t < CHECKPOINT_KEEP_DAYS * 86400}
+    for art in arts:
+        for url in [art.get("url"), art.get("canonical")] + [o["url"] for o in art.get("outlets") or []]:
+            if url:
+                receipts[url] = now
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(receipts, f)
+    os.replace(tmp, path)
+
+def run_shard(shard, keyword=None, tzname="Europe/Madrid", profiles=None):
+    init(shard)
+    profiles = profiles or load_profiles(CFG, keyword)
+    sources = shard_sources(shard)
+    log(f"[SHARD {shard[0]}/{shard[1]}] {len(sources)} de {len(SOURCES)} fuentes: "
+        + ", ".join(src["name"] for src in sources))
+    METRICS.reset()
+    t_start = time.monotonic()
+    matcher, require_match = union_matcher(profiles)
+    seen = load_state(matcher.keywords or None)
+    archive = open_archive()
+    checkpoint = open_checkpoint(datetime.now(get_tz(tzname)).strftime("%Y-%m-%d"))
+    hours = max(p["hours"] for p in profiles)
+    # lo pendiente que el merge ya envió pasa a "sent"; lo que ni se envió ni
+    # está en ventana ya no saldrá
+    prior = load_digest()
+    receipts = load_shard_receipts()
+    mark_sent(seen, [a for a in prior if a["url"] in receipts])
+    prior = [a for a in prior if a["url"] not in receipts and is_recent(a.get("published_dt"), tzname=tzname, hours=hours)]
+    if prior:
+        log(f"[REANUDAR] {len(prior)} artículos pendientes de entregar al merge")
+    try:
+        collected, skipped_by_source, _ = harvest(
+            matcher, seen, archive, tzname, sources=sources, prior=prior,
+            require_match=require_match, hours=hours,
+            checkpoint=checkpoint,
+        )
+        save_digest(collected)
+    finally:
+        shutdown_parse_pool()
+        seen.flush()
+        if archive is not None:
+            archive.close()
+        if checkpoint is not None:
+            checkpoint.close()
+
+    # entrega al merge: parcial + marca de terminado. Todo sigue "accepted" y
+    # en el resumen pendiente hasta que el merge confirme el envío.
+    partial, done = shard_paths(shard)
+    save_digest(collected, partial)
+    with open(done, "w", encoding="utf-8") as f:
+        json.dump({"articles": len(collected), "skipped": skipped_by_source, "finished_at": time.time()}, f)
+    save_state(seen)
+    log(f"[SHARD {shard[0]}/{shard[1]}] {len(collected)} artículos en {partial} "
+        f"({time.monotonic() - t_start:.1f} s)")
+    write_run_report()
+
+def merge_articles(arts):
+    """Quita duplicados entre shards con los criterios de harvest(): URL, titular y simhash."""
+    kept, by_url, by_title, by_fp = [], {}, {}, {}
+    for art in arts:
+        urls = [canonical_url(u) for u in (art.get("url"), art.get("canonical")) if u]
+        i = next((by_url[u] for u in urls if u in by_url), None)
+        key = title_key(art.get("title"))
+        if i is None and key:
+            i = by_title.get(key)
+        if i is None:
+            i = near_duplicate(art.get("fingerprint"), by_fp)
+        if i is None:
+            i = len(kept)
+            kept.append(art)
+            for u in urls:
+                by_url[u] = i
+            if key:
+                by_title[key] = i
+            if art.get("fingerprint"):
+                by_fp[i] = art["fingerprint"]
+            continue
+        target = kept[i]
+        for o in [{"source": art.get("source"), "url": art["url"]}] + list(art.get("outlets") or []):
+            if o["source"] != target.get("source") and all(x["source"] != o["source"] for x in target.get("outlets") or []):
+                target.setdefault("outlets", []).append(o)
+        if art.get("keywords"):
+            target["keywords"] = list(dict.fromkeys((target.get("keywords") or []) + art["keywords"]))
+    return kept
+
+def load_shard_results(shard_dir=None):
+    """(artículos de todos los parciales, {fuente: sin descargar}, ficheros leídos)."""
+    shard_dir = shard_dir or SHARD_DIR
+    arts, skipped, files, found = [], {}, [], {}
+    names = sorted(os.listdir(shard_dir)) if os.path.isdir(shard_dir) else []
+    for name in names:
+        m = _SHARD_FILE_RE.match(name)
+        if not m:
+            continue
+        shard = (int(m.group(1)), int(m.group(2)))
+        partial, done = shard_paths(shard, shard_dir)
+        part = load_digest(partial)
+        arts.extend(part)
+        files.append(partial)
+        found.setdefault(shard[1], set()).add(shard[0])
+        try:
+            with open(done, encoding="utf-8") as f:
+                for src, k in (json.load(f).get("skipped") or {}).items():
+                    skipped[src] = skipped.get(src, 0) + k
+            files.append(done)
+        except FileNotFoundError:
+            log(f"[MERGE] El shard {shard[0]}/{shard[1]} no terminó: se usan sus {len(part)} artículos parciales")
+    for n, got in found.items():
+        missing = sorted(set(range(n)) - got)
+        if missing:
+            log(f"[MERGE] Faltan los shards {', '.join(f'{i}/{n}' for i in missing)}")
+    return arts, skipped, files
+
+def run_merge(keyword=None, tzname="Europe/Madrid", profiles=None):
+    init()
+    profiles = profiles or load_profiles(CFG, keyword)
+    METRICS.reset()
+    t_start = time.monotonic()
+    checkpoint = open_checkpoint(datetime.now(get_tz(tzname)).strftime("%Y-%m-%d"))
+    if checkpoint is not None and all(checkpoint.was_sent(p["name"]) for p in profiles):
+        log(f"[REANUDAR] El resumen de {checkpoint.window} ya se envió; nada que hacer.")
+        checkpoint.close()
+        return
+    cnmv_job = start_cnmv_fetch(nif for p in profiles for nif in p["cnmv_nifs"])
+    arts, skipped_by_source, files = load_shard_results()
+    n_shards = sum(1 for path in files if _SHARD_FILE_RE.match(os.path.basename(path)))
+    if not n_shards:
+        log(f"[MERGE] No hay resultados de shards en {SHARD_DIR}")
+    merged = merge_articles(arts)
+    log(f"[MERGE] {len(arts)} artículos de {n_shards} shards, {len(merged)} tras quitar duplicados")
+    # la CNMV espera como mucho lo que queda de presupuesto (menos el envío)
+    cnmv = cnmv_result(cnmv_job, budget_left(t_start, keep=BUDGET_RESERVE / 4))
+    try:
+        _, failed = send_digests(profiles, merged, tzname, skipped_by_source, cnmv, checkpoint)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+    delivered, _ = split_delivered(profiles, merged, failed, tzname)
+    if DRY_RUN:
+        log("[MERGE] DRY_RUN: no se anota nada como enviado y se conservan los parciales")
     else:
-        log("No hay artículos ni posiciones cortas para enviar en el rango actual.")
-
-    log(f"Artículos enviados: {len(collected)}")
-    log(f"NIFs CNMV procesados: {len(cnmv_blocks)}")
+        record_shard_receipts(delivered)
+        # los parciales se borran sólo cuando todos los perfiles tienen su
+        # resumen; si no, un nuevo --merge reintenta los que fallaron
+        if failed:
+            log(f"[MERGE] Se conservan los parciales para reintentar: {', '.join(failed)}")
+        else:
+            for path in files:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    log(f"Artículos enviados: {len(delivered)}")
+    log(f"Tiempo total: {time.monotonic() - t_start:.1f} s")
+    write_run_report()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--query":
+        run_query_cli(sys.argv[2:])
+        sys.exit(0)
+    try:
+        shard = _parse_shard(sys.argv[1:], os.getenv("NOTICIERO_SHARD"))
+    except ValueError as e:
+        sys.exit(str(e))
+    init(shard)
     kw_env = os.getenv("KEYWORD")
     tz_env = os.getenv("TZNAME")
     kws = CFG.get("keywords") or [CFG.get("keyword")]
     tzname = sys.argv[2] if len(sys.argv) > 2 else (tz_env or CFG.get("tzname","Europe/Madrid"))
     if kw_env and not kws:
         kws = [k.strip() for k in kw_env.split("|") if k.strip()]
-    main(keyword=kws, tzname=tzname)
+    profile_path = os.getenv("NOTICIERO_PROFILE")
+    if "--daemon" in sys.argv[1:]:
+        run_daemon(keyword=kws, tzname=tz_env or CFG.get("tzname", "Europe/Madrid"))
+    elif shard:
+        run_shard(shard, keyword=kws, tzname=tz_env or CFG.get("tzname", "Europe/Madrid"))
+    elif "--merge" in sys.argv[1:]:
+        run_merge(keyword=kws, tzname=tz_env or CFG.get("tzname", "Europe/Madrid"))
+    elif profile_path:
+        import cProfile
+        cProfile.run("main(keyword=kws, tzname=tzname)", profile_path)
+        log(f"Perfil cProfile guardado en {profile_path} (python -m pstats {profile_path})")
+    else:
+        main(keyword=kws, tzname=tzname)
 
 
 
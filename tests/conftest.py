@@ -0,0 +1,60 @@
+import os
+import sys
+
+import pytest
+import requests
+
+# marca_harvester.py es un script suelto en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import marca_harvester as mh  # noqa: E402
+
+
+class Web:
+    """Respuestas servidas por ReplayAdapter desde un HttpCorpus temporal; anota cada petición."""
+    def __init__(self, path):
+        self.corpus = mh.HttpCorpus(path)
+        self.requests = []
+        web = self
+
+        class Adapter(mh.ReplayAdapter):
+            def send(self, request, **kw):
+                web.requests.append(request)
+                return super().send(request, **kw)
+
+        self.adapter = Adapter(self.corpus)
+
+    def serve(self, url, body="", status=200, headers=None, kind="page"):
+        r = requests.Response()
+        r.url, r.status_code = url, status
+        r.headers.update({"Content-Type": "text/html; charset=utf-8", **(headers or {})})
+        self.corpus.record(url, r, kind, body=body.encode("utf-8") if isinstance(body, str) else body)
+
+    def urls(self):
+        return [r.url for r in self.requests]
+
+
+@pytest.fixture
+def harvester(tmp_path, monkeypatch):
+    """marca_harvester con el estado en tmp_path y sin pausas de cortesía."""
+    monkeypatch.setenv("NOTICIERO_STATE_DIR", str(tmp_path / "estado"))
+    for var in ("NOTICIERO_SHARD_DIR", "NOTICIERO_REPORT", "NOTICIERO_HOST_DELAY", "NOTICIERO_DRY_RUN"):
+        monkeypatch.delenv(var, raising=False)
+    mh.configure({"host_delay_seconds": 0, "cnmv_delay_seconds": 0})
+    mh.POLITENESS.jitter = 0.0
+    monkeypatch.setattr(mh, "HTTP_CACHE", None)
+    mh.METRICS.reset()
+    yield mh
+    mh.configure({})
+
+
+@pytest.fixture
+def web(harvester, tmp_path, monkeypatch):
+    """Sin red: la sesión de marca_harvester responde desde un corpus (URL ausente = 404)."""
+    web = Web(str(tmp_path / "corpus.sqlite"))
+    session = requests.Session()
+    session.mount("https://", web.adapter)
+    session.mount("http://", web.adapter)
+    monkeypatch.setattr(harvester, "SESSION", session)
+    yield web
+    web.corpus.close()
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta, timezone
+
+
+def art(mh, k, title, content="", hours_ago=1, source="ABC", **extra):
+    published = (datetime.now(timezone.utc) - timedelta(hours=hours_ago)).isoformat()
+    return mh.Article(url=f"https://www.abc.es/{k}.html", title=title, source=source,
+                      published=published, content=content, **extra)
+
+
+def test_search_by_keyword_and_window(harvester, tmp_path):
+    archive = harvester.ArticleArchive(str(tmp_path / "archive.sqlite"))
+    archive.put(art(harvester, 1, "La energía sube", hours_ago=2))
+    archive.put(art(harvester, 2, "El Ibex cae", "y arrastra a las eléctricas de ENERGIA", hours_ago=1))
+    archive.put(art(harvester, 3, "Energía antigua", hours_ago=100))
+    archive.put(art(harvester, 4, "Fútbol", hours_ago=1))
+    now = datetime.now(timezone.utc)
+    got = archive.search(harvester.KeywordMatcher(["energia"]), now - timedelta(hours=24), now)
+    # sin tildes ni mayúsculas, dentro de la ventana y más recientes primero
+    assert [a.url for a in got] == ["https://www.abc.es/2.html", "https://www.abc.es/1.html"]
+    assert got[0]["keywords"] == ["energia"]
+    assert len(archive.search(None, now - timedelta(hours=24), now)) == 3
+    archive.close()
+
+
+def test_short_keywords_fall_back_to_a_scan(harvester, tmp_path):
+    archive = harvester.ArticleArchive(str(tmp_path / "archive.sqlite"))
+    archive.put(art(harvester, 1, "Resultados de BBVA y de IAG"))
+    archive.put(art(harvester, 2, "Resultados de Repsol"))
+    got = archive.search(harvester.KeywordMatcher(["iag"]))
+    assert [a.url for a in got] == ["https://www.abc.es/1.html"]
+    assert [a.url for a in archive.search(harvester.KeywordMatcher(["ia"]))] == ["https://www.abc.es/1.html"]
+    archive.close()
+
+
+def test_archive_survives_a_restart_and_forgets_old_articles(harvester, tmp_path, monkeypatch):
+    monkeypatch.setattr(harvester, "ARCHIVE_KEEP_DAYS", 2)
+    path = str(tmp_path / "archive.sqlite")
+    archive = harvester.ArticleArchive(path)
+    archive.put(art(harvester, 1, "Reciente", "cuerpo", fingerprint="00ff"))
+    archive.put(art(harvester, 2, "Antiguo", hours_ago=24 * 3))
+    assert archive.get("https://www.abc.es/1.html").content == "cuerpo"  # aún sin escribir
+    archive.close()
+    archive = harvester.ArticleArchive(path)
+    got = archive.get("https://www.abc.es/1.html")
+    assert (got.title, got.content, got.fingerprint) == ("Reciente", "cuerpo", "00ff")
+    assert "https://www.abc.es/2.html" not in archive
+    archive.close()
+
+
+def test_query_archive_collapses_duplicates(harvester):
+    archive = harvester.open_archive()
+    archive.put(art(harvester, 1, "Iberdrola invierte", "texto", canonical="https://www.abc.es/iberdrola.html"))
+    archive.put(art(harvester, 2, "Iberdrola invierte (EP)", "texto", source="EP",
+                    canonical="https://www.abc.es/iberdrola.html", hours_ago=2))
+    archive.put(art(harvester, 3, "Iberdrola y el Ibex", "otro texto", hours_ago=3))
+    archive.close()
+    got = harvester.query_archive(["iberdrola"], hours=24)
+    assert [a.url for a in got] == ["https://www.abc.es/1.html", "https://www.abc.es/3.html"]
+    assert got[0]["outlets"] == [{"source": "EP", "url": "https://www.abc.es/2.html"}]
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+URL = "https://www.abc.es/economia/"
+
+
+@pytest.fixture
+def deferred(harvester, monkeypatch):
+    """Pausas pedidas a POLITENESS.defer, sin dormir."""
+    calls = []
+    monkeypatch.setattr(harvester.POLITENESS, "defer", lambda url, seconds: calls.append(seconds))
+    return calls
+
+
+def test_retry_after_is_honoured_for_the_whole_host(harvester, web, deferred):
+    web.serve(URL, status=429, headers={"Retry-After": "2"})
+    with pytest.raises(requests.HTTPError):
+        harvester.http_get(URL)
+    # 1 intento + STATUS_RETRIES reintentos, cada uno tras la espera pedida
+    assert len(web.requests) == harvester.STATUS_RETRIES + 1
+    assert deferred == [2.0] * harvester.STATUS_RETRIES
+
+
+def test_long_retry_after_opens_the_breaker(harvester, web, deferred):
+    web.serve(URL, status=503, headers={"Retry-After": str(int(harvester.RETRY_AFTER_MAX) + 1)})
+    with pytest.raises(requests.HTTPError):
+        harvester.http_get(URL)
+    assert len(web.requests) == 1 and deferred == []
+    assert harvester.BREAKER.is_blocked("https://www.abc.es/otra.html")
+    with pytest.raises(harvester.HostBlocked):
+        harvester.http_get(URL)
+    assert len(web.requests) == 1  # ya no se toca la red
+
+
+def test_breaker_opens_after_consecutive_failures(harvester, web, deferred):
+    web.serve(URL, status=403)
+    for _ in range(harvester.BREAKER.threshold - 1):
+        with pytest.raises(requests.HTTPError):
+            harvester.http_get(URL)
+    assert not harvester.BREAKER.is_blocked(URL)
+    with pytest.raises(requests.HTTPError):
+        harvester.http_get(URL)
+    assert harvester.BREAKER.is_blocked(URL)
+    # otros hosts siguen abiertos
+    assert not harvester.BREAKER.is_blocked("https://www.marca.com/")
+
+
+def test_a_good_response_resets_the_count(harvester, web, deferred):
+    web.serve(URL, status=403)
+    for _ in range(harvester.BREAKER.threshold - 1):
+        with pytest.raises(requests.HTTPError):
+            harvester.http_get(URL)
+    web.serve(URL, "<html>ok</html>")
+    harvester.http_get(URL)
+    web.serve(URL, status=403)
+    with pytest.raises(requests.HTTPError):
+        harvester.http_get(URL)
+    assert not harvester.BREAKER.is_blocked(URL)
+
+
+def test_retry_after_as_http_date(harvester):
+    r = requests.Response()
+    r.headers["Retry-After"] = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    assert 25 <= harvester._retry_after_seconds(r) <= 30
+    r.headers["Retry-After"] = "mañana"
+    assert harvester._retry_after_seconds(r) is None
@@ -0,0 +1,85 @@
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+SITE = "https://www.abc.es/economia/"
+
+
+def test_scheduler_round_robins_sources(harvester):
+    pending = harvester.ArticleScheduler()
+    for src in "ABC":
+        for k in range(1, 3):
+            pending.push({"source": src, "url": f"{src}{k}"})
+    assert [pending.pop()["url"] for _ in range(6)] == ["A1", "B1", "C1", "A2", "B2", "C2"]
+
+
+def test_scheduler_prefers_valuable_items_and_sources(harvester):
+    pending = harvester.ArticleScheduler()
+    pending.push({"source": "A", "url": "A-poco"}, 0.2)
+    pending.push({"source": "A", "url": "A-mucho"}, 0.9)
+    assert pending.pop()["url"] == "A-mucho"  # dentro de la fuente, lo más valioso
+
+    pending = harvester.ArticleScheduler()
+    for k in range(8):
+        pending.push({"source": "A", "url": f"A{k}"}, 1.0)
+        pending.push({"source": "B", "url": f"B{k}"}, 0.25)
+    # entre fuentes, turnos en proporción al valor: 4 de A por cada uno de B
+    assert [pending.pop()["source"] for _ in range(10)].count("A") == 8
+
+
+def test_scheduler_drain(harvester):
+    pending = harvester.ArticleScheduler()
+    pending.push({"source": "A", "url": "A1"})
+    pending.push({"source": "B", "url": "B1"})
+    assert sorted(it["url"] for it in pending.drain()) == ["A1", "B1"] and len(pending) == 0
+
+
+@pytest.fixture
+def slow_site(harvester, web, monkeypatch):
+    """Un medio con un RSS de 20 artículos que tardan 0,2 s cada uno."""
+    monkeypatch.setattr(harvester, "PROFILES", harvester.SourceProfiles(":memory:"))
+    monkeypatch.setattr(harvester, "FEEDS", harvester.FeedDirectory(":memory:"))
+    monkeypatch.setattr(harvester, "WORKERS", 2)
+    now = datetime.now(timezone.utc)
+    items = "".join(
+        f"<item><title>Noticia {k}</title><link>{SITE}{k}.html</link>"
+        f"<pubDate>{format_datetime(now - timedelta(minutes=k))}</pubDate></item>"
+        for k in range(20)
+    )
+    web.serve(SITE + "rss.xml", f'<?xml version="1.0"?><rss><channel>{items}</channel></rss>',
+              headers={"Content-Type": "application/rss+xml"})
+    for k in range(20):
+        web.serve(f"{SITE}{k}.html",
+                  f'<html><head><meta property="article:published_time" content="{now.isoformat()}">'
+                  f"</head><body><h1>Noticia {k}</h1><p>Texto de la noticia {k}.</p></body></html>")
+    send = web.adapter.send
+
+    def slow(request, **kw):
+        if request.url.endswith(".html"):
+            time.sleep(0.2)
+        return send(request, **kw)
+
+    monkeypatch.setattr(web.adapter, "send", slow)
+    return harvester.compile_sources([{"name": "ABC", "url": SITE, "listing": SITE + "rss.xml"}])
+
+
+def test_budget_cuts_the_run_and_reports_what_was_skipped(harvester, web, slow_site, monkeypatch):
+    monkeypatch.setattr(harvester, "BUDGET_RESERVE", 0.4)
+    seen = harvester.load_state()
+    t0 = time.monotonic()
+    collected, skipped, _ = harvester.harvest(harvester.KeywordMatcher([]), seen, sources=slow_site, budget=1.5)
+    elapsed = time.monotonic() - t0
+    assert elapsed < 1.5
+    assert 0 < len(collected) < 20 and skipped == {"ABC": 20 - len(collected)}
+    # lo no descargado (o abandonado en vuelo) no se marca como visto: entra en la ejecución siguiente
+    assert len(seen) == len(collected)
+    harvester.save_state(seen)
+
+
+def test_without_budget_everything_is_fetched(harvester, web, slow_site):
+    seen = harvester.load_state()
+    collected, skipped, _ = harvester.harvest(harvester.KeywordMatcher([]), seen, sources=slow_site, budget=0)
+    assert len(collected) == 20 and not skipped
+    harvester.save_state(seen)
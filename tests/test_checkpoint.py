@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+
+import pytest
+
+SITE = "https://www.abc.es/economia/"
+
+
+@pytest.fixture
+def checkpoint(harvester):
+    cp = harvester.RunCheckpoint("2025-03-01")
+    yield cp
+    cp.close()
+
+
+def test_listing_is_reused_within_the_window(harvester, web, checkpoint, monkeypatch):
+    monkeypatch.setattr(harvester, "PROFILES", harvester.SourceProfiles(":memory:"))
+    monkeypatch.setattr(harvester, "FEEDS", harvester.FeedDirectory(":memory:"))
+    items = "".join(f"<item><title>Noticia {k}</title><link>{SITE}{k}.html</link></item>" for k in range(3))
+    web.serve(SITE + "rss.xml", f'<?xml version="1.0"?><rss><channel>{items}</channel></rss>',
+              headers={"Content-Type": "application/rss+xml"})
+    sources = harvester.compile_sources([{"name": "ABC", "url": SITE, "listing": SITE + "rss.xml"}])
+    first = list(harvester.iter_listings(sources, checkpoint))
+    n_requests = len(web.requests)
+    # la ejecución reanudada no vuelve a pedir el listing
+    again = list(harvester.iter_listings(sources, harvester.RunCheckpoint("2025-03-01")))
+    assert len(web.requests) == n_requests
+    assert [it.to_dict() for it in again] == [it.to_dict() for it in first] and len(first) == 3
+    assert harvester.RunCheckpoint("2025-03-02").listing("ABC") is None
+
+
+def test_each_profile_gets_one_digest_per_window(harvester, checkpoint, monkeypatch):
+    profiles = harvester.load_profiles({"profiles": [
+        {"name": "bolsa", "to_emails": ["bolsa@example.com"]},
+        {"name": "deportes", "to_emails": ["deportes@example.com"]},
+    ]})
+    art = harvester.Article(url=f"{SITE}1.html", title="Noticia", source="ABC",
+                            published=datetime.now(timezone.utc).isoformat(), content="")
+    sent, broken = [], {"deportes"}
+
+    def send_digest_html(mailer, arts, subject, to_emails=None, tzname="", extra_html="", tag=""):
+        name = to_emails[0].split("@")[0]
+        if name in broken:
+            raise RuntimeError("SMTP caído")
+        sent.append(name)
+
+    monkeypatch.setattr(harvester, "send_digest_html", send_digest_html)
+    assert harvester.send_digests(profiles, [art], cnmv={}, checkpoint=checkpoint)[1] == ["deportes"]
+    broken.clear()
+    # reanudada: sólo el perfil que falló
+    harvester.send_digests(profiles, [art], cnmv={}, checkpoint=harvester.RunCheckpoint("2025-03-01"))
+    harvester.send_digests(profiles, [art], cnmv={}, checkpoint=harvester.RunCheckpoint("2025-03-01"))
+    assert sent == ["bolsa", "deportes"]
+    assert checkpoint.was_sent("bolsa") and checkpoint.was_sent("deportes")
+    assert not harvester.RunCheckpoint("2025-03-02").was_sent("bolsa")
+
+
+def test_pending_digest_round_trip(harvester, tmp_path):
+    path = str(tmp_path / "resumen_pendiente.json")
+    arts = [harvester.Article(url=f"{SITE}{k}.html", title=f"Noticia {k}", source="ABC",
+                              published="2025-03-01T10:00:00+01:00", content=f"cuerpo {k}").spill()
+            for k in range(3)]
+    harvester.save_digest(arts, path)
+    back = harvester.load_digest(path)
+    assert [(a.url, a.content) for a in back] == [(a.url, a.content) for a in arts]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[{")  # cortado a medio escribir
+    assert harvester.load_digest(path) == []
+    assert harvester.load_digest(str(tmp_path / "no_existe.json")) == []
+
+
+def test_save_progress_persists_state_and_digest(harvester, checkpoint):
+    seen = harvester.load_state()
+    seen.record(f"{SITE}1.html", "accepted")
+    art = harvester.Article(url=f"{SITE}1.html", title="Noticia", published="2025-03-01T10:00:00+01:00")
+    checkpoint.save_progress([art], seen)
+    # lo que vería una ejecución nueva si esta muere aquí
+    assert [a.url for a in harvester.load_digest()] == [f"{SITE}1.html"]
+    assert harvester.SeenStore(harvester.STATE_FILE).outcome(f"{SITE}1.html") == "accepted"
+    seen.close()
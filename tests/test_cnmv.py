@@ -0,0 +1,92 @@
+import marca_harvester as mh
+
+
+def block(rows, nif="A-28294726", **extra):
+    return dict({"nif": nif, "issuer": "ENAGAS", "url": "https://cnmv/x", "body_hash": "h",
+                 "rows": [{"holder": h, "net_short_pct": p, "date": d} for h, p, d in rows]}, **extra)
+
+
+def test_first_query_is_baseline(tmp_path):
+    history = mh.CnmvHistory(str(tmp_path / "cnmv.sqlite"))
+    out = history.update(block([("Fondo A", 0.8, "2025-03-01")]))
+    assert out["first"] is True
+    assert out["new"] == [] and out["changed"] == [] and out["dropped"] == []
+    assert mh.cnmv_has_changes(out)  # la línea base se muestra entera
+    history.close()
+
+
+def test_new_changed_and_dropped(tmp_path):
+    history = mh.CnmvHistory(str(tmp_path / "cnmv.sqlite"))
+    history.update(block([("Fondo A", 0.8, "2025-03-01"), ("Fondo B", 1.1, "2025-03-01"),
+                          ("Fondo C", 0.55, "2025-03-01")]))
+    out = history.update(block([("Fondo A", 0.8, "2025-03-02"), ("Fondo B", 1.25, "2025-03-02"),
+                                ("Fondo D", 0.61, "2025-03-02")]))
+    assert out["first"] is False
+    assert [r["holder"] for r in out["new"]] == ["Fondo D"]
+    assert [(r["holder"], r["net_short_pct"], r["prev_pct"]) for r in out["changed"]] == [("Fondo B", 1.25, 1.1)]
+    assert [(r["holder"], r["net_short_pct"]) for r in out["dropped"]] == [("Fondo C", 0.55)]
+    assert mh.cnmv_has_changes(out)
+
+    # la misma tabla otra vez: sin cambios
+    again = history.update(block([("Fondo A", 0.8, "2025-03-02"), ("Fondo B", 1.25, "2025-03-02"),
+                                  ("Fondo D", 0.61, "2025-03-02")]))
+    assert not mh.cnmv_has_changes(again)
+    history.close()
+
+
+def test_rounding_below_three_decimals_is_not_a_change(tmp_path):
+    history = mh.CnmvHistory(str(tmp_path / "cnmv.sqlite"))
+    history.update(block([("Fondo A", 0.8, "2025-03-01")]))
+    out = history.update(block([("Fondo A", 0.80001, "2025-03-01")]))
+    assert out["changed"] == []
+    history.close()
+
+
+def test_unchanged_page_keeps_history(tmp_path):
+    history = mh.CnmvHistory(str(tmp_path / "cnmv.sqlite"))
+    history.update(block([("Fondo A", 0.8, "2025-03-01"), ("Fondo B", 1.1, "2025-03-01")]))
+    assert history.body_hash("A-28294726") == "h"
+    out = history.update({"nif": "A-28294726", "url": "https://cnmv/x", "body_hash": "h", "unchanged": True})
+    assert out["issuer"] == "ENAGAS"
+    assert {r["holder"] for r in out["rows"]} == {"Fondo A", "Fondo B"}
+    assert not mh.cnmv_has_changes(out)
+    history.close()
+
+
+def cnmv_page(rows):
+    trs = "".join(f"<tr><td>{h}</td><td>{p}</td><td>{d}</td></tr>" for h, p, d in rows)
+    return ("<html><body><h1>Posiciones cortas</h1><h2>ENAGAS, S.A.</h2><table>"
+            f"<tr><th>Notificaciones vivas iguales o superiores al 0,5%</th></tr>{trs}</table></body></html>")
+
+
+def cnmv_url(nif):
+    return f"{mh.CNMV_BASE_URL}?nif={nif}&lang=es"
+
+
+def test_fetch_tracks_changes_between_runs(web):
+    nif = "A-28294726"
+    web.serve(cnmv_url(nif), cnmv_page([("Fondo A", "0,80", "01/03/2025"), ("Fondo B", "1,10", "01/03/2025")]))
+    first = mh.fetch_cnmv_blocks([nif])[nif]
+    assert first["first"] and {r["holder"] for r in first["rows"]} == {"Fondo A", "Fondo B"}
+
+    # misma página: no se vuelve a parsear y no hay cambios
+    same = mh.fetch_cnmv_blocks([nif])[nif]
+    assert same.get("unchanged") and not mh.cnmv_has_changes(same)
+
+    web.serve(cnmv_url(nif), cnmv_page([("Fondo A", "0,80", "01/03/2025"), ("Fondo C", "0,61", "02/03/2025")]))
+    changed = mh.fetch_cnmv_blocks([nif])[nif]
+    assert [r["holder"] for r in changed["new"]] == ["Fondo C"]
+    assert [r["holder"] for r in changed["dropped"]] == ["Fondo B"]
+
+
+def test_page_without_table_is_a_failed_fetch(web):
+    nif = "A-28294726"
+    web.serve(cnmv_url(nif), cnmv_page([("Fondo A", "0,80", "01/03/2025")]))
+    mh.fetch_cnmv_blocks([nif])
+    web.serve(cnmv_url(nif), "<html><body><h1>Servicio en mantenimiento</h1></body></html>")
+    assert mh.get_cnmv_short_positions(nif) is None
+    assert mh.fetch_cnmv_blocks([nif]) == {}
+    # el histórico sigue intacto: al volver la tabla no hay altas ni bajas espurias
+    web.serve(cnmv_url(nif), cnmv_page([("Fondo A", "0,80", "01/03/2025")]))
+    back = mh.fetch_cnmv_blocks([nif])[nif]
+    assert back["new"] == [] and back["dropped"] == [] and not back["first"]
@@ -0,0 +1,51 @@
+import json
+import os
+
+CONFIG = """
+hours_recent: 12
+sources:
+  - name: ABC
+    url: https://www.abc.es/economia/
+  - name: sin_url
+"""
+
+
+def write_config(tmp_path, text=CONFIG):
+    path = tmp_path / "config.yaml"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_compiled_config_is_cached_as_json(harvester, tmp_path, monkeypatch):
+    path, cache = write_config(tmp_path), str(tmp_path / "cache" / "config.yaml.json")
+    cfg, sources = harvester.load_compiled_config(path, cache)
+    assert cfg["hours_recent"] == 12 and [s["name"] for s in sources] == ["ABC"]
+    with open(cache, encoding="utf-8") as f:
+        assert json.load(f)["sources"] == sources
+
+    # vigente: no se vuelve a parsear el YAML
+    def no_yaml(*a, **kw):
+        raise AssertionError("config.yaml parseado con la caché vigente")
+    monkeypatch.setattr(harvester.yaml, "load", no_yaml)
+    assert harvester.load_compiled_config(path, cache) == (cfg, sources)
+
+
+def test_compiled_config_follows_changes(harvester, tmp_path):
+    path, cache = write_config(tmp_path), str(tmp_path / "config.yaml.json")
+    harvester.load_compiled_config(path, cache)
+    write_config(tmp_path, CONFIG.replace("12", "6"))
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert harvester.load_compiled_config(path, cache)[0]["hours_recent"] == 6
+
+
+def test_values_without_json_are_not_cached(harvester, tmp_path):
+    path = write_config(tmp_path, CONFIG + "inicio: 2025-03-01\n")
+    cache = str(tmp_path / "config.yaml.json")
+    cfg, _ = harvester.load_compiled_config(path, cache)
+    assert str(cfg["inicio"]) == "2025-03-01"
+    assert not os.path.exists(cache)
+
+
+def test_missing_config(harvester, tmp_path):
+    assert harvester.load_compiled_config(str(tmp_path / "no.yaml"), str(tmp_path / "c.json")) == ({}, [])
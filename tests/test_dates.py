@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2025-03-01T10:20:00Z", datetime(2025, 3, 1, 10, 20, tzinfo=timezone.utc)),
+    ("2025-03-01T10:20:00+01:00", datetime(2025, 3, 1, 10, 20, tzinfo=timezone(timedelta(hours=1)))),
+    ("2025-03-01", datetime(2025, 3, 1)),
+    ("01/03/2025", datetime(2025, 3, 1)),  # dd/mm/aaaa, no mm/dd
+    ("Sat, 01 Mar 2025 10:20:00 +0000", datetime(2025, 3, 1, 10, 20, tzinfo=timezone.utc)),
+    ("  2025-03-01T10:20:00z ", datetime(2025, 3, 1, 10, 20, tzinfo=timezone.utc)),
+    ("March 1, 2025 10:20", datetime(2025, 3, 1, 10, 20)),  # sólo dateutil
+])
+def test_parse_datetime(harvester, text, expected):
+    assert harvester.parse_datetime(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", None, "31/02/2025", "no es una fecha"])
+def test_parse_datetime_invalid(harvester, text):
+    assert harvester.parse_datetime(text) is None
+
+
+def test_normalize_datetime_to_local_zone(harvester):
+    # sin zona se toma como UTC; en marzo Madrid es UTC+1
+    dt = harvester.normalize_datetime("2025-03-01T10:20:00")
+    assert dt.utcoffset() == timedelta(hours=1) and (dt.hour, dt.minute) == (11, 20)
+    assert dt.tzinfo is harvester.get_tz("Europe/Madrid")
+    assert harvester.normalize_datetime("nada") is None
+
+
+def test_is_recent(harvester):
+    now = datetime.now(timezone.utc)
+    assert harvester.is_recent(now - timedelta(hours=2), hours=3)
+    assert not harvester.is_recent(now - timedelta(hours=4), hours=3)
+    assert harvester.is_recent((now - timedelta(hours=2)).isoformat(), hours=3)
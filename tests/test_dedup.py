@@ -0,0 +1,79 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://WWW.Marca.com/a/b.html?utm_source=x&id=3#top", "https://www.marca.com/a/b.html?id=3"),
+    ("https://amp.elpais.com/economia/x.html", "https://www.elpais.com/economia/x.html"),
+    ("https://m.abc.es/economia/x.html?fbclid=1", "https://www.abc.es/economia/x.html"),
+    ("https://www.abc.es/economia/x_amp.html", "https://www.abc.es/economia/x.html"),
+    ("https://www.abc.es/economia/x/amp/", "https://www.abc.es/economia/x/"),
+    ("https://www.abc.es:443/x.html", "https://www.abc.es/x.html"),
+    ("https://www.abc.es:8080/x.html", "https://www.abc.es:8080/x.html"),
+    ("mailto:a@b.es", "mailto:a@b.es"),
+])
+def test_canonical_url(harvester, url, expected):
+    assert harvester.canonical_url(url) == expected
+
+
+def _text(seed, n=120):
+    rnd = random.Random(seed)
+    return " ".join(f"palabra{rnd.randrange(2000)}" for _ in range(n))
+
+
+def test_simhash_near_duplicates(harvester):
+    body = _text(1)
+    edited = body.replace(body.split()[50], "cambiada", 1)
+    fp, fp_edited, fp_other = harvester.simhash(body), harvester.simhash(edited), harvester.simhash(_text(2))
+    assert len(fp) == 16
+    assert harvester.near_duplicate(fp_edited, {"a": fp}) == "a"
+    assert harvester.near_duplicate(fp_other, {"a": fp}) is None
+    assert harvester.simhash("muy poco texto") is None
+    # mayúsculas y tildes no cuentan
+    assert harvester.simhash(body.upper()) == fp
+
+
+def test_simhash_only_reads_the_start_of_the_body(harvester):
+    body = _text(1, harvester.SIMHASH_MAX_WORDS)
+    assert harvester.simhash(body + " " + _text(3, 500)) == harvester.simhash(body)
+
+
+def test_listing_dedup_keeps_the_listing_url(harvester):
+    items = [
+        {"url": "https://m.cincodias.elpais.com/a.html?utm_source=tw"},
+        {"url": "https://www.cincodias.elpais.com/a.html"},
+        {"url": "https://m.cincodias.elpais.com/b.html"},
+    ]
+    got = harvester.dedup_items(items, 10)
+    assert [it["url"] for it in got] == ["https://m.cincodias.elpais.com/a.html?utm_source=tw",
+                                         "https://m.cincodias.elpais.com/b.html"]
+
+
+def test_seen_store_keys_by_canonical_url(harvester, tmp_path):
+    path = str(tmp_path / "state.sqlite")
+    store = harvester.SeenStore(path)
+    store.record("https://m.abc.es/x.html?utm_source=tw", "accepted")
+    store.close()
+    store = harvester.SeenStore(path)
+    assert "https://www.abc.es/x.html" in store
+    assert store.outcome("https://m.abc.es/x.html") == "accepted"
+    store.close()
+
+
+ARTICLE = """<html><head>
+<link rel="canonical" href="https://cincodias.elpais.com/mercados/x.html">
+<script type="application/ld+json">{{"@type": "NewsArticle", "headline": "Titular",
+ "datePublished": "{published}", "articleBody": "{body}"}}</script>
+</head><body><h1>Titular</h1></body></html>"""
+
+
+def test_article_is_fetched_as_listed(harvester, web):
+    url = "https://m.cincodias.elpais.com/mercados/x.html"
+    web.serve(url, ARTICLE.format(published=datetime.now(timezone.utc).isoformat(), body=_text(1)))
+    art = harvester.extract_article(url, hours=24)
+    assert web.urls() == [url]
+    assert art.url == url
+    # la clave de duplicados es la que declara la página
+    assert art.canonical == "https://cincodias.elpais.com/mercados/x.html"
@@ -0,0 +1,61 @@
+import gzip
+
+
+class FakeMailer:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, html_content, subject, to_emails=None, tag="", attachments=()):
+        self.sent.append((subject, html_content, list(attachments)))
+
+
+def _article(mh, k, size):
+    return mh.Article(url=f"https://www.abc.es/{k}.html", title=f"Titular {k}", source="ABC",
+                      published="2025-03-01T10:00:00+01:00", content="x" * size)
+
+
+def test_digest_parts_respects_max_bytes(harvester):
+    arts = [_article(harvester, k, 3000) for k in range(10)]
+    max_bytes = 12 * 1024
+    parts = harvester.digest_parts(arts, max_bytes=max_bytes, excerpt_chars=0)
+    assert len(parts) > 1
+    assert [a for part in parts for a in part] == arts  # en orden y sin perder ninguno
+    for k, part in enumerate(parts, 1):
+        html = harvester.build_html_multi(part)
+        assert len(html.replace("Noticias de hoy", f"Noticias de hoy ({k}/{len(parts)})").encode()) <= max_bytes
+
+
+def test_digest_parts_oversized_article_goes_alone(harvester):
+    arts = [_article(harvester, 0, 100), _article(harvester, 1, 50000), _article(harvester, 2, 100)]
+    parts = harvester.digest_parts(arts, max_bytes=8 * 1024, excerpt_chars=0)
+    assert [len(p) for p in parts] == [1, 1, 1]
+
+
+def test_digest_parts_everything_fits(harvester):
+    arts = [_article(harvester, k, 200) for k in range(5)]
+    assert harvester.digest_parts(arts, max_bytes=1024 * 1024, excerpt_chars=0) == [arts]
+    assert harvester.digest_parts([], max_bytes=1024) == [[]]
+
+
+def test_oversized_digest_is_split_into_numbered_mails(harvester, monkeypatch):
+    monkeypatch.setattr(harvester, "DIGEST_MAX_BYTES", 12 * 1024)
+    monkeypatch.setattr(harvester, "DIGEST_OVERFLOW", "split")
+    arts = [_article(harvester, k, 3000) for k in range(10)]
+    mailer = FakeMailer()
+    total = harvester.send_digest_html(mailer, arts, "Noticias")
+    assert total > 1 and [s for s, _, _ in mailer.sent] == [f"Noticias ({k}/{total})" for k in range(1, total + 1)]
+    for k in range(10):
+        assert sum(f"Titular {k}<" in html for _, html, _ in mailer.sent) == 1
+
+
+def test_oversized_digest_as_attachment(harvester, monkeypatch):
+    monkeypatch.setattr(harvester, "DIGEST_MAX_BYTES", 12 * 1024)
+    monkeypatch.setattr(harvester, "DIGEST_OVERFLOW", "attachment")
+    arts = [_article(harvester, k, 3000) for k in range(10)]
+    mailer = FakeMailer()
+    assert harvester.send_digest_html(mailer, arts, "Noticias") == 1
+    ((subject, body, attachments),) = mailer.sent
+    assert len(body.encode()) <= 12 * 1024 and "el resumen completo va adjunto" in body
+    ((name, data, _, _),) = attachments
+    full = gzip.decompress(data).decode("utf-8")
+    assert name == "resumen.html.gz" and all(f"Titular {k}<" in full for k in range(10))
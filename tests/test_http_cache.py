@@ -0,0 +1,58 @@
+import pytest
+import requests
+
+URL = "https://www.abc.es/economia/"
+
+
+@pytest.fixture
+def cache(harvester, web, tmp_path, monkeypatch):
+    cache = harvester.HttpCache(str(tmp_path / "http_cache.sqlite"), max_bytes=1024 * 1024)
+    monkeypatch.setattr(harvester, "HTTP_CACHE", cache)
+    yield cache
+    cache.close()
+
+
+def test_fresh_copy_is_served_without_network(harvester, web, cache):
+    web.serve(URL, "<html>portada</html>")
+    assert harvester.http_get(URL, cache_ttl=600).text == "<html>portada</html>"
+    r = harvester.http_get(URL, cache_ttl=600)
+    assert r.text == "<html>portada</html>" and r.from_cache
+    assert len(web.requests) == 1 and cache.stats == {"hits": 1, "revalidations": 0, "misses": 1}
+
+
+def test_stale_copy_is_revalidated_with_a_conditional_get(harvester, web, cache):
+    web.serve(URL, "<html>portada</html>", headers={"ETag": '"v1"', "Last-Modified": "Sat, 01 Mar 2025 10:00:00 GMT"})
+    harvester.http_get(URL, cache_ttl=0)
+    web.serve(URL, "", status=304)
+    r = harvester.http_get(URL, cache_ttl=0)
+    sent = web.requests[-1].headers
+    assert sent["If-None-Match"] == '"v1"' and sent["If-Modified-Since"] == "Sat, 01 Mar 2025 10:00:00 GMT"
+    assert r.status_code == 200 and r.text == "<html>portada</html>"
+    assert cache.stats["revalidations"] == 1
+
+
+def test_changed_page_replaces_the_copy(harvester, web, cache):
+    web.serve(URL, "<html>v1</html>", headers={"ETag": '"v1"'})
+    harvester.http_get(URL, cache_ttl=0)
+    web.serve(URL, "<html>v2</html>", headers={"ETag": '"v2"'})
+    assert harvester.http_get(URL, cache_ttl=0).text == "<html>v2</html>"
+    assert cache.get(URL)["etag"] == '"v2"'
+
+
+def test_articles_bypass_the_cache(harvester, web, cache):
+    web.serve(URL, "<html>artículo</html>", headers={"ETag": '"v1"'})
+    harvester.http_get(URL)
+    assert cache.get(URL) is None
+
+
+def test_least_recently_used_entries_are_evicted(harvester, tmp_path):
+    cache = harvester.HttpCache(str(tmp_path / "lru.sqlite"), max_bytes=2500)
+    for k in range(3):
+        r = requests.Response()
+        r._content, r.status_code = b"x" * 1000, 200
+        cache.put(f"https://www.abc.es/{k}", r)
+        if k == 1:
+            cache.touch("https://www.abc.es/0")  # la 0 se usa: la víctima es la 1
+    assert cache.get("https://www.abc.es/1") is None
+    assert cache.get("https://www.abc.es/0") and cache.get("https://www.abc.es/2")
+    cache.close()
@@ -0,0 +1,72 @@
+import random
+import unicodedata
+
+import marca_harvester as mh
+
+
+def legacy_norm(s):
+    """norm() tal y como estaba antes de la caché y la tabla de traducción."""
+    if not s:
+        return ""
+    s = unicodedata.normalize("NFKD", s)
+    return "".join(c for c in s if not unicodedata.combining(c)).lower()
+
+
+def legacy_any(keywords, text):
+    """El filtro anterior: any(k in norm(texto) for k in keywords)."""
+    kw_list = [legacy_norm(k) for k in keywords if k]
+    return any(k in legacy_norm(text) for k in kw_list)
+
+
+KEYWORDS = ["Enagás", "enagas", "gas", "Ibex 35", "IBEX", "Telefónica", "BBVA", "Ñ", "acción", "ACCIONES", "35"]
+VOCAB = [
+    "Enagás", "ENAGAS", "enagas", "gasoducto", "Gas", "Ibex", "IBEX 35", "ibex35", "Telefonica",
+    "TELEFÓNICA", "bbva", "Bbva", "España", "ESPAÑA", "acción", "acciones", "Acción", "ño", "35",
+    "3 5", "cotización", "São", "Zürich", "ﬁnanzas", "ⅠⅤ", "café", "café", "niño", "  ", "-",
+]
+
+
+def random_texts(n, seed=7):
+    rnd = random.Random(seed)
+    for _ in range(n):
+        yield " ".join(rnd.choice(VOCAB) for _ in range(rnd.randrange(0, 12)))
+
+
+def test_norm_matches_legacy():
+    for text in list(random_texts(300)) + VOCAB + ["x" * 600 + "Á"]:
+        assert mh.norm(text) == legacy_norm(text)
+
+
+def test_search_matches_legacy_any():
+    rnd = random.Random(11)
+    for text in random_texts(500):
+        keywords = rnd.sample(KEYWORDS, rnd.randrange(1, 5))
+        matcher = mh.KeywordMatcher(keywords)
+        assert matcher.search(text) == legacy_any(keywords, text), (keywords, text)
+
+
+def test_matches_reports_every_contained_keyword():
+    rnd = random.Random(13)
+    for text in random_texts(500):
+        keywords = rnd.sample(KEYWORDS, rnd.randrange(1, 6))
+        found = mh.KeywordMatcher(keywords).matches(text)
+        t = legacy_norm(text)
+        assert set(found) == {legacy_norm(k) for k in keywords if legacy_norm(k) in t}, (keywords, text)
+        assert list(found) == sorted(found, key=t.find)
+        assert all(found[k] == t.find(k) for k in found)
+
+
+def test_overlapping_keywords():
+    # "gas" está dentro de "enagas": casa aunque la regex elija la más larga
+    matcher = mh.KeywordMatcher(["gas", "Enagás"])
+    assert set(matcher.matches("Resultados de ENAGÁS")) == {"gas", "enagas"}
+    assert matcher.search("Resultados de ENAGÁS")
+
+
+def test_empty_keywords():
+    for keywords in ([], None, "", [""], [None]):
+        matcher = mh.KeywordMatcher(keywords)
+        assert not matcher
+        assert not matcher.search("cualquier texto")
+        assert matcher.matches("cualquier texto") == {}
+    assert not mh.KeywordMatcher(["gas"]).search("")
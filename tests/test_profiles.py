@@ -0,0 +1,113 @@
+import smtplib
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+class FakeSMTP:
+    """smtplib.SMTP_SSL sin red: anota conexiones y mensajes; rechaza los destinatarios de `refused`."""
+    connections = []
+    refused = set()
+
+    def __init__(self, host, port, context=None):
+        self.logins, self.sent, self.closed = 0, [], False
+        FakeSMTP.connections.append(self)
+
+    def login(self, user, password):
+        self.logins += 1
+
+    def send_message(self, msg):
+        if msg["To"] in FakeSMTP.refused:
+            raise smtplib.SMTPRecipientsRefused({msg["To"]: (550, b"no such user")})
+        self.sent.append(msg)
+
+    def quit(self):
+        self.closed = True
+
+
+@pytest.fixture
+def smtp(harvester, monkeypatch):
+    monkeypatch.setattr(harvester, "SMTP_PASS", "secreto")
+    monkeypatch.setattr(smtplib, "SMTP_SSL", FakeSMTP)
+    FakeSMTP.connections, FakeSMTP.refused = [], set()
+    return FakeSMTP
+
+
+def article(mh, url, keywords, hours_ago=1):
+    published = (datetime.now(timezone.utc) - timedelta(hours=hours_ago)).isoformat()
+    return mh.Article(url=url, title=url.rsplit("/", 1)[-1], source="ABC", published=published,
+                      content="texto", keywords=keywords)
+
+
+def two_profiles(mh):
+    return mh.load_profiles({
+        "to_emails": ["todos@example.com"],
+        "hours_recent": 24,
+        "profiles": [
+            {"name": "bolsa", "keywords": ["ibex", "cnmv"], "to_emails": ["bolsa@example.com"]},
+            {"name": "deportes", "keywords": "marca", "hours_recent": 6},
+        ],
+    })
+
+
+def test_load_profiles_inherits_defaults(harvester):
+    bolsa, deportes = two_profiles(harvester)
+    assert (bolsa["name"], bolsa["keywords"], bolsa["to_emails"], bolsa["hours"]) == (
+        "bolsa", ["ibex", "cnmv"], ["bolsa@example.com"], 24.0)
+    assert (deportes["keywords"], deportes["to_emails"], deportes["hours"]) == (
+        ["marca"], ["todos@example.com"], 6.0)
+
+
+def test_load_profiles_without_profiles_is_one_profile(harvester):
+    (p,) = harvester.load_profiles({"keywords": ["ibex"]})
+    assert p["name"] == "principal" and p["keywords"] == ["ibex"]
+
+
+def test_profile_articles_filters_by_keywords_and_window(harvester):
+    bolsa, deportes = two_profiles(harvester)
+    arts = [
+        article(harvester, "https://a.es/1", ["ibex", "marca"]),
+        article(harvester, "https://a.es/2", ["marca"], hours_ago=12),
+        article(harvester, "https://a.es/3", ["cnmv"], hours_ago=30),
+    ]
+    got = harvester.profile_articles(bolsa, arts)
+    assert [(a.url, a.keywords) for a in got] == [("https://a.es/1", ["ibex"])]
+    # "deportes" sólo mira 6 horas atrás
+    assert [a.url for a in harvester.profile_articles(deportes, arts)] == ["https://a.es/1"]
+
+
+def test_send_digests_uses_one_connection(harvester, smtp):
+    profiles = two_profiles(harvester)
+    arts = [article(harvester, "https://a.es/1", ["ibex"]), article(harvester, "https://a.es/2", ["marca"])]
+    sent, failed = harvester.send_digests(profiles, arts, cnmv={})
+    assert sent == {"bolsa": (1, 0), "deportes": (1, 0)} and failed == []
+    (conn,) = smtp.connections
+    assert conn.logins == 1 and conn.closed
+    assert [m["To"] for m in conn.sent] == ["bolsa@example.com", "todos@example.com"]
+
+
+def test_failed_profile_keeps_its_articles_pending(harvester, smtp):
+    profiles = two_profiles(harvester)
+    arts = [article(harvester, "https://a.es/1", ["ibex"]), article(harvester, "https://a.es/2", ["marca"])]
+    smtp.refused = {"bolsa@example.com"}
+    sent, failed = harvester.send_digests(profiles, arts, cnmv={})
+    assert failed == ["bolsa"]
+    assert [m["To"] for m in smtp.connections[0].sent] == ["todos@example.com"]
+    delivered, pending = harvester.split_delivered(profiles, arts, failed)
+    assert [a.url for a in delivered] == ["https://a.es/2"]
+    assert [a.url for a in pending] == ["https://a.es/1"]
+
+
+def test_mailer_reconnects_once_after_disconnect(harvester, smtp, monkeypatch):
+    calls = []
+
+    def flaky(self, msg):
+        calls.append(self)
+        if len(calls) == 1:
+            raise smtplib.SMTPServerDisconnected("idle timeout")
+        self.sent.append(msg)
+
+    monkeypatch.setattr(FakeSMTP, "send_message", flaky)
+    with harvester.Mailer() as mailer:
+        mailer.send("<p>hola</p>", "asunto", ["a@example.com"])
+    assert len(smtp.connections) == 2 and len(smtp.connections[1].sent) == 1
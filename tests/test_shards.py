@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.mark.parametrize("argv, env, expected", [
+    (["--shard", "1/3"], None, (1, 3)),
+    (["--shard=0/2"], None, (0, 2)),
+    ([], " 2 / 4 ", (2, 4)),
+    (["--shard", "0/2"], "1/2", (0, 2)),  # la línea de órdenes manda
+    ([], None, None),
+])
+def test_parse_shard(harvester, argv, env, expected):
+    assert harvester._parse_shard(argv, env) == expected
+
+
+@pytest.mark.parametrize("spec", ["3/3", "1/0", "uno/dos", "-1/2"])
+def test_parse_shard_invalid(harvester, spec):
+    with pytest.raises(ValueError):
+        harvester._parse_shard(["--shard", spec])
+
+
+def test_every_source_goes_to_exactly_one_shard(harvester):
+    sources = harvester.compile_sources(
+        [{"name": f"M{k}", "url": f"https://www.medio{k}.es/"} for k in range(12)]
+        + [{"name": "M0-bolsa", "url": "https://medio0.es/bolsa/"}]
+    )
+    shards = [harvester.shard_sources((i, 3), sources) for i in range(3)]
+    names = sorted(src["name"] for shard in shards for src in shard)
+    assert names == sorted(src["name"] for src in sources)
+    # mismo host (con o sin www.), mismo shard: la cortesía por host sigue valiendo
+    (owner,) = [shard for shard in shards if any(src["name"] == "M0" for src in shard)]
+    assert any(src["name"] == "M0-bolsa" for src in owner)
+
+
+def test_receipts_cover_duplicates_and_expire(harvester):
+    art = harvester.Article(url="https://www.abc.es/1.html", canonical="https://www.abc.es/uno.html",
+                            outlets=[{"source": "EP", "url": "https://www.europapress.es/1.html"}])
+    os.makedirs(os.path.dirname(harvester.SHARD_RECEIPTS_FILE), exist_ok=True)
+    with open(harvester.SHARD_RECEIPTS_FILE, "w", encoding="utf-8") as f:
+        json.dump({"https://www.abc.es/viejo.html": 0.0}, f)  # enviado hace mucho
+    harvester.record_shard_receipts([art])
+    assert set(harvester.load_shard_receipts()) == {
+        "https://www.abc.es/1.html", "https://www.abc.es/uno.html", "https://www.europapress.es/1.html"}
+
+
+def test_merge_collapses_duplicates_across_shards(harvester):
+    def art(url, title, source, **extra):
+        return harvester.Article(url=url, title=title, source=source, **extra)
+
+    arts = [
+        art("https://www.abc.es/1.html", "Iberdrola invierte en renovables este año", "ABC", keywords=["iberdrola"]),
+        art("https://m.abc.es/1.html?utm_source=tw", "Otro titular", "ABC-móvil"),
+        art("https://www.ep.es/2.html", "Iberdrola invierte en renovables este año", "EP", keywords=["renovables"]),
+        art("https://www.efe.es/3.html", "Titular distinto", "EFE", fingerprint="00000000000000ff"),
+        art("https://www.ep.es/4.html", "Y otro más", "EP", fingerprint="00000000000000fe"),
+    ]
+    kept = harvester.merge_articles(arts)
+    assert [a.url for a in kept] == ["https://www.abc.es/1.html", "https://www.efe.es/3.html"]
+    assert kept[0]["outlets"] == [{"source": "ABC-móvil", "url": "https://m.abc.es/1.html?utm_source=tw"},
+                                  {"source": "EP", "url": "https://www.ep.es/2.html"}]
+    assert kept[0]["keywords"] == ["iberdrola", "renovables"]
+    assert kept[1]["outlets"] == [{"source": "EP", "url": "https://www.ep.es/4.html"}]
+
+
+def test_load_shard_results(harvester, tmp_path):
+    shard_dir = str(tmp_path / "shards")
+    for i in range(2):
+        partial, done = harvester.shard_paths((i, 3), shard_dir)
+        harvester.save_digest([harvester.Article(url=f"https://www.abc.es/{i}.html", title=str(i))], partial)
+        if i == 0:
+            with open(done, "w", encoding="utf-8") as f:
+                json.dump({"skipped": {"ABC": 4}}, f)
+    arts, skipped, files = harvester.load_shard_results(shard_dir)
+    assert [a.url for a in arts] == ["https://www.abc.es/0.html", "https://www.abc.es/1.html"]
+    assert skipped == {"ABC": 4} and len(files) == 3
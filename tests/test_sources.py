@@ -0,0 +1,57 @@
+import sqlite3
+import time
+
+import pytest
+
+
+@pytest.fixture
+def profiles(harvester, tmp_path, monkeypatch):
+    """SourceProfiles en un fichero temporal; `profiles.day` fija la fecha de hoy."""
+    real = time.strftime
+
+    def strftime(fmt, *args):
+        return profiles.day if fmt == "%Y-%m-%d" and not args else real(fmt, *args)
+
+    monkeypatch.setattr(harvester.time, "strftime", strftime)
+    profiles = harvester.SourceProfiles(str(tmp_path / "sources.sqlite"))
+    profiles.day = "2025-03-01"
+    profiles.record_listing("ABC", "feed", 20, 0.1, False)
+    return profiles
+
+
+def test_many_empty_polls_in_a_day_count_once(harvester, profiles):
+    for _ in range(3 * harvester.SKIP_AFTER_EMPTY):
+        profiles.record_articles("ABC", fetched=4, in_window=0, accepted=0)
+    assert profiles.get("ABC")["empty_runs"] == 1
+    assert profiles.skip_reason("ABC") is None
+
+
+def test_empty_days_park_the_source(harvester, profiles):
+    for day in range(1, harvester.SKIP_AFTER_EMPTY + 1):
+        profiles.day = f"2025-03-{day:02d}"
+        profiles.record_articles("ABC", fetched=4, in_window=0, accepted=0)
+        profiles.record_articles("ABC", fetched=4, in_window=0, accepted=0)
+    assert profiles.skip_reason("ABC") == f"{harvester.SKIP_AFTER_EMPTY} días seguidos sin artículos en ventana"
+    # una ejecución con artículos en ventana lo pone a cero
+    profiles.record_articles("ABC", fetched=4, in_window=1, accepted=1)
+    assert profiles.skip_reason("ABC") is None
+
+
+def test_profiles_from_before_the_daemon_are_migrated(harvester, tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE profiles (source TEXT PRIMARY KEY, strategy TEXT, links_ema REAL, latency_ema REAL,"
+        " consecutive_403 INTEGER NOT NULL DEFAULT 0, total_403 INTEGER NOT NULL DEFAULT 0,"
+        " empty_runs INTEGER NOT NULL DEFAULT 0, fetched INTEGER NOT NULL DEFAULT 0,"
+        " in_window INTEGER NOT NULL DEFAULT 0, accepted INTEGER NOT NULL DEFAULT 0,"
+        " last_probe REAL, updated_at REAL)"
+    )
+    db.execute("INSERT INTO profiles (source, empty_runs, last_probe) VALUES ('ABC', 2, ?)", (time.time(),))
+    db.commit()
+    db.close()
+    profiles = harvester.SourceProfiles(path)
+    profiles.record_articles("ABC", fetched=1, in_window=0, accepted=0)
+    interval = profiles.record_poll("ABC", new_links=0)
+    assert harvester.POLL_MIN_SECONDS <= interval <= harvester.POLL_MAX_SECONDS
+    assert profiles.get("ABC")["empty_runs"] == 3
@@ -0,0 +1,41 @@
+def test_state_survives_a_restart(harvester):
+    seen = harvester.load_state(["ibex"])
+    seen.record("https://www.abc.es/1.html", "accepted")
+    seen.record("https://www.abc.es/2.html", "old")
+    harvester.save_state(seen)
+    seen = harvester.load_state(["ibex"])
+    assert len(seen) == 2
+    assert seen.outcome("https://www.abc.es/1.html") == "accepted"
+    assert "https://www.abc.es/3.html" not in seen
+    harvester.save_state(seen)
+
+
+def test_keyword_rejections_depend_on_the_keywords(harvester):
+    seen = harvester.load_state(["ibex"])
+    seen.record("https://www.abc.es/1.html", "keyword")
+    seen.record("https://www.abc.es/2.html", "old")
+    harvester.save_state(seen)
+    # con otras keywords la URL descartada por keyword vuelve a evaluarse
+    seen = harvester.load_state(["ibex", "cnmv"])
+    assert "https://www.abc.es/1.html" not in seen
+    assert "https://www.abc.es/2.html" in seen
+    harvester.save_state(seen)
+
+
+def test_expired_entries_are_dropped(harvester, monkeypatch):
+    monkeypatch.setitem(harvester.STATE_TTL_HOURS, "error", 0)
+    seen = harvester.load_state()
+    seen.record("https://www.abc.es/1.html", "error")
+    assert "https://www.abc.es/1.html" not in seen
+    harvester.save_state(seen)
+    assert len(harvester.load_state()) == 0
+
+
+def test_mark_sent_covers_canonical_and_outlets(harvester):
+    seen = harvester.load_state()
+    art = harvester.Article(url="https://www.abc.es/1.html", canonical="https://www.abc.es/uno.html",
+                            outlets=[{"source": "EP", "url": "https://www.europapress.es/1.html"}])
+    harvester.mark_sent(seen, [art])
+    assert {seen.outcome(u) for u in ("https://www.abc.es/1.html", "https://www.abc.es/uno.html",
+                                      "https://www.europapress.es/1.html")} == {"sent"}
+    harvester.save_state(seen)